@@ -1,9 +1,23 @@
-"""Napr package."""
+"""Napr package.
 
-from napr import apps, data, plotting, utils, evaluation, hyperopt
+The subpackages are imported on first access, so importing napr does not load
+heavy dependencies, e.g. TensorFlow, that a subpackage may need.
+"""
+
+from napr.utils._lazy import attach
 
 __version__ = "0.1.5"
 __author__ = "Morteza Hosseini"
 __license__ = "MIT"
 
-__all__ = ["apps", "data", "plotting", "utils", "evaluation", "hyperopt"]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "apps": ".apps",
+        "data": ".data",
+        "plotting": ".plotting",
+        "utils": ".utils",
+        "evaluation": ".evaluation",
+        "hyperopt": ".hyperopt",
+    },
+)
@@ -1,6 +1,7 @@
 """The applications API."""
 
-from . import coconut
-from .coconut.terpene import Terpene
+from napr.utils._lazy import attach
 
-__all__ = ["coconut", "Terpene"]
+__getattr__, __dir__, __all__ = attach(
+    __name__, {"coconut": ".coconut", "Terpene": ".coconut.terpene"}
+)
@@ -1,6 +1,7 @@
 """The coconut API"""
 
-from . import terpene
-from .terpene import Terpene
+from napr.utils._lazy import attach
 
-__all__ = ["terpene", "Terpene"]
+__getattr__, __dir__, __all__ = attach(
+    __name__, {"terpene": ".terpene", "Terpene": ".terpene"}
+)
@@ -1,5 +1,12 @@
 """The terpene API."""
 
-from ._base import Terpene
+from napr.utils._lazy import attach
 
-__all__ = ["Terpene"]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "Terpene": "._base",
+        "TerpenePreprocessor": ".preprocessing",
+        "FeatureMatrix": ".preprocessing",
+    },
+)
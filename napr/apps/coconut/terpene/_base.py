@@ -28,9 +28,23 @@ class Terpene:
                     777.
                 unknown_value: The unknown value for encoding. Defaults to 9999.
                 dropped_columns: The dropped columns.
+                taxa: The taxa extracted from textTaxa. Defaults to plants,
+                    marine, bacteria and fungi.
+                low_memory: Whether to preprocess into a single float32
+                    matrix, without copying the data. The peak memory is
+                    then stored in the peak_memory attribute. Defaults to
+                    False.
+                output: "frame", "dense" or "sparse". With "dense" or
+                    "sparse", the data becomes a FeatureMatrix of a float32
+                    NumPy or CSR matrix, the target and the feature names.
+                    The sparse output is only a CSR matrix if smaller than
+                    the dense one. Defaults to "frame".
         """
-        preprocessor = Preprocess(data=self.data)
+        low_memory = kwargs.get("low_memory", False)
+        preprocessor = Preprocess(data=self.data, copy=not low_memory)
         self.data = preprocessor.preprocess(**kwargs)
+        if low_memory:
+            self.peak_memory = preprocessor.peak_memory
 
     @info(message="Dimension reduction")
     def dim_reduce(self, inplace: bool = True, **kwargs) -> pd.DataFrame | None:
@@ -41,11 +55,24 @@ class Terpene:
             **kwargs:
                 model: The model to use for dimension reduction. Defaults to PCA
                     keeping 95% of the variance.
+                projection: A fitted projection, e.g. the projection attribute
+                    of another Terpene, to transform the data without
+                    refitting.
+                engine: "auto", "full", "randomized" or "incremental" PCA.
+                    Defaults to "auto", chosen by the shape of the data.
+                n_components: Number of components, or the fraction of the
+                    variance explained by them. Defaults to 0.95.
+                batch_size: Batch size of the incremental engine.
+                cache: Whether to cache the fitted projection on disk, or the
+                    directory of the cache. Defaults to False.
 
         Returns:
             The dimension reduced data, or None if inplace is True.
         """
-        data_reduced = DimReduce(data=self.data).dim_reduce(**kwargs)
+        reducer = DimReduce(data=self.data)
+        data_reduced = reducer.dim_reduce(**kwargs)
+        # The fitted projection, None for a model
+        self.projection = reducer.projection
         if inplace:
             self.data = data_reduced
         else:
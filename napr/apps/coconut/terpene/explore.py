@@ -26,10 +26,29 @@ SUBCLASS_NAME = {
     "other": "Other",
 }
 
+# The columns used by Plot, e.g. for load_terpene(columns=COLUMNS)
+COLUMNS = [
+    "chemicalSubClass",
+    "molecular_weight",
+    "alogp",
+    "npl_score",
+    "lipinskiRuleOf5Failures",
+    "hBondAcceptorCount",
+    "hBondDonorCount",
+]
+
 
 def _filter_subclasses(data: pd.DataFrame) -> pd.DataFrame:
     """Filter our sublasses of interest."""
-    return data[data["chemicalSubClass"].isin(SUBCLASS_NAME.keys())]
+    data = data[data["chemicalSubClass"].isin(SUBCLASS_NAME.keys())]
+    if isinstance(data["chemicalSubClass"].dtype, pd.CategoricalDtype):
+        # Categorical columns, e.g. from the cache, would otherwise keep
+        # reporting the filtered out subclasses with zero counts
+        data = data.assign(
+            chemicalSubClass=data["chemicalSubClass"]
+            .cat.remove_unused_categories()
+        )
+    return data
 
 
 @dataclass
@@ -1,47 +1,205 @@
 """Preprocessing the terpenes data."""
 
+import io
+import itertools
+import json
+import math
+import os
+import tracemalloc
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import Any, NamedTuple
+
 import numpy as np
 import pandas as pd
+from scipy import sparse
 
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import OrdinalEncoder, StandardScaler
 from sklearn.impute import SimpleImputer
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
+from sklearn.utils import gen_batches
 
 from napr.utils import all_but
+from napr.utils._cache import CACHE_DIR, DiskCache, fingerprint
 
 RANDOM_STATE = 777
 TARGET = ["chemicalSubClass"]
+LEN_BCUT_DESCRIPTOR = 6  # Number of values in a bcutDescriptor
+TAXA = ["plants", "marine", "bacteria", "fungi"]
+DROPPED_COLUMNS = [
+    "_id",
+    "coconut_id",
+    "name",
+    "iupac_name",
+    "molecular_formula",
+    "textTaxa",  # By _extract_tax()
+    "bcutDescriptor",  # By _split_bcutDescriptor()
+    "chemicalClass",  # Target is "chemicalSubClass"
+    "chemicalSuperClass",  # Target is "chemicalSubClass"
+]
+ENCODED_COLUMNS = ["directParentClassification"]
+OUTPUTS = ["frame", "dense", "sparse"]
+ENGINES = ["auto", "full", "randomized", "incremental"]
+EXPLAINED_VARIANCE = 0.95  # Of the principal components kept by DimReduce
+# The "auto" engine fits larger matrices incrementally and matrices with
+# both dimensions at least RANDOMIZED_MIN_SIZE by randomized SVD
+INCREMENTAL_MIN_BYTES = 1024 * 1024 * 1024
+RANDOMIZED_MIN_SIZE = 500
+
+
+class FeatureMatrix(NamedTuple):
+    """A feature matrix, with its target and the names of its columns."""
+
+    X: np.ndarray | sparse.csr_matrix
+    y: pd.Series
+    feature_names: np.ndarray
+
+
+def parse_bcut_descriptor(
+    values: pd.Series,
+    n_values: int = LEN_BCUT_DESCRIPTOR,
+    dtype: str = "float64",
+) -> np.ndarray:
+    """Parse bracketed, comma-separated values, e.g. "[1.2,null,3]", into a
+    2d array.
+
+    All rows are joined into one text and parsed in a single pass by the C
+    parser of pandas, without creating Python objects per value. Missing rows
+    and "null" values are parsed as NaN; rows with fewer values are padded
+    with NaN and extra values are ignored.
+
+    Args:
+        values: The bracketed values.
+        n_values: Number of values per row. Defaults to LEN_BCUT_DESCRIPTOR.
+        dtype: Data type of the array, e.g. "float32". Defaults to "float64".
+
+    Returns:
+        A C-contiguous array of shape (len(values), n_values).
+    """
+    if values.empty:
+        return np.empty((0, n_values), dtype=dtype)
+
+    # The first line makes the parser expect n_values columns, even if all
+    # rows have fewer values. The last newline keeps a trailing missing row.
+    text = "\n".join(["," * (n_values - 1)] + values.fillna("").tolist())
+    text = text.replace("[", "").replace("]", "") + "\n"
+    parsed = pd.read_csv(
+        io.StringIO(text),
+        header=None,
+        names=range(n_values),
+        usecols=range(n_values),
+        dtype=dtype,
+        na_values=["null"],
+        skip_blank_lines=False,
+        skipinitialspace=True,
+        engine="c",
+    )
+    return np.ascontiguousarray(parsed.to_numpy(dtype=dtype)[1:])
+
+
+def extract_taxa(
+    values: pd.Series, taxa: list[str] = TAXA, dtype: str = "uint8"
+) -> np.ndarray:
+    """Returns the indicator matrix of the taxa contained in the values.
+
+    The values are factorized in a single pass and each taxon is only looked
+    up in the distinct values, so the cost of more taxa does not grow with
+    the number of rows. Missing values contain no taxon.
+
+    Args:
+        values: The textTaxa values, e.g. "[plants, marine]".
+        taxa: The taxa vocabulary. Defaults to TAXA.
+        dtype: Data type of the matrix, e.g. "bool". Defaults to "uint8".
+
+    Returns:
+        A matrix of shape (len(values), len(taxa)), which is 1 where a value
+            contains a taxon.
+    """
+    codes, uniques = pd.factorize(values)
+    # The last row is for the missing values, which have the code -1
+    table = np.zeros((len(uniques) + 1, len(taxa)), dtype=dtype)
+    for i, value in enumerate(uniques):
+        table[i] = [tax in value for tax in taxa]
+    return table[codes]
+
+
+def one_hot_encode(
+    values: np.ndarray, train: np.ndarray
+) -> tuple[sparse.csr_matrix, np.ndarray]:
+    """One-hot encode categorical values, with the categories of the train
+    rows.
+
+    Missing values and the categories not seen in the train rows are encoded
+    as all zeros.
+
+    Args:
+        values: The categorical values.
+        train: The mask of the train rows.
+
+    Returns:
+        The float32 CSR matrix of the one-hot encoded values, and the sorted
+            categories of its columns.
+    """
+    categories = np.sort(pd.unique(values[train & pd.notna(values)]))
+    codes = pd.Categorical(values, categories=categories).codes
+    rows = np.flatnonzero(codes != -1)
+    one_hot = sparse.csr_matrix(
+        (np.ones(len(rows), dtype="float32"), (rows, codes[rows])),
+        shape=(len(values), len(categories)),
+    )
+    return one_hot, categories
 
 
 class Preprocess:
-    def __init__(self, data: pd.DataFrame) -> None:
-        self.data = data.copy()
+    def __init__(self, data: pd.DataFrame, copy: bool = True) -> None:
+        # The low memory mode only reads the data, so it needs no copy
+        self.data = data.copy() if copy else data
 
         # Defaults
         self.random_state = RANDOM_STATE
         self.unknown_value = 9999
-        self.dropped_columns = [
-            "_id",
-            "coconut_id",
-            "name",
-            "iupac_name",
-            "molecular_formula",
-            "textTaxa",  # By _extract_tax()
-            "bcutDescriptor",  # By _split_bcutDescriptor()
-            "chemicalClass",  # Target is "chemicalSubClass"
-            "chemicalSuperClass",  # Target is "chemicalSubClass"
-        ]
+        self.dropped_columns = DROPPED_COLUMNS
         self.target_columns = TARGET
+        self.taxa = TAXA
 
-    def preprocess(self, **kwargs) -> pd.DataFrame:
+    def preprocess(self, **kwargs) -> pd.DataFrame | FeatureMatrix:
         """Preprocessing of the terpene data.
 
+        With low_memory=True, the data is not modified and no train-test split
+        is materialized: the steps are fitted on a mask of the train rows, one
+        column at a time, and their results are written into a single
+        preallocated float32 matrix. The rows keep their original order,
+        instead of train rows followed by test rows, and the peak memory
+        traced during preprocessing is reported in the peak_memory attribute,
+        in bytes. If the caller already traces the memory with tracemalloc,
+        its peak is kept, and peak_memory is a lower bound when that peak is
+        not exceeded.
+
+        With output="dense", the features are returned as a float32 NumPy
+        matrix. With output="sparse", the ENCODED_COLUMNS are one-hot
+        encoded, with the categories of the train rows, instead of ordinal
+        encoded; the one-hot columns follow the other columns. The features
+        are then returned as a float32 CSR matrix if it is smaller than the
+        dense one, i.e. if the non-zeros are few enough, since CSR stores a
+        value and a column index per non-zero; otherwise, e.g. if the mostly
+        non-zero scaled columns dominate, as a float32 NumPy matrix. Either
+        output reduces the peak memory only with low_memory=True, since
+        otherwise the preprocessed float64 frame is built first.
+
         Args:
             **kwargs: Keyword arguments passed to preprocessing functions.
+                low_memory: Whether to use the low memory mode. Defaults to
+                    False.
+                output: "frame", "dense" or "sparse". Defaults to "frame".
+
+        Raises:
+            ValueError: if output is not supported.
 
         Returns:
-            The preprocessed data.
+            The preprocessed data, or a FeatureMatrix of the features, the
+                target and the feature names if output is not "frame".
         """
         if "random_state" in kwargs:
             self.random_state = kwargs["random_state"]
@@ -49,26 +207,194 @@ class Preprocess:
             self.unknown_value = kwargs["unknown_value"]
         if "dropped_columns" in kwargs:
             self.dropped_columns = kwargs["dropped_columns"]
+        if "taxa" in kwargs:
+            self.taxa = kwargs["taxa"]
+        output = kwargs.get("output", "frame")
+        if output not in OUTPUTS:
+            raise ValueError(f"output must be one of {OUTPUTS}.")
+
+        # The categories to one-hot encode, before they are ordinal encoded
+        raw_encoded = None
+        if output == "sparse":
+            raw_encoded = self.data[
+                [col for col in ENCODED_COLUMNS if col in self.data.columns]
+            ].copy()
 
-        self._split_bcutDescriptor()
-        self._extract_tax()
-        train, test = train_test_split(
-            self.data,
+        if kwargs.get("low_memory", False):
+            # The trace of the caller, if any, is measured against, not reset
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            before, peak_before = tracemalloc.get_traced_memory()
+            try:
+                self.data = self._preprocess_low_memory()
+            finally:
+                current, peak = tracemalloc.get_traced_memory()
+                if peak > peak_before or not tracing:
+                    self.peak_memory = peak - before
+                else:
+                    # Below the peak of the caller: a lower bound
+                    self.peak_memory = max(current - before, 0)
+                if not tracing:
+                    tracemalloc.stop()
+        else:
+            self._split_bcutDescriptor()
+            self._extract_tax()
+            train, test = train_test_split(
+                self.data,
+                train_size=0.75,
+                random_state=self.random_state,
+            )
+            self._encode(train, test)
+            self._impute(train, test)
+            self._feature_scale(train, test)
+
+            self.data = pd.concat([train, test], axis=0)
+            # self.data.sort_index(inplace=True)
+            target_data = self.data[self.target_columns]
+            self.data.drop(
+                self.dropped_columns + self.target_columns, axis=1, inplace=True
+            )
+            self.data = pd.concat([self.data, target_data], axis=1)
+
+        if output == "frame":
+            return self.data
+        return self._feature_matrix(raw_encoded)
+
+    def _train_mask(self, n_rows: int) -> np.ndarray:
+        """Returns the mask of the train rows, in the original order."""
+        train_rows, _ = train_test_split(
+            np.arange(n_rows),
             train_size=0.75,
             random_state=self.random_state,
         )
-        self._encode(train, test)
-        self._impute(train, test)
-        self._feature_scale(train, test)
+        train = np.zeros(n_rows, dtype=bool)
+        train[train_rows] = True
+        return train
+
+    def _feature_matrix(
+        self, raw_encoded: pd.DataFrame | None = None
+    ) -> FeatureMatrix:
+        """Convert the preprocessed data into a feature matrix.
+
+        Args:
+            raw_encoded: The ENCODED_COLUMNS of the original data, to one-hot
+                encode into a sparse matrix, if smaller than the dense one.
+                Defaults to None, which means a dense matrix.
 
-        self.data = pd.concat([train, test], axis=0)
-        # self.data.sort_index(inplace=True)
-        target_data = self.data[self.target_columns]
-        self.data.drop(
-            self.dropped_columns + self.target_columns, axis=1, inplace=True
+        Returns:
+            The feature matrix.
+        """
+        y = self.data[self.target_columns].squeeze(axis=1)
+        columns = all_but(list(self.data.columns), self.target_columns)
+        if raw_encoded is None:
+            return FeatureMatrix(
+                X=self.data[columns].to_numpy(dtype="float32"),
+                y=y,
+                feature_names=np.array(columns, dtype=object),
+            )
+
+        columns = all_but(columns, list(raw_encoded.columns))
+        dense = self.data[columns].to_numpy("float32")
+        blocks, nnz = [], np.count_nonzero(dense)
+        # Rows of the original data, in the order of the preprocessed data
+        rows = raw_encoded.index.get_indexer(self.data.index)
+        train = self._train_mask(len(raw_encoded))[rows]
+        for column in raw_encoded.columns:
+            one_hot, categories = one_hot_encode(
+                raw_encoded[column].to_numpy()[rows], train
+            )
+            blocks.append(one_hot)
+            nnz += one_hot.nnz
+            columns += [column + "_" + str(cat) for cat in categories]
+
+        # A value and a column index per non-zero, and a pointer per row
+        n_rows = dense.shape[0]
+        csr_bytes = 8 * nnz + 4 * (n_rows + 1)
+        if csr_bytes < 4 * n_rows * len(columns):
+            X = sparse.hstack(
+                [sparse.csr_matrix(dense), *blocks], format="csr"
+            )
+        else:
+            X = np.hstack([dense, *(block.toarray() for block in blocks)])
+        return FeatureMatrix(
+            X=X.astype("float32", copy=False),
+            y=y,
+            feature_names=np.array(columns, dtype=object),
         )
-        self.data = pd.concat([self.data, target_data], axis=1)
-        return self.data
+
+    def _preprocess_low_memory(self) -> pd.DataFrame:
+        """Preprocessing into a preallocated float32 matrix, fitting on a mask
+        of the train rows."""
+        train = self._train_mask(len(self.data))
+
+        # Blocks of features, generated column by column
+        blocks = {column: None for column in self.data.columns}
+        taxa_columns = ["textTaxa_" + tax for tax in self.taxa]
+        if "bcutDescriptor" in self.data.columns:
+            bcut = parse_bcut_descriptor(
+                self.data["bcutDescriptor"], dtype="float32"
+            )
+            for i in range(LEN_BCUT_DESCRIPTOR):
+                blocks["bcutDescriptor_" + str(i)] = bcut[:, i]
+        if "textTaxa" in self.data.columns:
+            taxa = extract_taxa(self.data["textTaxa"], taxa=self.taxa)
+            for i, column in enumerate(taxa_columns):
+                blocks[column] = taxa[:, i]
+        columns = all_but(
+            list(blocks), self.dropped_columns + self.target_columns
+        )
+
+        matrix = np.empty((len(self.data), len(columns)), "float32", order="F")
+        for j, column in enumerate(columns):
+            values = blocks[column]
+            if column in taxa_columns:
+                matrix[:, j] = values
+                continue
+
+            if column in ENCODED_COLUMNS:
+                values = self._encode_column(self.data[column], train)
+            elif values is None:
+                # A copy of one column, as the data must not be modified
+                values = self.data[column].to_numpy(dtype="float64", copy=True)
+            else:
+                values = values.astype("float64")
+
+            # Impute
+            missing = np.isnan(values)
+            values[missing] = np.nanmedian(values[train])
+            # Feature scale
+            if column != "contains_sugar":
+                values -= values[train].mean()
+                scale = values[train].std()
+                values /= scale if scale else 1.0
+            matrix[:, j] = values
+        del blocks
+
+        data = pd.DataFrame(matrix, index=self.data.index, columns=columns)
+        for column in self.target_columns:
+            data[column] = self.data[column]
+        return data
+
+    def _encode_column(
+        self, column: pd.Series, train: np.ndarray
+    ) -> np.ndarray:
+        """Ordinal encode a column, with the categories of the train rows.
+
+        Args:
+            column: The column.
+            train: The mask of the train rows.
+
+        Returns:
+            The float64 codes, with NaN for the missing values.
+        """
+        categories = np.sort(column[train].dropna().unique().astype(str))
+        codes = pd.Categorical(
+            column.astype(str), categories=categories
+        ).codes.astype("float64")
+        codes[(codes == -1) & column.notna().to_numpy()] = self.unknown_value
+        codes[column.isna().to_numpy()] = np.nan
+        return codes
 
     def _split_bcutDescriptor(self) -> None:
         """Split the bcutDescriptor column into multiple columns and concatenate
@@ -76,14 +402,13 @@ class Preprocess:
         if "bcutDescriptor" not in self.data.columns:
             return None
 
-        splitted = (
-            self.data["bcutDescriptor"]
-            .apply(lambda x: x[1:-1])
-            .str.split(",", expand=True)
+        splitted = pd.DataFrame(
+            parse_bcut_descriptor(self.data["bcutDescriptor"]),
+            index=self.data.index,
+            columns=[
+                "bcutDescriptor_" + str(i) for i in range(LEN_BCUT_DESCRIPTOR)
+            ],
         )
-        splitted.columns = ["bcutDescriptor_" + str(i) for i in range(6)]
-        splitted.replace(["null", ""], np.nan, inplace=True)
-        splitted = splitted.astype("float64")
         self.data = pd.concat([self.data, splitted], axis=1)
 
     def _extract_tax(self) -> None:
@@ -92,10 +417,12 @@ class Preprocess:
         if "textTaxa" not in self.data.columns:
             return None
 
-        for tax in ["plants", "marine", "bacteria", "fungi"]:
-            self.data.loc[:, "textTaxa_" + tax] = (
-                self.data["textTaxa"].str.contains(tax).astype("int64")
-            )
+        taxa = pd.DataFrame(
+            extract_taxa(self.data["textTaxa"], taxa=self.taxa),
+            index=self.data.index,
+            columns=["textTaxa_" + tax for tax in self.taxa],
+        )
+        self.data = pd.concat([self.data, taxa], axis=1)
 
     def _encode(self, train: pd.DataFrame, test: pd.DataFrame) -> None:
         """Encode the data.
@@ -104,7 +431,7 @@ class Preprocess:
             train: The training data.
             test: The testing data.
         """
-        columns = ["directParentClassification"]
+        columns = ENCODED_COLUMNS
 
         for col in columns:
             if col not in train.columns:
@@ -123,7 +450,12 @@ class Preprocess:
             train: The training data.
             test: The testing data.
         """
-        ignored_columns = self.dropped_columns + self.target_columns
+        # The taxa indicators are never missing and stay uint8
+        ignored_columns = (
+            self.dropped_columns
+            + self.target_columns
+            + list(train.columns[train.columns.str.contains("textTaxa")])
+        )
         columns = train.columns[~train.columns.isin(ignored_columns)]
 
         imputer = SimpleImputer(strategy="median")
@@ -150,23 +482,524 @@ class Preprocess:
         test[columns] = scaler.transform(test[columns])
 
 
+def expand_chunks(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    """Split the bcutDescriptor and extract the taxonomy of data chunks, e.g.
+    from napr.data.iter_terpene.
+
+    These transforms are row-wise, so chunks can be processed in bounded
+    memory, before the train-test dependent steps of Preprocess.preprocess.
+
+    Args:
+        chunks: The data chunks.
+
+    Yields:
+        The expanded chunks.
+    """
+    for chunk in chunks:
+        preprocessor = Preprocess(data=chunk)
+        preprocessor._split_bcutDescriptor()
+        preprocessor._extract_tax()
+        yield preprocessor.data
+
+
+class TerpenePreprocessor(BaseEstimator, TransformerMixin):
+    """Preprocessing of the terpene data, with a fit/transform interface.
+
+    It performs the steps of Preprocess.preprocess, i.e. splitting the
+    bcutDescriptor, extracting the taxa, ordinal encoding, median imputation
+    and standard scaling, but the encoding, imputation and scaling are fitted
+    once and then applied to new data. The fitted state is JSON serializable
+    (see get_state, save and load), and transform_records transforms small
+    batches of raw records with NumPy only, e.g. for online inference.
+
+    Args:
+        unknown_value: The encoded value of unknown categories. Defaults to
+            9999.
+        dropped_columns: The dropped columns. Defaults to None, which is
+            DROPPED_COLUMNS.
+        taxa: The taxa extracted from textTaxa. Defaults to None, which is
+            TAXA.
+    """
+
+    def __init__(
+        self,
+        unknown_value: int = 9999,
+        dropped_columns: list[str] | None = None,
+        taxa: list[str] | None = None,
+    ) -> None:
+        self.unknown_value = unknown_value
+        self.dropped_columns = dropped_columns
+        self.taxa = taxa
+
+    def _expand(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Split the bcutDescriptor and extract the taxa."""
+        preprocessor = Preprocess(data=X)
+        preprocessor.taxa = self.taxa_
+        preprocessor._split_bcutDescriptor()
+        preprocessor._extract_tax()
+        return preprocessor.data
+
+    def fit(self, X: pd.DataFrame, y: Any = None) -> "TerpenePreprocessor":
+        """Fit the encoding, imputation and scaling.
+
+        Args:
+            X: The raw terpene data. The target column is ignored.
+            y: Ignored.
+
+        Returns:
+            The fitted preprocessor.
+        """
+        self.taxa_ = TAXA if self.taxa is None else self.taxa
+        dropped_columns = (
+            DROPPED_COLUMNS
+            if self.dropped_columns is None
+            else self.dropped_columns
+        )
+
+        data = self._expand(X)
+        self.feature_names_out_ = all_but(
+            list(data.columns), dropped_columns + TARGET
+        )
+        self.categories_ = {
+            column: sorted(map(str, data[column].dropna().unique()))
+            for column in ENCODED_COLUMNS
+            if column in self.feature_names_out_
+        }
+
+        values = self._encode(data)
+        taxa_columns = ["textTaxa_" + tax for tax in self.taxa_]
+        self.imputed_ = np.array(
+            [name not in taxa_columns for name in self.feature_names_out_]
+        )
+        self.scaled_ = self.imputed_ & np.array(
+            [name != "contains_sugar" for name in self.feature_names_out_]
+        )
+
+        imputer = SimpleImputer(strategy="median")
+        self.statistics_ = imputer.fit(values[:, self.imputed_]).statistics_
+
+        scaler = StandardScaler().fit(self._impute(values)[:, self.scaled_])
+        self.mean_, self.scale_ = scaler.mean_, scaler.scale_
+        return self
+
+    def _encode(self, data: pd.DataFrame) -> np.ndarray:
+        """Returns the features as a float64 matrix, with the categorical
+        columns ordinal encoded. Missing categories stay NaN."""
+        values = np.empty((len(data), len(self.feature_names_out_)))
+        for j, name in enumerate(self.feature_names_out_):
+            if name in self.categories_:
+                codes = {cat: i for i, cat in enumerate(self.categories_[name])}
+                column = data[name]
+                values[:, j] = (
+                    column.astype(str)
+                    .map(codes)
+                    .fillna(self.unknown_value)
+                    .where(column.notna())
+                )
+            else:
+                values[:, j] = data[name]
+        return values
+
+    def _impute(self, values: np.ndarray) -> np.ndarray:
+        """Impute the encoded features with the medians, inplace."""
+        imputed = values[:, self.imputed_]
+        missing = np.isnan(imputed)
+        imputed[missing] = np.broadcast_to(self.statistics_, imputed.shape)[
+            missing
+        ]
+        values[:, self.imputed_] = imputed
+        return values
+
+    def _scale(self, values: np.ndarray) -> np.ndarray:
+        """Standard scale the imputed features, inplace."""
+        values[:, self.scaled_] = (
+            values[:, self.scaled_] - self.mean_
+        ) / self.scale_
+        return values
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        """Transform the raw terpene data.
+
+        Args:
+            X: The raw terpene data.
+
+        Returns:
+            The preprocessed features.
+        """
+        data = self._expand(X)
+        values = self._scale(self._impute(self._encode(data)))
+        return pd.DataFrame(
+            values, index=data.index, columns=self.feature_names_out_
+        )
+
+    def transform_records(self, records: list[dict[str, Any]]) -> np.ndarray:
+        """Transform raw terpene records, without pandas.
+
+        It is the fast path of transform for small batches, e.g. a few
+        compounds scored at serving time.
+
+        Args:
+            records: The raw records, mapping the column names to the values.
+
+        Returns:
+            The preprocessed features, with the columns of feature_names_out_.
+        """
+        values = np.full((len(records), len(self.feature_names_out_)), np.nan)
+        values[:, ~self.imputed_] = 0  # The taxa indicators
+        columns = {name: j for j, name in enumerate(self.feature_names_out_)}
+        bcut_columns = [
+            columns.get("bcutDescriptor_" + str(i))
+            for i in range(LEN_BCUT_DESCRIPTOR)
+        ]
+        taxa_columns = [columns.get("textTaxa_" + tax) for tax in self.taxa_]
+        codes = {
+            name: {cat: i for i, cat in enumerate(categories)}
+            for name, categories in self.categories_.items()
+        }
+
+        for i, record in enumerate(records):
+            for name, value in record.items():
+                if name == "bcutDescriptor" and isinstance(value, str):
+                    bcut = value.strip("[]").split(",")
+                    for j, item in zip(bcut_columns, bcut):
+                        item = item.strip()
+                        if j is not None and item not in ["", "null"]:
+                            values[i, j] = float(item)
+                elif name == "textTaxa":
+                    for j, tax in zip(taxa_columns, self.taxa_):
+                        if j is not None:
+                            values[i, j] = isinstance(value, str) and tax in value
+                elif name in codes:
+                    if value is not None and value == value:  # Not NaN
+                        values[i, columns[name]] = codes[name].get(
+                            str(value), self.unknown_value
+                        )
+                elif name in columns and value is not None:
+                    values[i, columns[name]] = value
+        return self._scale(self._impute(values))
+
+    def get_state(self) -> dict[str, Any]:
+        """Returns the fitted state, which is JSON serializable."""
+        return {
+            "unknown_value": self.unknown_value,
+            "dropped_columns": self.dropped_columns,
+            "taxa": self.taxa_,
+            "feature_names_out": self.feature_names_out_,
+            "categories": self.categories_,
+            "imputed": self.imputed_.tolist(),
+            "scaled": self.scaled_.tolist(),
+            "statistics": self.statistics_.tolist(),
+            "mean": self.mean_.tolist(),
+            "scale": self.scale_.tolist(),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> "TerpenePreprocessor":
+        """Returns a fitted preprocessor from its state.
+
+        Args:
+            state: The fitted state, as returned by get_state.
+        """
+        preprocessor = cls(
+            unknown_value=state["unknown_value"],
+            dropped_columns=state["dropped_columns"],
+            taxa=state["taxa"],
+        )
+        preprocessor.taxa_ = state["taxa"]
+        preprocessor.feature_names_out_ = state["feature_names_out"]
+        preprocessor.categories_ = state["categories"]
+        preprocessor.imputed_ = np.array(state["imputed"], dtype=bool)
+        preprocessor.scaled_ = np.array(state["scaled"], dtype=bool)
+        preprocessor.statistics_ = np.array(state["statistics"])
+        preprocessor.mean_ = np.array(state["mean"])
+        preprocessor.scale_ = np.array(state["scale"])
+        return preprocessor
+
+    def save(self, path: str) -> None:
+        """Save the fitted state into a JSON file.
+
+        Args:
+            path: Path to the file.
+        """
+        with open(path, "w") as file:
+            json.dump(self.get_state(), file)
+
+    @classmethod
+    def load(cls, path: str) -> "TerpenePreprocessor":
+        """Load a fitted preprocessor from a JSON file.
+
+        Args:
+            path: Path to the file.
+        """
+        with open(path) as file:
+            return cls.from_state(json.load(file))
+
+
+@dataclass
+class Projection:
+    """A fitted linear projection of the features, e.g. onto the principal
+    components."""
+
+    mean: np.ndarray
+    components: np.ndarray
+    feature_names: np.ndarray | None = None
+
+    @property
+    def n_components(self) -> int:
+        return len(self.components)
+
+    def transform(
+        self, X: pd.DataFrame | np.ndarray | sparse.spmatrix
+    ) -> np.ndarray:
+        """Project the features, in their dtype if it is floating point.
+
+        Args:
+            X: The features. The columns of a DataFrame are reordered by the
+                feature names.
+
+        Returns:
+            The projected features.
+        """
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names is not None:
+                X = X[list(self.feature_names)]
+            X = X.to_numpy()
+        dtype = X.dtype if np.issubdtype(X.dtype, np.floating) else "float64"
+        components = self.components.T.astype(dtype, copy=False)
+        # Sparse features are projected without centering them
+        projected = np.asarray(X @ components)
+        projected -= self.mean.astype(dtype, copy=False) @ components
+        return projected
+
+
+def choose_engine(n_samples: int, n_features: int, itemsize: int = 8) -> str:
+    """Choose the engine of fit_projection for a matrix.
+
+    Args:
+        n_samples: Number of rows.
+        n_features: Number of columns.
+        itemsize: Number of bytes of each value. Defaults to 8.
+
+    Returns:
+        "incremental" if the matrix takes at least INCREMENTAL_MIN_BYTES,
+            "randomized" if both of its dimensions are at least
+            RANDOMIZED_MIN_SIZE, and "full" otherwise.
+    """
+    if n_samples * n_features * itemsize >= INCREMENTAL_MIN_BYTES:
+        return "incremental"
+    if min(n_samples, n_features) >= RANDOMIZED_MIN_SIZE:
+        return "randomized"
+    return "full"
+
+
+def _n_kept(explained_variance_ratio: np.ndarray, threshold: float) -> int:
+    """Returns the number of components explaining more than threshold of
+    the variance, as in PCA."""
+    ratio_cumsum = np.cumsum(explained_variance_ratio, dtype="float64")
+    n_kept = np.searchsorted(ratio_cumsum, threshold, side="right") + 1
+    return min(int(n_kept), len(explained_variance_ratio))
+
+
+def _dense(X: np.ndarray | sparse.spmatrix) -> np.ndarray:
+    return X.toarray() if sparse.issparse(X) else X
+
+
+def _iter_batches(
+    chunks: Iterable[pd.DataFrame | np.ndarray | sparse.spmatrix],
+    min_rows: int,
+) -> Iterator[np.ndarray]:
+    """Concatenate chunks into dense batches of at least min_rows rows. A
+    shorter last batch is merged into the previous one, as in
+    gen_batches(..., min_batch_size), since IncrementalPCA cannot fit fewer
+    rows than components."""
+    pending, n_rows = [], 0
+    previous = None
+    for chunk in chunks:
+        if isinstance(chunk, pd.DataFrame):
+            chunk = chunk.to_numpy()
+        pending.append(_dense(chunk))
+        n_rows += len(chunk)
+        if n_rows >= min_rows:
+            if previous is not None:
+                yield previous
+            previous = np.concatenate(pending)
+            pending, n_rows = [], 0
+    if previous is not None:
+        pending.insert(0, previous)
+    if pending:
+        yield np.concatenate(pending)
+
+
+def _fit_incremental(
+    batches: Iterator[np.ndarray], n_components: int | float
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fit an IncrementalPCA on batches, keeping the components explaining
+    n_components of the variance if it is a float."""
+    model = IncrementalPCA(
+        n_components=n_components if isinstance(n_components, int) else None
+    )
+    for batch in batches:
+        model.partial_fit(batch)
+    if not hasattr(model, "components_"):
+        raise ValueError("No data to fit.")
+
+    components = model.components_
+    if isinstance(n_components, float):
+        components = components[
+            : _n_kept(model.explained_variance_ratio_, n_components)
+        ]
+    return model.mean_, components
+
+
+def _fit_randomized(
+    X: np.ndarray, n_components: int | float, random_state: int | None
+) -> tuple[np.ndarray, np.ndarray]:
+    """Fit a PCA by randomized SVD, doubling the number of components until
+    they explain n_components of the variance if it is a float."""
+    max_components = min(X.shape)
+    if isinstance(n_components, int):
+        n_fitted = n_components
+    else:
+        n_fitted = min(max_components, max(10, math.isqrt(max_components)))
+    while True:
+        model = PCA(
+            n_components=n_fitted,
+            svd_solver="randomized",
+            random_state=random_state,
+        ).fit(X)
+        if isinstance(n_components, int):
+            return model.mean_, model.components_
+
+        ratio = model.explained_variance_ratio_
+        if ratio.sum() > n_components or n_fitted == max_components:
+            n_kept = _n_kept(ratio, n_components)
+            return model.mean_, model.components_[:n_kept]
+        n_fitted = min(2 * n_fitted, max_components)
+
+
+def fit_projection(
+    data: pd.DataFrame
+    | np.ndarray
+    | sparse.spmatrix
+    | Iterable[pd.DataFrame | np.ndarray | sparse.spmatrix],
+    n_components: int | float = EXPLAINED_VARIANCE,
+    engine: str = "auto",
+    batch_size: int | None = None,
+    random_state: int | None = RANDOM_STATE,
+) -> Projection:
+    """Fit the principal components of the features.
+
+    The engines are:
+        "full": PCA by a full SVD.
+        "randomized": PCA by randomized SVD.
+        "incremental": IncrementalPCA over batches of rows, out-of-core if
+            data is an iterable of chunks, e.g. of preprocessed chunks of
+            iter_terpene.
+        "auto": "incremental" for chunks, or else chosen by choose_engine.
+    With a float n_components, every engine keeps the fewest components
+    explaining more than n_components of the variance, as PCA does.
+
+    Args:
+        data: The features, or an iterable of chunks of them.
+        n_components: Number of components, or the fraction of the variance
+            explained by them. Defaults to EXPLAINED_VARIANCE.
+        engine: The engine. Defaults to "auto".
+        batch_size: Minimum number of rows of the batches of the incremental
+            engine. Defaults to None, which means 5 times the number of
+            features, or 1000 for chunks.
+        random_state: Random state of the randomized engine. Defaults to
+            RANDOM_STATE.
+
+    Raises:
+        ValueError: if engine is not supported, or is not incremental for
+            chunks.
+
+    Returns:
+        The fitted projection.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"engine must be one of {ENGINES}.")
+
+    feature_names = None
+    if not isinstance(data, (pd.DataFrame, np.ndarray, sparse.spmatrix)):
+        if engine not in ["auto", "incremental"]:
+            raise ValueError("Chunks are only fitted incrementally.")
+
+        chunks = iter(data)
+        first = next(chunks, None)
+        if isinstance(first, pd.DataFrame):
+            feature_names = np.array(first.columns, dtype=object)
+        if first is not None:
+            min_rows = max(batch_size or 1000, first.shape[1])
+            chunks = _iter_batches(itertools.chain([first], chunks), min_rows)
+        mean, components = _fit_incremental(chunks, n_components)
+        return Projection(mean, components, feature_names)
+
+    if isinstance(data, pd.DataFrame):
+        feature_names = np.array(data.columns, dtype=object)
+        data = data.to_numpy()
+    if engine == "auto":
+        engine = choose_engine(*data.shape, itemsize=data.dtype.itemsize)
+
+    if engine == "incremental":
+        min_rows = max(batch_size or 5 * data.shape[1], data.shape[1])
+        batches = (
+            _dense(data[batch])
+            for batch in gen_batches(
+                data.shape[0], min_rows, min_batch_size=min_rows
+            )
+        )
+        mean, components = _fit_incremental(batches, n_components)
+    elif engine == "randomized":
+        mean, components = _fit_randomized(
+            _dense(data), n_components, random_state
+        )
+    else:
+        model = PCA(
+            n_components=n_components,
+            svd_solver="full",
+            random_state=random_state,
+        ).fit(_dense(data))
+        mean, components = model.mean_, model.components_
+    return Projection(mean, components, feature_names)
+
+
 class DimReduce:
-    def __init__(self, data: pd.DataFrame) -> None:
-        self.data = data.copy()
+    def __init__(self, data: pd.DataFrame | FeatureMatrix) -> None:
+        # The matrix of a FeatureMatrix is not modified, so it is not copied
+        self.data = data if isinstance(data, FeatureMatrix) else data.copy()
 
         # Defaults
         self.target_columns = TARGET
-        self.model = PCA(n_components=0.95, random_state=RANDOM_STATE)
+        self.model = None
+        self.projection = None
 
-    def dim_reduce(self, **kwargs) -> pd.DataFrame:
+    def dim_reduce(self, **kwargs) -> pd.DataFrame | FeatureMatrix:
         """Dimension reducttion of the terpene data.
 
+        By default, the principal components explaining 95% of the variance
+        are kept, fitted by fit_projection. The fitted projection is stored
+        in the projection attribute, and can be passed back to transform new
+        data without refitting.
+
         Args:
             **kwargs: Keyword arguments passed to dimeension reduction
                 functions.
+                model: A model with a fit_transform method, used instead of
+                    fit_projection.
+                projection: A fitted Projection to transform the data with.
+                engine: The engine of fit_projection. Defaults to "auto".
+                n_components: Number of components, or the fraction of the
+                    variance explained by them. Defaults to 0.95.
+                batch_size: Batch size of the incremental engine.
+                cache: Whether to cache the fitted projection on disk, keyed
+                    by the content of the data and the parameters, to skip
+                    refitting it. It can also be a directory or a DiskCache.
+                    True means the "projections" directory of CACHE_DIR.
+                    Defaults to False.
 
         Returns:
-            The dimension reduced data.
+            The dimension reduced data, as a FeatureMatrix if the data is one.
         """
         if "model" in kwargs:
             if isinstance(kwargs["model"], str):
@@ -175,12 +1008,52 @@ class DimReduce:
                 )
             self.model = kwargs["model"]
 
-        columns = all_but(self.data.columns, self.target_columns)
-        data_reduced = self.model.fit_transform(self.data[columns])
+        if isinstance(self.data, FeatureMatrix):
+            X = self.data.X
+        else:
+            columns = all_but(self.data.columns, self.target_columns)
+            X = self.data[columns]
+
+        if "projection" in kwargs:
+            self.projection = kwargs["projection"]
+        elif self.model is None:
+            params = {
+                "n_components": kwargs.get("n_components", EXPLAINED_VARIANCE),
+                "engine": kwargs.get("engine", "auto"),
+                "batch_size": kwargs.get("batch_size"),
+                "random_state": RANDOM_STATE,
+            }
+            cache = kwargs.get("cache", False)
+            if cache is True:
+                cache = DiskCache(os.path.join(CACHE_DIR, "projections"))
+            elif isinstance(cache, str):
+                cache = DiskCache(cache)
+
+            key = fingerprint("Projection", params, X) if cache else None
+            self.projection = cache.get(key) if cache else None
+            if self.projection is None:
+                self.projection = fit_projection(X, **params)
+                if cache:
+                    cache.set(key, self.projection)
+
+        if self.projection is not None:
+            data_reduced = self.projection.transform(X)
+        else:
+            # PCA does not support sparse input
+            if sparse.issparse(X) and isinstance(self.model, PCA):
+                X = X.toarray()
+            data_reduced = self.model.fit_transform(X)  # type: ignore
+        reduced_columns = ["d" + str(i) for i in range(data_reduced.shape[1])]
+
+        if isinstance(self.data, FeatureMatrix):
+            return FeatureMatrix(
+                X=data_reduced,
+                y=self.data.y,
+                feature_names=np.array(reduced_columns, dtype=object),
+            )
+
         df_reduced = pd.DataFrame(
-            data=data_reduced,
-            index=self.data.index,
-            columns=["d" + str(i) for i in range(data_reduced.shape[1])],
+            data=data_reduced, index=self.data.index, columns=reduced_columns
         )
         self.data.drop(columns, axis=1, inplace=True)
         self.data = pd.concat([df_reduced, self.data], axis=1)
@@ -1,13 +1,18 @@
 """Test the base class of the terpene app."""
 
+import os
+
+import numpy as np
 import pandas as pd
 
-from sklearn.decomposition import PCA
+from scipy import sparse
+from sklearn.decomposition import PCA, TruncatedSVD
 
 import pytest
 
 from napr.apps.coconut.terpene._base import Terpene
-from napr.apps.coconut.terpene import explore
+from napr.apps.coconut.terpene import explore, preprocessing
+from napr.apps.coconut.terpene.preprocessing import FeatureMatrix
 
 
 def test_base_class(data):
@@ -42,6 +47,7 @@ def test_preprocess(data, dropped_columns):
         - len(dropped_columns),
     )
     assert "chemicalClass" not in terpene.data.columns
+    assert (terpene.data.filter(like="textTaxa_").dtypes == "uint8").all()
 
 
 def test_dim_reduce(data, dropped_columns):
@@ -62,3 +68,56 @@ def test_dim_reduce(data, dropped_columns):
     n_components = 3
     terpene.dim_reduce(model=PCA(n_components=n_components), inplace=True)
     assert terpene.data.shape == (data.shape[0], n_components + len_target_col)
+
+
+@pytest.mark.parametrize("output", ["dense", "sparse"])
+def test_dim_reduce_feature_matrix(data, dropped_columns, output):
+    """Test the dimension reduction of a feature matrix."""
+    terpene = Terpene(data=data)
+    terpene.preprocess(dropped_columns=dropped_columns, output=output)
+    assert isinstance(terpene.data, FeatureMatrix)
+    assert sparse.issparse(terpene.data.X) == (output == "sparse")
+
+    for model in [PCA(n_components=2), TruncatedSVD(n_components=2)]:
+        data_reduced = terpene.dim_reduce(model=model, inplace=False)
+        assert isinstance(data_reduced, FeatureMatrix)
+        assert data_reduced.X.shape == (data.shape[0], 2)
+        np.testing.assert_array_equal(data_reduced.feature_names, ["d0", "d1"])
+        assert data_reduced.y is terpene.data.y
+
+
+def test_dim_reduce_projection(data, dropped_columns):
+    """Test reusing the fitted projection of the dimension reduction."""
+    terpene = Terpene(data=data)
+    terpene.preprocess(dropped_columns=dropped_columns)
+    preprocessed = terpene.data.copy()
+
+    data_reduced = terpene.dim_reduce(inplace=False, engine="incremental")
+    projection = terpene.projection
+    assert data_reduced.shape[1] == projection.n_components + 1
+
+    other = Terpene(data=preprocessed)
+    pd.testing.assert_frame_equal(
+        other.dim_reduce(inplace=False, projection=projection), data_reduced
+    )
+    assert other.projection is projection
+
+
+def test_dim_reduce_cache(data, dropped_columns, tmp_path, monkeypatch):
+    """Test caching the fitted projection on disk."""
+    terpene = Terpene(data=data)
+    terpene.preprocess(dropped_columns=dropped_columns)
+    cache_dir = str(tmp_path)
+    data_reduced = terpene.dim_reduce(inplace=False, cache=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    # A hit skips the fit
+    def fit_projection(*args, **kwargs):
+        raise AssertionError("The projection is refitted.")
+
+    monkeypatch.setattr(preprocessing, "fit_projection", fit_projection)
+    pd.testing.assert_frame_equal(
+        terpene.dim_reduce(inplace=False, cache=cache_dir), data_reduced
+    )
+    with pytest.raises(AssertionError):
+        terpene.dim_reduce(inplace=False, cache=cache_dir, n_components=2)
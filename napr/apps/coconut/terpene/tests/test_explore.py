@@ -68,3 +68,21 @@ def test_plot_hbond(data):
         assert isinstance(axis, axes.Axes)
 
     assert len(ax) == 14
+
+
+def test_plot_categorical_subclass(data):
+    """Test the plots with categorical subclasses, e.g. from the cache."""
+    data = data.astype({"chemicalSubClass": "category"})
+    assert set(_filter_subclasses(data)["chemicalSubClass"].cat.categories) == {
+        key for key in SUBCLASS_NAME.keys() if key != "other"
+    }
+
+    plot = Plot(data)
+    for method in [
+        plot.dist_subclass_mw_logp_nplscore,
+        plot.violin_mw_logp_nplscore,
+        plot.lipinsky,
+        plot.hbond,
+    ]:
+        fig, _ = method()
+        assert isinstance(fig, figure.Figure)
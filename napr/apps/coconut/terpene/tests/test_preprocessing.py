@@ -1,11 +1,30 @@
 """Test the preprocessing module."""
 
+import tracemalloc
+
+import numpy as np
 import pandas as pd
 from napr.utils.random import rand_list_string
 
 import pytest
 
-from napr.apps.coconut.terpene.preprocessing import Preprocess
+from scipy import sparse
+from sklearn.decomposition import PCA
+from sklearn.model_selection import train_test_split
+
+from napr.apps.coconut.terpene.preprocessing import (
+    ENCODED_COLUMNS,
+    FeatureMatrix,
+    Preprocess,
+    Projection,
+    TerpenePreprocessor,
+    choose_engine,
+    expand_chunks,
+    extract_taxa,
+    fit_projection,
+    one_hot_encode,
+    parse_bcut_descriptor,
+)
 
 
 @pytest.fixture
@@ -24,6 +43,32 @@ def test_split_bcutDescriptor(preprocessor):
         assert column in preprocessor.data.columns
 
 
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_parse_bcut_descriptor(dtype):
+    """Test the parse_bcut_descriptor function."""
+    values = pd.Series(
+        ["[1,2.5,3,4,5,6]", None, "[1, null,3]", "[]", "[1,2,3,4,5,6,7]", None]
+    )
+    nan = np.nan
+    expected = np.array(
+        [
+            [1, 2.5, 3, 4, 5, 6],
+            [nan] * 6,
+            [1, nan, 3, nan, nan, nan],
+            [nan] * 6,
+            [1, 2, 3, 4, 5, 6],
+            [nan] * 6,
+        ],
+        dtype=dtype,
+    )
+    parsed = parse_bcut_descriptor(values, dtype=dtype)
+    np.testing.assert_array_equal(parsed, expected)
+    assert parsed.dtype == dtype and parsed.flags["C_CONTIGUOUS"]
+
+    assert parse_bcut_descriptor(pd.Series(["[1]"]), n_values=2).shape == (1, 2)
+    assert parse_bcut_descriptor(pd.Series([], dtype=object)).shape == (0, 6)
+
+
 def test_extract_tax(preprocessor):
     """Test the _extract_tax function."""
     textTaxa = preprocessor.data.pop("textTaxa")
@@ -36,6 +81,20 @@ def test_extract_tax(preprocessor):
         assert column in preprocessor.data.columns
 
 
+def test_extract_taxa():
+    """Test the extract_taxa function."""
+    values = pd.Series(["[plants, marine]", None, "[fungi]", "[plants]", "x"])
+    expected = np.array(
+        [[1, 1, 0, 0], [0, 0, 0, 0], [0, 0, 0, 1], [1, 0, 0, 0], [0, 0, 0, 0]]
+    )
+    taxa = extract_taxa(values)
+    np.testing.assert_array_equal(taxa, expected)
+    assert taxa.dtype == np.uint8
+
+    taxa = extract_taxa(values, taxa=["fungi", "animals"], dtype="bool")
+    np.testing.assert_array_equal(taxa, expected[:, [3, 3]] & [True, False])
+
+
 def test_encode(preprocessor, train_test_data):
     """Test the _encode function."""
     train_data, test_data = train_test_data
@@ -54,3 +113,250 @@ def test_encode(preprocessor, train_test_data):
         preprocessor._encode(train_data, test_data)
         assert nunique_train == train_data[col].nunique()
         assert nunique_test >= test_data[col].nunique()
+
+
+def test_expand_chunks(data):
+    """Test the expand_chunks function."""
+    chunksize = 10
+    chunks = (
+        data.iloc[i : i + chunksize] for i in range(0, len(data), chunksize)
+    )
+    expanded = pd.concat(expand_chunks(chunks))
+
+    preprocessor = Preprocess(data=data)
+    preprocessor._split_bcutDescriptor()
+    preprocessor._extract_tax()
+    pd.testing.assert_frame_equal(expanded, preprocessor.data)
+
+
+def test_terpene_preprocessor(data, dropped_columns, tmp_path):
+    """Test the TerpenePreprocessor class."""
+    train, test = train_test_split(data, train_size=0.75, random_state=777)
+    preprocessor = TerpenePreprocessor(dropped_columns=dropped_columns)
+    transformed = preprocessor.fit(train).transform(test)
+
+    # Same as Preprocess.preprocess, which is fitted on the same train data
+    expected = Preprocess(data=data).preprocess(
+        random_state=777, dropped_columns=dropped_columns
+    )
+    assert list(transformed.columns) == list(expected.columns[:-1])
+    pd.testing.assert_frame_equal(
+        transformed,
+        expected.loc[test.index, transformed.columns],
+        check_dtype=False,
+    )
+
+    # Fast path for records
+    records = test.to_dict(orient="records")
+    np.testing.assert_allclose(
+        preprocessor.transform_records(records), transformed.to_numpy()
+    )
+    np.testing.assert_allclose(
+        preprocessor.transform_records(
+            [{"directParentClassification": "unknown"}]
+        ),
+        preprocessor.transform(
+            test.iloc[:1].assign(
+                directParentClassification="unknown",
+                **{
+                    column: np.nan
+                    for column in ["alogp", "npl_score", "bcutDescriptor"]
+                    + ["lipinskiRuleOf5Failures", "textTaxa"]
+                    + ["hBondAcceptorCount", "hBondDonorCount"]
+                },
+            )
+        ).to_numpy(),
+    )
+
+    # Serialized state
+    path = str(tmp_path / "preprocessor.json")
+    preprocessor.save(path)
+    loaded = TerpenePreprocessor.load(path)
+    pd.testing.assert_frame_equal(loaded.transform(test), transformed)
+    np.testing.assert_allclose(
+        preprocessor.fit_transform(train),
+        TerpenePreprocessor(dropped_columns=dropped_columns)
+        .fit(train)
+        .transform(train),
+    )
+
+
+def test_preprocess_low_memory(data, dropped_columns):
+    """Test the low memory mode of the preprocess method."""
+    original = data.copy()
+    expected = Preprocess(data=data).preprocess(dropped_columns=dropped_columns)
+
+    preprocessor = Preprocess(data=data, copy=False)
+    preprocessed = preprocessor.preprocess(
+        dropped_columns=dropped_columns, low_memory=True
+    )
+    pd.testing.assert_frame_equal(data, original)
+    assert preprocessor.peak_memory > 0
+
+    # The peak traced by the caller is kept
+    tracemalloc.start()
+    try:
+        peak = np.ones(10**7)
+        del peak
+        Preprocess(data, copy=False).preprocess(
+            dropped_columns=dropped_columns, low_memory=True
+        )
+        assert tracemalloc.get_traced_memory()[1] >= 8 * 10**7
+    finally:
+        tracemalloc.stop()
+
+    assert list(preprocessed.columns) == list(expected.columns)
+    assert preprocessed.index.equals(data.index)
+    features = preprocessed.columns[:-1]
+    assert (preprocessed[features].dtypes == "float32").all()
+    pd.testing.assert_frame_equal(
+        preprocessed,
+        expected.loc[data.index],
+        check_dtype=False,
+        atol=1e-5,
+    )
+
+
+def test_one_hot_encode():
+    """Test the one_hot_encode function."""
+    values = np.array(["b", "a", None, "c", "a"], dtype=object)
+    train = np.array([True, True, True, False, False])
+    one_hot, categories = one_hot_encode(values, train)
+
+    np.testing.assert_array_equal(categories, ["a", "b"])
+    assert sparse.isspmatrix_csr(one_hot) and one_hot.dtype == "float32"
+    np.testing.assert_array_equal(
+        one_hot.toarray(), [[0, 1], [1, 0], [0, 0], [0, 0], [1, 0]]
+    )
+
+
+@pytest.mark.parametrize("low_memory", [False, True])
+def test_preprocess_output(data, dropped_columns, low_memory):
+    """Test the dense and sparse outputs of the preprocess method."""
+    with pytest.raises(ValueError):
+        Preprocess(data=data).preprocess(output="series")
+
+    kwargs = dict(dropped_columns=dropped_columns, low_memory=low_memory)
+    expected = Preprocess(data=data).preprocess(**kwargs)
+    features = expected.columns[:-1]
+
+    dense = Preprocess(data=data).preprocess(output="dense", **kwargs)
+    assert isinstance(dense, FeatureMatrix)
+    assert isinstance(dense.X, np.ndarray) and dense.X.dtype == "float32"
+    np.testing.assert_array_equal(dense.feature_names, features)
+    np.testing.assert_allclose(dense.X, expected[features], rtol=1e-6)
+    pd.testing.assert_series_equal(dense.y, expected["chemicalSubClass"])
+
+    matrix = Preprocess(data=data).preprocess(output="sparse", **kwargs)
+    assert sparse.isspmatrix_csr(matrix.X) and matrix.X.dtype == "float32"
+    # Smaller than the dense matrix
+    X = matrix.X
+    assert X.data.nbytes + X.indices.nbytes < 4 * X.shape[0] * X.shape[1]
+    pd.testing.assert_series_equal(matrix.y, expected["chemicalSubClass"])
+    columns = [col for col in features if col not in ENCODED_COLUMNS]
+    np.testing.assert_array_equal(matrix.feature_names[: len(columns)], columns)
+    np.testing.assert_allclose(
+        matrix.X[:, : len(columns)].toarray(), expected[columns], rtol=1e-6
+    )
+
+    # One-hot encoded directParentClassification, of the train categories
+    one_hot = matrix.X[:, len(columns) :].toarray()
+    assert one_hot.shape[1] == len(matrix.feature_names) - len(columns)
+    prefix = "directParentClassification_"
+    names = matrix.feature_names[len(columns) :]
+    categories = [name.removeprefix(prefix) for name in names]
+    raw = data.loc[matrix.y.index, "directParentClassification"]
+    np.testing.assert_array_equal(one_hot.sum(axis=1), raw.isin(categories))
+    np.testing.assert_array_equal(
+        np.array(categories)[one_hot[raw.isin(categories)].argmax(axis=1)],
+        raw[raw.isin(categories)],
+    )
+
+    # Dense, if mostly non-zero, e.g. with a single category
+    single = data.assign(directParentClassification="x")
+    matrix = Preprocess(data=single).preprocess(output="sparse", **kwargs)
+    assert isinstance(matrix.X, np.ndarray) and matrix.X.dtype == "float32"
+    np.testing.assert_array_equal(
+        matrix.feature_names, [*columns, "directParentClassification_x"]
+    )
+    np.testing.assert_allclose(
+        matrix.X[:, : len(columns)], expected[columns], rtol=1e-6
+    )
+
+
+@pytest.mark.parametrize(
+    "n_samples, n_features, itemsize, expected",
+    [
+        (1000, 50, 8, "full"),
+        (1000, 600, 8, "randomized"),
+        (10_000_000, 20, 8, "incremental"),
+        (10_000_000, 20, 4, "full"),
+    ],
+)
+def test_choose_engine(n_samples, n_features, itemsize, expected):
+    """Test the choose_engine function."""
+    assert choose_engine(n_samples, n_features, itemsize) == expected
+
+
+@pytest.fixture(scope="module")
+def features():
+    """Correlated features, mostly explained by a few components."""
+    rng = np.random.default_rng(0)
+    latent = rng.normal(size=(3000, 4)) * [10, 6, 4, 2]
+    values = latent @ rng.normal(size=(4, 30)) + rng.normal(size=(3000, 30))
+    return pd.DataFrame(values, columns=["f" + str(i) for i in range(30)])
+
+
+@pytest.mark.parametrize(
+    "engine", ["auto", "full", "randomized", "incremental"]
+)
+def test_fit_projection(features, engine):
+    """Test fitting the projection with each engine."""
+    model = PCA(n_components=0.95).fit(features)
+    projection = fit_projection(features, engine=engine, batch_size=500)
+
+    assert isinstance(projection, Projection)
+    assert projection.n_components == model.n_components_
+    np.testing.assert_array_equal(projection.feature_names, features.columns)
+    # Equal up to the signs of the components
+    np.testing.assert_allclose(
+        np.abs(projection.transform(features[features.columns[::-1]])),
+        np.abs(model.transform(features)),
+        rtol=1e-3,
+        atol=1e-3,
+    )
+
+    projection = fit_projection(features, n_components=2, engine=engine)
+    assert projection.n_components == 2
+
+
+def test_fit_projection_chunks(features):
+    """Test fitting the projection out-of-core, from chunks."""
+    chunks = (features.iloc[i : i + 100] for i in range(0, len(features), 100))
+    projection = fit_projection(chunks, batch_size=1000)
+    expected = fit_projection(features, engine="incremental", batch_size=1000)
+    np.testing.assert_allclose(projection.components, expected.components)
+    np.testing.assert_array_equal(projection.feature_names, features.columns)
+
+    values = features.to_numpy(dtype="float32")
+    projected = projection.transform(sparse.csr_matrix(values))
+    assert projected.dtype == "float32"
+    np.testing.assert_allclose(
+        projected, projection.transform(features), rtol=1e-3, atol=1e-3
+    )
+
+    # A last batch shorter than the components is merged
+    values = np.random.default_rng(0).random((1001, 10))
+    chunks = (values[i : i + 50] for i in range(0, len(values), 50))
+    for data in [values, chunks]:
+        projection = fit_projection(
+            data, n_components=3, engine="incremental", batch_size=50
+        )
+        assert projection.n_components == 3
+
+    with pytest.raises(ValueError):
+        fit_projection(features, engine="lapack")
+    with pytest.raises(ValueError):
+        fit_projection(iter([features]), engine="full")
+    with pytest.raises(ValueError):
+        fit_projection(iter([]))
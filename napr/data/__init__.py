@@ -1,5 +1,12 @@
 """The data API."""
 
-from ._load import load_terpene
+from napr.utils._lazy import attach
 
-__all__ = ["load_terpene"]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "load_terpene": "._load",
+        "iter_terpene": "._load",
+        "transcode_terpene": "._load",
+    },
+)
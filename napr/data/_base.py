@@ -2,37 +2,110 @@
 
 import os
 import re
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 CURR_DIR = os.getcwd()
 
+# Files smaller than this are downloaded over a single connection
+PARALLEL_MIN_SIZE = 32 * 1024 * 1024
 
-def download(url: str, path: str = CURR_DIR, chunk_size: int = 1024) -> None:
-    """Download a file from a URL."""
+
+def make_session(
+    num_connections: int = 1, retries: int = 5, backoff_factor: float = 0.5
+) -> requests.Session:
+    """Returns a session with connection pooling and retry with backoff.
+
+    Args:
+        num_connections: Number of pooled connections. Defaults to 1.
+        retries: Number of retries of failed requests. Defaults to 5.
+        backoff_factor: Backoff factor between retries, in seconds. Defaults
+            to 0.5.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["HEAD", "GET"],
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry, pool_connections=1, pool_maxsize=num_connections
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def download(
+    url: str,
+    path: str = CURR_DIR,
+    chunk_size: int = 1024 * 1024,
+    sha256: str | None = None,
+    num_connections: int = 1,
+    session: requests.Session | None = None,
+) -> str:
+    """Download a file from a URL.
+
+    The file is downloaded into path + ".part" and atomically renamed to path
+    on completion, so an interrupted download never leaves a truncated file
+    behind. Calling it again resumes the download with HTTP Range requests, if
+    the server supports them. Large files can be downloaded over several
+    connections, each fetching a range of the file.
+
+    Args:
+        url: The URL.
+        path: The path of the file, or of its directory. Defaults to current
+            directory.
+        chunk_size: Number of bytes written at a time. Defaults to 1 MiB.
+        sha256: Expected SHA-256 hex digest of the file. Defaults to None, for
+            which the file is not verified.
+        num_connections: Number of connections for files of at least
+            PARALLEL_MIN_SIZE bytes. Defaults to 1.
+        session: The session to use. Defaults to None, for which a session
+            with retry and backoff is created.
+
+    Raises:
+        ValueError: if url is empty.
+        ValueError: if the SHA-256 digest of the file does not match sha256.
+        requests.exceptions.RequestException: if a request fails after the
+            retries.
+
+    Returns:
+        The path of the downloaded file.
+    """
     if not url:
         raise ValueError("url must not be empty.")
+    if num_connections < 1:
+        raise ValueError("num_connections must be greater than 0.")
 
-    try:
-        responce = requests.get(url, stream=True)
-        responce.raise_for_status()
-    except requests.exceptions.RequestException as exc:
-        raise SystemExit(exc) from exc
+    if session is None:
+        session = make_session(num_connections=num_connections)
 
-    # fmt: off
-    if 'content-disposition' in responce.headers:
-        dispos = responce.headers['content-disposition']
-        file_name = re.findall("filename=\"(.+)\"", dispos)[0]
+    with session.get(url, stream=True) as responce:
+        responce.raise_for_status()
+        headers = responce.headers
 
-    # fmt: on
     if os.path.isdir(path):
         file_name = "tmp"
+        # fmt: off
+        if 'content-disposition' in headers:
+            dispos = headers['content-disposition']
+            file_name = re.findall("filename=\"(.+)\"", dispos)[0]
+        # fmt: on
         file_path = os.path.join(path, file_name)
     else:
         file_name = os.path.basename(path)
         file_path = path
+    part_path = file_path + ".part"
 
-    file_size = int(responce.headers.get("content-length", 0))
+    file_size = int(headers.get("content-length", 0))
+    accept_ranges = headers.get("accept-ranges", "none").lower() == "bytes"
     progress_bar = tqdm(
         desc=f"Downloading {file_name}",
         total=file_size,
@@ -40,7 +113,132 @@ def download(url: str, path: str = CURR_DIR, chunk_size: int = 1024) -> None:
         unit_scale=True,
         unit_divisor=1024,
     )
-    with progress_bar, open(file_path, "wb") as file:
-        for data in responce.iter_content(chunk_size=chunk_size):
-            size = file.write(data)
-            progress_bar.update(size)
+    with progress_bar:
+        if (
+            num_connections > 1
+            and accept_ranges
+            and file_size >= PARALLEL_MIN_SIZE
+        ):
+            _download_ranges(
+                session,
+                url,
+                part_path,
+                file_size,
+                num_connections,
+                chunk_size,
+                progress_bar,
+            )
+        else:
+            _download_stream(
+                session, url, part_path, chunk_size, progress_bar
+            )
+
+    if sha256 is not None and sha256sum(part_path) != sha256.lower():
+        os.remove(part_path)
+        raise ValueError(f"SHA-256 digest of {file_name} does not match.")
+
+    os.replace(part_path, file_path)
+    return file_path
+
+
+def _download_stream(
+    session: requests.Session,
+    url: str,
+    part_path: str,
+    chunk_size: int,
+    progress_bar: tqdm,
+) -> None:
+    """Download over a single connection, resuming a partial file."""
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with session.get(url, headers=headers, stream=True) as responce:
+        if responce.status_code == 416:  # The partial file is complete
+            progress_bar.update(offset)
+            return None
+        responce.raise_for_status()
+
+        # The server ignored the Range header, so start over
+        if responce.status_code != 206:
+            offset = 0
+        progress_bar.update(offset)
+
+        with open(part_path, "ab" if offset else "wb") as file:
+            for data in responce.iter_content(chunk_size=chunk_size):
+                size = file.write(data)
+                progress_bar.update(size)
+
+
+def _download_ranges(
+    session: requests.Session,
+    url: str,
+    part_path: str,
+    file_size: int,
+    num_connections: int,
+    chunk_size: int,
+    progress_bar: tqdm,
+) -> None:
+    """Download ranges of the file over several connections.
+
+    The completed ranges are recorded in part_path + ".json", so an
+    interrupted download only fetches the remaining ranges again.
+    """
+    state_path = part_path + ".json"
+    range_size = -(-file_size // num_connections)
+    ranges = [
+        (start, min(start + range_size, file_size) - 1)
+        for start in range(0, file_size, range_size)
+    ]
+
+    done = []
+    if os.path.exists(part_path) and os.path.exists(state_path):
+        with open(state_path) as file:
+            state = json.load(file)
+        if state["size"] == file_size and state["ranges"] == ranges:
+            done = [tuple(item) for item in state["done"]]
+    if not done:
+        with open(part_path, "wb") as file:
+            file.truncate(file_size)
+    progress_bar.update(sum(end - start + 1 for start, end in done))
+
+    def _fetch(byte_range: tuple[int, int]) -> tuple[int, int]:
+        start, end = byte_range
+        headers = {"Range": f"bytes={start}-{end}"}
+        with session.get(url, headers=headers, stream=True) as responce:
+            responce.raise_for_status()
+            if responce.status_code != 206:
+                raise requests.exceptions.HTTPError(
+                    f"Range {start}-{end} not served partially.",
+                    response=responce,
+                )
+            with open(part_path, "r+b") as file:
+                file.seek(start)
+                for data in responce.iter_content(chunk_size=chunk_size):
+                    size = file.write(data)
+                    progress_bar.update(size)
+        return byte_range
+
+    try:
+        with ThreadPoolExecutor(max_workers=num_connections) as executor:
+            for byte_range in executor.map(
+                _fetch, [item for item in ranges if item not in done]
+            ):
+                done.append(byte_range)
+    finally:
+        with open(state_path, "w") as file:
+            json.dump({"size": file_size, "ranges": ranges, "done": done}, file)
+    os.remove(state_path)
+
+
+def sha256sum(path: str, chunk_size: int = 1 << 20) -> str:
+    """Returns the SHA-256 hex digest of a file.
+
+    Args:
+        path: Path to the file.
+        chunk_size: Number of bytes read at a time. Defaults to 1 MiB.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
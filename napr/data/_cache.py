@@ -0,0 +1,279 @@
+"""Columnar on-disk cache of the datasets.
+
+The first load of a dataset writes a Parquet sidecar, together with a JSON file
+holding its per-column dtype schema. Both are keyed by the name and the SHA-256
+digest of the source file and the dataset version, so a changed source file is
+never served from a stale cache. The digest is stored with the size and the
+modification time of the source, and the source is only hashed again when they
+change. Parquet needs the optional dependency pyarrow, installed
+with the parquet extra.
+"""
+
+import glob
+import json
+import os
+from collections.abc import Iterator
+from typing import Any
+
+import pandas as pd
+
+from . import _base
+
+CATEGORICAL_COLUMNS = [
+    "chemicalSubClass",
+    "chemicalClass",
+    "directParentClassification",
+]
+
+
+def _require_pyarrow() -> None:
+    """Raise an ImportError naming the extra if pyarrow is not installed."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError as error:
+        raise ImportError(
+            "The cache requires the parquet extra: pip install napr[parquet]"
+        ) from error
+
+
+def cache_paths(
+    path: str, cache_dir: str | None = None
+) -> tuple[str, str, str]:
+    """Returns the digest of the source file and the paths of its sidecars.
+
+    Args:
+        path: Path to the source file.
+        cache_dir: Directory of the sidecars. Defaults to None, which is the
+            directory of the source file.
+
+    Returns:
+        The SHA-256 digest of the source file, the path of the Parquet sidecar
+            and the path of its schema.
+
+    Raises:
+        ImportError: If pyarrow is not installed.
+    """
+    _require_pyarrow()
+    if cache_dir is None:
+        cache_dir = os.path.dirname(os.path.abspath(path))
+
+    # The name keeps the compression extension, so the sidecars of the bz2
+    # and the transcoded sources do not replace each other
+    prefix = os.path.join(cache_dir, os.path.basename(path))
+    digest = _source_digest(path, prefix)
+    prefix += f"-{digest[:16]}"
+    return digest, prefix + ".parquet", prefix + ".json"
+
+
+def _source_digest(path: str, prefix: str) -> str:
+    """Returns the SHA-256 digest of the source file.
+
+    The digest stored in a schema of the source is reused as long as the size
+    and the modification time of the source are the stored ones. Otherwise, the
+    source is hashed and the stored ones are updated if its content is the same.
+
+    Args:
+        path: Path to the source file.
+        prefix: Path of the sidecars of the source, without the digest.
+    """
+    stat = os.stat(path)
+    for schema_path in glob.glob(glob.escape(prefix) + "-*.json"):
+        with open(schema_path) as file:
+            schema = json.load(file)
+        stored = schema.get("size"), schema.get("mtime_ns")
+        if stored == (stat.st_size, stat.st_mtime_ns):
+            return schema["sha256"]
+
+    digest = _base.sha256sum(path)
+    schema_path = f"{prefix}-{digest[:16]}.json"
+    if os.path.exists(schema_path):
+        with open(schema_path) as file:
+            schema = json.load(file)
+        if schema.get("sha256") == digest:
+            schema.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            with open(schema_path, "w") as file:
+                json.dump(schema, file, indent=2)
+    return digest
+
+
+
+def build_schema(data: pd.DataFrame) -> dict[str, str]:
+    """Returns the per-column dtype schema of the data.
+
+    The columns in CATEGORICAL_COLUMNS are stored as categoricals and the rest
+    keep the dtypes inferred by the CSV parser.
+
+    Args:
+        data: The data.
+    """
+    schema = {column: str(dtype) for column, dtype in data.dtypes.items()}
+    for column in CATEGORICAL_COLUMNS:
+        if column in schema:
+            schema[column] = "category"
+    return schema
+
+
+def _apply_schema(data: pd.DataFrame, schema: dict[str, str]) -> pd.DataFrame:
+    """Cast the columns whose dtype differs from the schema."""
+    mismatched = {
+        column: dtype
+        for column, dtype in schema.items()
+        if column in data.columns and str(data[column].dtype) != dtype
+    }
+    return data.astype(mismatched) if mismatched else data
+
+
+def _stringify_mixed(data: pd.DataFrame) -> pd.DataFrame:
+    """Convert the values of mixed-type object columns into strings, as they
+    cannot be written to Parquet. Missing values are kept."""
+    for column in data.columns[data.dtypes == "object"]:
+        values = data[column]
+        if pd.api.types.infer_dtype(values, skipna=True) != "string":
+            data[column] = values.where(values.isna(), values.astype(str))
+    return data
+
+
+def write_cache(
+    data: pd.DataFrame,
+    path: str,
+    digest: str,
+    version: str,
+    parquet_path: str,
+    schema_path: str,
+) -> pd.DataFrame:
+    """Write the data into a Parquet sidecar along with its schema.
+
+    Sidecars of older versions of the same source file are removed.
+
+    Args:
+        data: The data.
+        path: Path to the source file.
+        digest: SHA-256 digest of the source file.
+        version: Version of the data.
+        parquet_path: Path of the Parquet sidecar.
+        schema_path: Path of the schema.
+
+    Returns:
+        The data, cast to the schema.
+    """
+    schema = build_schema(data)
+    data = _apply_schema(_stringify_mixed(data), schema)
+
+    cache_dir = os.path.dirname(parquet_path)
+    os.makedirs(cache_dir, exist_ok=True)
+    prefix = os.path.basename(parquet_path).rsplit("-", 1)[0]
+    for stale in glob.glob(os.path.join(cache_dir, glob.escape(prefix) + "-*")):
+        if stale not in (parquet_path, schema_path):
+            os.remove(stale)
+
+    # Write to a temporary file first, so an interrupted write is never read
+    tmp_path = parquet_path + ".tmp"
+    data.to_parquet(tmp_path)
+    os.replace(tmp_path, parquet_path)
+    stat = os.stat(path)
+    with open(schema_path, "w") as file:
+        json.dump(
+            {
+                "version": version,
+                "sha256": digest,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "dtypes": schema,
+            },
+            file,
+            indent=2,
+        )
+    return data
+
+
+def is_cached(
+    digest: str, version: str, parquet_path: str, schema_path: str
+) -> bool:
+    """Returns whether an up to date sidecar of the source file exists.
+
+    Args:
+        digest: SHA-256 digest of the source file.
+        version: Version of the data.
+        parquet_path: Path of the Parquet sidecar.
+        schema_path: Path of the schema.
+    """
+    if not os.path.exists(parquet_path) or not os.path.exists(schema_path):
+        return False
+
+    with open(schema_path) as file:
+        schema = json.load(file)
+    return schema.get("sha256") == digest and schema.get("version") == version
+
+
+def read_cache(
+    parquet_path: str,
+    schema_path: str,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, Any]] | None = None,
+) -> pd.DataFrame:
+    """Read the data from a Parquet sidecar.
+
+    The columns and filters are pushed down into the Parquet reader. As with
+    the CSV reader, missing values never satisfy a filter.
+
+    Args:
+        parquet_path: Path of the Parquet sidecar.
+        schema_path: Path of the schema.
+        columns: The columns to read. Defaults to None, which is all columns.
+        filters: The row filters, as (column, op, value) tuples. Defaults to
+            None.
+
+    Returns:
+        The data.
+    """
+    with open(schema_path) as file:
+        schema = json.load(file)
+
+    if filters:
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        expression = pq.filters_to_expression(filters)
+        for column, _, _ in filters:
+            expression &= pc.field(column).is_valid()
+        filters = expression  # type: ignore
+
+    data = pd.read_parquet(parquet_path, columns=columns, filters=filters)
+    return _apply_schema(data, schema["dtypes"])
+
+
+def iter_cache(
+    parquet_path: str,
+    schema_path: str,
+    chunksize: int,
+    columns: list[str] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Iterate over the data of a Parquet sidecar in chunks.
+
+    Args:
+        parquet_path: Path of the Parquet sidecar.
+        schema_path: Path of the schema.
+        chunksize: Number of rows per chunk.
+        columns: The columns to read. Defaults to None, which is all columns.
+
+    Yields:
+        Chunks of the data.
+    """
+    import pyarrow.parquet as pq
+
+    with open(schema_path) as file:
+        schema = json.load(file)
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    index_columns = [
+        column
+        for column in parquet_file.schema_arrow.pandas_metadata["index_columns"]
+        if isinstance(column, str)  # A RangeIndex is stored as metadata
+    ]
+    if columns is not None:
+        columns = list(dict.fromkeys(columns + index_columns))
+
+    for batch in parquet_file.iter_batches(
+        batch_size=chunksize, columns=columns
+    ):
+        yield _apply_schema(batch.to_pandas(), schema["dtypes"])
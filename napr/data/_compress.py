@@ -0,0 +1,252 @@
+"""Fast decompression and transcoding of the datasets.
+
+A bz2 file is decompressed on multiple cores, either by a parallel bzip2 tool
+(lbzip2 or pbzip2), if it is installed, or by decompressing the streams of a
+multi-stream bz2 file (e.g. made by pbzip2 or lbzip2) in threads, which is
+possible since the bz2 module releases the GIL. The streams are found by their
+byte-aligned headers; the blocks inside a single stream are not byte-aligned, so
+a single-stream file without such a tool is decompressed on one core.
+"""
+
+import bz2
+import contextlib
+import gzip
+import io
+import mmap
+import os
+import re
+import shutil
+import subprocess
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO
+
+# Parallel bzip2 tools, with their arguments for decompressing to stdout
+DECOMPRESSORS = {
+    "lbzip2": ["-d", "-c", "-n", "{n_jobs}"],
+    "pbzip2": ["-d", "-c", "-p{n_jobs}"],
+}
+
+# "BZh", the block size and the magic number of the first block of a stream
+BZ2_STREAM_HEADER = re.compile(rb"BZh[1-9]1AY&SY")
+
+# Minimum size of the compressed segments decompressed by each thread
+SEGMENT_SIZE = 4 * 1024 * 1024
+
+# Extensions of the compression formats of transcode()
+EXTENSIONS = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def effective_n_jobs(n_jobs: int | None) -> int:
+    """Returns the number of jobs: None means 1 and negative values count
+    back from the number of CPUs, e.g. -1 means all CPUs."""
+    if n_jobs is None:
+        return 1
+    if n_jobs == 0:
+        raise ValueError("n_jobs must not be 0.")
+    if n_jobs < 0:
+        return max(1, (os.cpu_count() or 1) + 1 + n_jobs)
+    return n_jobs
+
+
+class _IterStream(io.RawIOBase):
+    """A read-only binary stream over an iterator of bytes."""
+
+    def __init__(self, chunks: Iterator[bytes]) -> None:
+        self._chunks = chunks
+        self._buffer = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
+def bz2_segments(
+    path: str, segment_size: int | None = None
+) -> list[tuple[int, int]]:
+    """Returns the (start, end) byte offsets of the segments of a bz2 file.
+
+    Each segment holds whole streams and is at least segment_size bytes long,
+    except the last one.
+
+    Args:
+        path: Path to the bz2 file.
+        segment_size: Minimum size of the segments. Defaults to None, which
+            is SEGMENT_SIZE.
+    """
+    if segment_size is None:
+        segment_size = SEGMENT_SIZE
+
+    file_size = os.path.getsize(path)
+    if not file_size:
+        return []
+
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        starts = [match.start() for match in BZ2_STREAM_HEADER.finditer(data)]
+
+    segments = []
+    segment_start = 0
+    for start in starts[1:]:
+        if start - segment_start >= segment_size:
+            segments.append((segment_start, start))
+            segment_start = start
+    segments.append((segment_start, file_size))
+    return segments
+
+
+def _decompress_segment(path: str, start: int, end: int) -> bytes:
+    """Decompress the streams of a segment of a bz2 file."""
+    with open(path, "rb") as file:
+        file.seek(start)
+        return bz2.decompress(file.read(end - start))
+
+
+def _iter_bz2(
+    path: str, segments: list[tuple[int, int]], n_jobs: int
+) -> Iterator[bytes]:
+    """Iterate over the decompressed segments of a bz2 file, decompressing
+    up to 2 * n_jobs segments ahead."""
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        for start, end in segments:
+            pending.append(
+                executor.submit(_decompress_segment, path, start, end)
+            )
+            if len(pending) >= 2 * n_jobs:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _decompressor(n_jobs: int) -> list[str] | None:
+    """Returns the command of an installed parallel bzip2 tool, if any."""
+    for name, args in DECOMPRESSORS.items():
+        executable = shutil.which(name)
+        if executable:
+            return [executable] + [arg.format(n_jobs=n_jobs) for arg in args]
+    return None
+
+
+@contextlib.contextmanager
+def open_source(
+    path: str, n_jobs: int | None = None
+) -> Iterator[tuple[str | BinaryIO, str | None]]:
+    """Open a (compressed) source file for pandas.read_csv.
+
+    bz2 files are decompressed with n_jobs cores; other files are left to
+    pandas.
+
+    Args:
+        path: Path to the source file.
+        n_jobs: Number of cores. Defaults to None, which means 1.
+
+    Yields:
+        The path or a binary stream of the decompressed data, and the
+            compression to pass to pandas.read_csv.
+    """
+    n_jobs = effective_n_jobs(n_jobs)
+    if n_jobs == 1 or not path.endswith(".bz2"):
+        yield path, "infer"
+        return
+
+    command = _decompressor(n_jobs)
+    if command is None:
+        segments = bz2_segments(path)
+        if len(segments) == 1:
+            yield path, "infer"
+        else:
+            chunks = _iter_bz2(path, segments, n_jobs)
+            with io.BufferedReader(_IterStream(chunks)) as file:
+                yield file, None
+        return
+
+    with subprocess.Popen(
+        command + [path], stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    ) as process:
+        try:
+            yield process.stdout, None  # type: ignore
+        except BaseException:
+            process.kill()
+            raise
+        _, stderr = process.communicate()
+    if process.returncode:
+        raise OSError(f"Decompressing {path} failed: {stderr.decode()}")
+
+
+def transcode(
+    src: str,
+    dst: str,
+    compression: str = "zstd",
+    n_jobs: int | None = None,
+    chunk_size: int = 1024 * 1024,
+) -> str:
+    """Transcode a bz2 file into a faster to decompress format.
+
+    zstd requires the zstandard package, installed with the zstd extra. The
+    file is written into dst + ".part" and atomically renamed to dst, so an
+    interrupted transcoding never leaves a truncated dst behind.
+
+    Args:
+        src: Path to the bz2 file.
+        dst: Path to the transcoded file.
+        compression: "zstd" or "gzip". Defaults to "zstd".
+        n_jobs: Number of cores for decompression (and zstd compression).
+            Defaults to None, which means 1.
+        chunk_size: Number of bytes copied at a time. Defaults to 1 MiB.
+
+    Raises:
+        ValueError: if compression is not supported.
+        ImportError: if compression is "zstd" and zstandard is not installed.
+
+    Returns:
+        The path to the transcoded file.
+    """
+    if compression not in EXTENSIONS:
+        raise ValueError(f"Compression {compression} not supported.")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError(
+                "zstd compression requires the zstd extra: "
+                "pip install napr[zstd]"
+            ) from error
+
+    tmp_path = dst + ".part"
+    try:
+        with contextlib.ExitStack() as stack:
+            source, _ = stack.enter_context(open_source(src, n_jobs=n_jobs))
+            if isinstance(source, str):
+                source = stack.enter_context(bz2.open(source, "rb"))
+
+            if compression == "zstd":
+                n_threads = effective_n_jobs(n_jobs)
+                compressor = zstandard.ZstdCompressor(
+                    threads=n_threads if n_threads > 1 else 0
+                )
+                output = stack.enter_context(open(tmp_path, "wb"))
+                target = stack.enter_context(compressor.stream_writer(output))
+            else:
+                target = stack.enter_context(gzip.open(tmp_path, "wb"))
+            shutil.copyfileobj(source, target, chunk_size)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, dst)
+    return dst
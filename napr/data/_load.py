@@ -1,45 +1,411 @@
 """Functions for loading data."""
 
+import math
 import os
+import operator
+import warnings
+from collections.abc import Iterable, Iterator
+from typing import Any
 
 import pandas as pd
 
-from . import _base
+from . import _base, _cache, _compress
+
+URLS = {
+    "21.3": "https://drive.google.com/u/0/uc?id=1HFjVme274zL1r7Cr_0q-RrMoZebbGekJ&export=download",
+}
+# SHA-256 digests of the datasets. None means the digest is not published yet,
+# so the download is not verified.
+SHA256: dict[str, str | None] = {"21.3": None}
+
+# Number of connections for downloading the datasets
+NUM_CONNECTIONS = 4
+
+# Number of rows parsed at a time, when the rows are filtered while reading
+CHUNKSIZE = 100_000
+
+FILTER_OPS = {
+    "=": operator.eq,
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, values: column.isin(values),
+    "not in": lambda column, values: ~column.isin(values),
+}
 
 
 def load_terpene(
-    download: bool = False, path: str = _base.CURR_DIR, version: str = "21.3"
+    download: bool = False,
+    path: str = _base.CURR_DIR,
+    version: str = "21.3",
+    cache: bool = False,
+    cache_dir: str | None = None,
+    refresh: bool = False,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, Any]] | None = None,
+    n_jobs: int | None = None,
 ) -> pd.DataFrame:
     """Loading the terpene dataset.
 
-    If download=True, the data will be downloaded first.
+    If download=True, the data will be downloaded first. If cache=True, the
+    first load writes a columnar (Parquet) sidecar of the data, keyed by the
+    hash of the source file and the version, and later loads read only the
+    sidecar. It requires pyarrow.
+
+    The columns and filters are applied while reading, so the unneeded columns
+    and rows are never allocated. Filters are (column, op, value) tuples that
+    are combined with "and", e.g. [("chemicalSubClass", "in", SUBCLASS_NAME)],
+    where op is one of "==", "!=", "<", "<=", ">", ">=", "in" and "not in".
+    Missing values never satisfy a filter.
+
+    The bz2 source is decompressed with n_jobs cores (see napr.data._compress).
+    If path is a directory holding a transcoded source (see transcode_terpene),
+    the transcoded source is read instead, as it is faster to decompress,
+    unless it is older than the bz2 source.
 
     Args:
         download: If the data should be downloaded or loaded from local machine.
             Defaults to False.
         path: The path to save/load the data. Defaults to current directory.
         version: Version of the data. Defaults to "21.3".
+        cache: Whether to read/write the columnar cache, which requires the
+            parquet extra. Defaults to False.
+        cache_dir: Directory of the cache. Defaults to None, which is the
+            directory of the source file.
+        refresh: Whether to rebuild the cache, even if it is up to date.
+            Defaults to False.
+        columns: The columns to load. Defaults to None, which is all columns.
+        filters: The row filters. Defaults to None.
+        n_jobs: Number of cores for decompressing the source. -1 means all
+            cores. Defaults to None, which means 1.
 
     Raises:
         ValueError: if version is not in ["21.3"].
+        ValueError: if a filter has an unknown operator.
         FileNotFoundError: if download=False and the data in path is not found.
 
     Returns:
         The terpene data
     """
-    if version not in ["21.3"]:
+    filters = _check_filters(filters)
+    path = _source_path(download=download, path=path, version=version)
+
+    if not cache:
+        return _read_csv(path, columns=columns, filters=filters, n_jobs=n_jobs)
+
+    digest, parquet_path, schema_path = _cache.cache_paths(path, cache_dir)
+    if refresh or not _cache.is_cached(
+        digest, version, parquet_path, schema_path
+    ):
+        data = _cache.write_cache(
+            _read_csv(path, n_jobs=n_jobs),
+            path,
+            digest,
+            version,
+            parquet_path,
+            schema_path,
+        )
+        if not columns and not filters:
+            return data
+        del data
+
+    return _cache.read_cache(
+        parquet_path, schema_path, columns=columns, filters=filters
+    )
+
+
+def _check_filters(
+    filters: list[tuple[str, str, Any]] | None
+) -> list[tuple[str, str, Any]] | None:
+    """Check the operators of the filters and convert the values of "in" and
+    "not in" filters, e.g. dict keys, into lists."""
+    if not filters:
+        return None
+
+    checked = []
+    for column, op, value in filters:
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator: {op}")
+        if op in ["in", "not in"]:
+            if isinstance(value, str) or not isinstance(value, Iterable):
+                raise ValueError(f"The value of {op} must be an iterable.")
+            value = list(value)
+        checked.append((column, op, value))
+    return checked
+
+
+def _filter_mask(
+    data: pd.DataFrame, filters: list[tuple[str, str, Any]]
+) -> pd.Series:
+    """Returns the mask of the rows satisfying all the filters."""
+    mask = pd.Series(True, index=data.index)
+    for column, op, value in filters:
+        mask &= FILTER_OPS[op](data[column], value) & data[column].notna()
+    return mask
+
+
+def _usecols(
+    path: str,
+    columns: list[str] | None,
+    filters: list[tuple[str, str, Any]] | None,
+    index: bool = True,
+) -> list[str] | None:
+    """Returns the columns to parse: the index (if index=True), the requested
+    columns and the columns needed by the filters."""
+    if columns is None:
+        return None
+
+    usecols = columns + [column for column, _, _ in filters or []]
+    if index:
+        index_col = pd.read_csv(path, nrows=0, compression="infer").columns[0]
+        usecols.insert(0, index_col)
+    return list(dict.fromkeys(usecols))
+
+
+def iter_terpene(
+    chunksize: int = CHUNKSIZE,
+    download: bool = False,
+    path: str = _base.CURR_DIR,
+    version: str = "21.3",
+    cache: bool = False,
+    cache_dir: str | None = None,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, Any]] | None = None,
+    n_jobs: int | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Iterate over the terpene dataset in chunks.
+
+    The chunks are streamed from the compressed source, so only one chunk is
+    held in memory at a time. If cache=True and an up to date cache of the
+    source exists (see load_terpene), the chunks are read from the cache
+    instead. The columns, filters and n_jobs are the same as in load_terpene; as
+    filtering is done per chunk, the yielded chunks may be smaller than
+    chunksize, but they are never empty.
+
+    Args:
+        chunksize: Number of rows per chunk. Defaults to CHUNKSIZE.
+        download: If the data should be downloaded or loaded from local machine.
+            Defaults to False.
+        path: The path to save/load the data. Defaults to current directory.
+        version: Version of the data. Defaults to "21.3".
+        cache: Whether to read the columnar cache, if it exists. Defaults to
+            False.
+        cache_dir: Directory of the cache. Defaults to None, which is the
+            directory of the source file.
+        columns: The columns to load. Defaults to None, which is all columns.
+        filters: The row filters. Defaults to None.
+        n_jobs: Number of cores for decompressing the source. -1 means all
+            cores. Defaults to None, which means 1.
+
+    Raises:
+        ValueError: if version is not in ["21.3"].
+        ValueError: if chunksize is less than 1.
+        ValueError: if a filter has an unknown operator.
+        FileNotFoundError: if download=False and the data in path is not found.
+
+    Yields:
+        Chunks of the terpene data.
+    """
+    if chunksize < 1:
+        raise ValueError("chunksize must be greater than 0.")
+    filters = _check_filters(filters)
+    path = _source_path(download=download, path=path, version=version)
+
+    chunks = None
+    if cache:
+        digest, parquet_path, schema_path = _cache.cache_paths(path, cache_dir)
+        if _cache.is_cached(digest, version, parquet_path, schema_path):
+            chunks = _cache.iter_cache(
+                parquet_path,
+                schema_path,
+                chunksize,
+                columns=_usecols(path, columns, filters, index=False),
+            )
+    if chunks is None:
+        chunks = _iter_csv(
+            path, chunksize, columns=columns, filters=filters, n_jobs=n_jobs
+        )
+    elif filters:
+        chunks = (chunk[_filter_mask(chunk, filters)] for chunk in chunks)
+
+    for chunk in chunks:
+        if not chunk.empty:
+            yield _project(chunk, columns)
+
+
+def _source_path(download: bool, path: str, version: str) -> str:
+    """Returns the path of the source file, after downloading it if needed."""
+    if version not in URLS:
         raise ValueError(f"Version {version} not supported.")
 
     if os.path.isdir(path):
-        path = os.path.join(path, f"terpene-{version}.bz2")
+        directory = path
+        path = os.path.join(directory, f"terpene-{version}.bz2")
+        if not download:
+            # A transcoded file older than the bz2 one, e.g. downloaded again,
+            # is stale
+            source_mtime = (
+                os.path.getmtime(path) if os.path.exists(path) else -math.inf
+            )
+            for extension in _compress.EXTENSIONS.values():
+                transcoded = os.path.join(
+                    directory, f"terpene-{version}{extension}"
+                )
+                if (
+                    os.path.exists(transcoded)
+                    and os.path.getmtime(transcoded) >= source_mtime
+                ):
+                    return transcoded
 
     if not download:
         if not os.path.exists(path):
             raise FileNotFoundError(f"File {path} not found.")
     else:
-        if version == "21.3":
-            url = "https://drive.google.com/u/0/uc?id=1HFjVme274zL1r7Cr_0q-RrMoZebbGekJ&export=download"
-            _base.download(url=url, path=path)
+        _base.download(
+            url=URLS[version],
+            path=path,
+            sha256=SHA256[version],
+            num_connections=NUM_CONNECTIONS,
+        )
+    return path
+
+
+def _project(data: pd.DataFrame, columns: list[str] | None) -> pd.DataFrame:
+    """Returns the columns of the data, in the requested order."""
+    if columns is None or list(data.columns) == columns:
+        return data
+    return data[columns]
+
+
+def _iter_csv(
+    path: str,
+    chunksize: int,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, Any]] | None = None,
+    n_jobs: int | None = None,
+    chunk_dtypes: list[pd.Series] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Iterate over the (compressed) CSV source file in chunks. The filter
+    columns are kept, if not in columns. If chunk_dtypes is a list, the dtypes
+    of the chunks, before filtering, are appended to it."""
+    usecols = _usecols(path, columns, filters)
+    with _compress.open_source(path, n_jobs=n_jobs) as (source, compression):
+        with pd.read_csv(
+            source,
+            index_col=0,
+            usecols=usecols,
+            compression=compression,
+            chunksize=chunksize,
+        ) as reader:
+            for chunk in reader:
+                if chunk_dtypes is not None:
+                    chunk_dtypes.append(chunk.dtypes)
+                yield chunk[_filter_mask(chunk, filters)] if filters else chunk
+
+
+def _common_dtypes(chunk_dtypes: list[pd.Series]) -> dict[str, Any]:
+    """Returns the dtypes of the columns of the chunks read at once, as the CSV
+    parser infers them: int64 and float64 columns are float64, e.g. when a
+    chunk has missing values, and other mixes, e.g. of bool and float64, are
+    object."""
+    dtypes = {}
+    for column, column_dtypes in pd.DataFrame(chunk_dtypes).items():
+        unique = set(column_dtypes)
+        if len(unique) == 1:
+            dtypes[column] = unique.pop()
+        elif all(
+            pd.api.types.is_numeric_dtype(dtype)
+            and not pd.api.types.is_bool_dtype(dtype)
+            for dtype in unique
+        ):
+            dtypes[column] = "float64"
+        else:
+            dtypes[column] = "object"
+    return dtypes
+
+
+def _read_csv(
+    path: str,
+    columns: list[str] | None = None,
+    filters: list[tuple[str, str, Any]] | None = None,
+    n_jobs: int | None = None,
+) -> pd.DataFrame:
+    """Read the (compressed) CSV source file.
+
+    When filtering, the file is parsed in chunks, so only the matching rows
+    are kept in memory, with the dtypes of the unfiltered data.
+    """
+    if filters:
+        chunk_dtypes: list[pd.Series] = []
+        chunks = list(
+            _iter_csv(path, CHUNKSIZE, columns, filters, n_jobs, chunk_dtypes)
+        )
+        dtypes = _common_dtypes(chunk_dtypes)
+        with warnings.catch_warnings():
+            # pandas<2 warns about the bool chunks cast to object, which keeps
+            # their values when concatenated with chunks of missing values
+            warnings.filterwarnings(
+                "ignore", "In a future version, object-dtype", FutureWarning
+            )
+            data = pd.concat([chunk.astype(dtypes) for chunk in chunks])
+        return _project(data, columns)
+
+    usecols = _usecols(path, columns, filters)
+    with _compress.open_source(path, n_jobs=n_jobs) as (source, compression):
+        data = pd.read_csv(
+            source,
+            index_col=0,
+            usecols=usecols,
+            low_memory=False,
+            compression=compression,
+        )
+    return _project(data, columns)
+
+
+def transcode_terpene(
+    path: str = _base.CURR_DIR,
+    version: str = "21.3",
+    compression: str = "zstd",
+    n_jobs: int | None = None,
+) -> str:
+    """Transcode the bz2 terpene dataset into a faster to decompress format.
+
+    The transcoded file is written next to the source, e.g. terpene-21.3.zst,
+    and is then read by load_terpene and iter_terpene when their path is the
+    directory, unless the bz2 source is newer, e.g. downloaded again. zstd
+    requires the zstandard package, installed with the zstd extra.
+
+    Args:
+        path: The path of the bz2 source, or of its directory. Defaults to
+            current directory.
+        version: Version of the data. Defaults to "21.3".
+        compression: "zstd" or "gzip". Defaults to "zstd".
+        n_jobs: Number of cores. -1 means all cores. Defaults to None, which
+            means 1.
+
+    Raises:
+        ValueError: if version is not in ["21.3"].
+        ValueError: if compression is not supported.
+        ImportError: if compression is "zstd" and zstandard is not installed.
+        FileNotFoundError: if the source in path is not found.
+
+    Returns:
+        The path to the transcoded file.
+    """
+    if version not in URLS:
+        raise ValueError(f"Version {version} not supported.")
+    if compression not in _compress.EXTENSIONS:
+        raise ValueError(f"Compression {compression} not supported.")
+
+    if os.path.isdir(path):
+        path = os.path.join(path, f"terpene-{version}.bz2")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File {path} not found.")
 
-    data = pd.read_csv(path, index_col=0, low_memory=False, compression="infer")
-    return data
+    dst = os.path.splitext(path)[0] + _compress.EXTENSIONS[compression]
+    return _compress.transcode(
+        path, dst, compression=compression, n_jobs=n_jobs
+    )
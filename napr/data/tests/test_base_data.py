@@ -1,11 +1,127 @@
 """Test the base data related functions."""
 
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
 import pytest
 
-from napr.data._base import download
+from napr.data import _base
+from napr.data._base import download, sha256sum
+
+CONTENT = os.urandom(100_000)
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Serves CONTENT, supporting HTTP Range requests."""
+
+    ranges: list[str | None] = []
+
+    def do_GET(self):
+        if self.path != "/terpene.bz2":
+            self.send_error(404)
+            return
+
+        byte_range = self.headers.get("Range")
+        self.ranges.append(byte_range)
+        start, end = 0, len(CONTENT) - 1
+        if byte_range:
+            first, last = byte_range.removeprefix("bytes=").split("-")
+            start, end = int(first), int(last or end)
+            if start >= len(CONTENT):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header(
+                "Content-Range", f"bytes {start}-{end}/{len(CONTENT)}"
+            )
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header(
+            "Content-Disposition", 'attachment; filename="terpene.bz2"'
+        )
+        self.end_headers()
+        self.wfile.write(CONTENT[start : end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def url():
+    """URL of the file served by a local HTTP server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/terpene.bz2"
+    server.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def ranges():
+    """The Range headers received by the server."""
+    _RangeHandler.ranges = []
+    return _RangeHandler.ranges
 
 
-def test_download():
+def test_download(url, tmp_path, ranges):
     """Test the download function."""
     with pytest.raises(ValueError):
         download(url="")
+
+    # Into a directory, named after the content-disposition
+    file_path = download(url=url, path=str(tmp_path))
+    assert file_path == os.path.join(tmp_path, "terpene.bz2")
+    with open(file_path, "rb") as file:
+        assert file.read() == CONTENT
+    assert os.listdir(tmp_path) == ["terpene.bz2"]
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        download(url=url.replace("terpene", "other"), path=str(tmp_path))
+
+
+def test_download_resume(url, tmp_path, ranges):
+    """Test resuming an interrupted download."""
+    file_path = os.path.join(tmp_path, "data.bz2")
+    with open(file_path + ".part", "wb") as file:
+        file.write(CONTENT[:1000])
+
+    download(url=url, path=file_path, chunk_size=4096)
+    with open(file_path, "rb") as file:
+        assert file.read() == CONTENT
+    assert "bytes=1000-" in ranges
+    assert not os.path.exists(file_path + ".part")
+
+
+def test_download_parallel(url, tmp_path, ranges, monkeypatch):
+    """Test downloading over several connections."""
+    monkeypatch.setattr(_base, "PARALLEL_MIN_SIZE", 0)
+    file_path = os.path.join(tmp_path, "data.bz2")
+    download(url=url, path=file_path, num_connections=4)
+    with open(file_path, "rb") as file:
+        assert file.read() == CONTENT
+    assert sorted(ranges[1:]) == [
+        "bytes=0-24999",
+        "bytes=25000-49999",
+        "bytes=50000-74999",
+        "bytes=75000-99999",
+    ]
+    assert os.listdir(tmp_path) == ["data.bz2"]
+
+
+def test_download_sha256(url, tmp_path):
+    """Test verifying the SHA-256 digest of the download."""
+    file_path = os.path.join(tmp_path, "data.bz2")
+    digest = hashlib.sha256(CONTENT).hexdigest()
+
+    with pytest.raises(ValueError):
+        download(url=url, path=file_path, sha256="0" * 64)
+    assert not os.listdir(tmp_path)
+
+    download(url=url, path=file_path, sha256=digest)
+    assert sha256sum(file_path) == digest
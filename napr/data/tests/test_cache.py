@@ -0,0 +1,102 @@
+"""Test the columnar cache of the datasets."""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import pytest
+
+from napr.data import _base
+from napr.data._load import load_terpene
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A small terpene source file."""
+    size = 20
+    data = pd.DataFrame(
+        {
+            "chemicalSubClass": np.random.choice(["Diterpenoids", None], size),
+            "chemicalClass": ["Prenol lipids"] * size,
+            "directParentClassification": ["Sesterterpenoids"] * size,
+            "molecular_weight": np.random.rand(size),
+            "mixed": [1, "a"] * (size // 2),
+        }
+    )
+    path = os.path.join(tmp_path, "terpene-21.3.bz2")
+    data.to_csv(path)
+    return path
+
+
+def test_load_terpene_cache(source, tmp_path):
+    """Test loading the terpene dataset with the cache."""
+    data = load_terpene(path=source)
+    cached = load_terpene(path=source, cache=True)
+    assert len(os.listdir(tmp_path)) == 3  # Source, sidecar and schema
+    for column in [
+        "chemicalSubClass",
+        "chemicalClass",
+        "directParentClassification",
+    ]:
+        assert cached[column].dtype == "category"
+    pd.testing.assert_frame_equal(
+        cached.astype(data.dtypes.to_dict()), data, check_dtype=False
+    )
+
+    # Second load reads the sidecar
+    pd.testing.assert_frame_equal(load_terpene(path=source, cache=True), cached)
+
+    # Changing the source invalidates the cache
+    pd.DataFrame({"molecular_weight": [1.0]}).to_csv(source)
+    assert len(load_terpene(path=source, cache=True)) == 1
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_load_terpene_cache_dir(source, tmp_path):
+    """Test the cache directory and refreshing the cache."""
+    cache_dir = os.path.join(tmp_path, "cache")
+    load_terpene(path=source, cache=True, cache_dir=cache_dir)
+    sidecars = sorted(os.listdir(cache_dir))
+    assert [os.path.splitext(name)[1] for name in sidecars] == [
+        ".json",
+        ".parquet",
+    ]
+
+    parquet_path = os.path.join(cache_dir, sidecars[1])
+    modified = os.path.getmtime(parquet_path)
+    os.utime(parquet_path, (modified - 10, modified - 10))
+    load_terpene(path=source, cache=True, cache_dir=cache_dir, refresh=True)
+    assert os.path.getmtime(parquet_path) > modified - 10
+
+
+def test_load_terpene_cache_digest(source, tmp_path, monkeypatch):
+    """Test that the source is only hashed again when it changes."""
+    hashed = []
+    sha256sum = _base.sha256sum
+    monkeypatch.setattr(
+        _base, "sha256sum", lambda path: hashed.append(path) or sha256sum(path)
+    )
+    cached = load_terpene(path=source, cache=True)
+    load_terpene(path=source, cache=True)
+    assert len(hashed) == 1
+
+    # Touching the source hashes it again, once
+    modified = os.path.getmtime(source)
+    os.utime(source, (modified + 10, modified + 10))
+    pd.testing.assert_frame_equal(load_terpene(path=source, cache=True), cached)
+    load_terpene(path=source, cache=True)
+    assert len(hashed) == 2
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_load_terpene_cache_sources(source, tmp_path):
+    """Test that the sidecars of sources with different compressions do not
+    replace each other."""
+    transcoded = os.path.join(tmp_path, "terpene-21.3.gz")
+    pd.read_csv(source, index_col=0).to_csv(transcoded)
+    load_terpene(path=source, cache=True)
+    load_terpene(path=transcoded, cache=True)
+    assert len(os.listdir(tmp_path)) == 6  # Two sources, sidecars and schemas
@@ -0,0 +1,154 @@
+"""Test the decompression and transcoding of the datasets."""
+
+import bz2
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+
+import pytest
+from contextlib import nullcontext as not_raises
+
+from napr.data import _compress
+from napr.data._compress import (
+    bz2_segments,
+    effective_n_jobs,
+    open_source,
+    transcode,
+)
+from napr.data._load import load_terpene, transcode_terpene
+
+
+@pytest.fixture
+def csv():
+    """A CSV file content."""
+    data = pd.DataFrame(
+        {
+            "chemicalSubClass": ["Diterpenoids", "Eicosanoids"] * 500,
+            "molecular_weight": np.random.rand(1000),
+        }
+    )
+    return data.to_csv().encode()
+
+
+@pytest.fixture
+def multi_stream(tmp_path, csv):
+    """A multi-stream bz2 file, as made by pbzip2."""
+    path = os.path.join(tmp_path, "terpene-21.3.bz2")
+    with open(path, "wb") as file:
+        for start in range(0, len(csv), 5000):
+            file.write(bz2.compress(csv[start : start + 5000]))
+    return path
+
+
+@pytest.fixture
+def no_tools(monkeypatch):
+    """No parallel bzip2 tool is installed."""
+    monkeypatch.setattr(_compress, "DECOMPRESSORS", {})
+
+
+@pytest.mark.parametrize(
+    "n_jobs, expected, exception",
+    [
+        (None, 1, not_raises()),
+        (3, 3, not_raises()),
+        (-1, os.cpu_count(), not_raises()),
+        (0, None, pytest.raises(ValueError)),
+    ],
+)
+def test_effective_n_jobs(n_jobs, expected, exception):
+    """Test the effective_n_jobs function."""
+    with exception:
+        assert effective_n_jobs(n_jobs) == expected
+
+
+def test_bz2_segments(multi_stream, csv):
+    """Test the bz2_segments function."""
+    segments = bz2_segments(multi_stream, segment_size=1)
+    assert len(segments) == -(-len(csv) // 5000)
+    assert segments[0][0] == 0
+    assert segments[-1][1] == os.path.getsize(multi_stream)
+
+    assert len(bz2_segments(multi_stream)) == 1
+
+
+def test_open_source_threads(multi_stream, csv, no_tools, monkeypatch):
+    """Test decompressing a multi-stream bz2 file in threads."""
+    monkeypatch.setattr(_compress, "SEGMENT_SIZE", 1)
+    with open_source(multi_stream, n_jobs=3) as (source, compression):
+        assert compression is None
+        assert source.read() == csv  # type: ignore
+
+    with open_source(multi_stream, n_jobs=1) as (source, compression):
+        assert source == multi_stream and compression == "infer"
+
+
+@pytest.mark.skipif(shutil.which("bzip2") is None, reason="needs bzip2")
+def test_open_source_tool(multi_stream, csv, monkeypatch):
+    """Test decompressing a bz2 file with an external tool."""
+    monkeypatch.setattr(_compress, "DECOMPRESSORS", {"bzip2": ["-d", "-c"]})
+    with open_source(multi_stream, n_jobs=2) as (source, compression):
+        assert compression is None
+        assert source.read() == csv  # type: ignore
+
+    with pytest.raises(OSError):
+        with open_source(multi_stream + "x.bz2", n_jobs=2) as (source, _):
+            source.read()  # type: ignore
+
+
+def test_load_terpene_n_jobs(multi_stream, no_tools, monkeypatch):
+    """Test loading the terpene dataset with parallel decompression."""
+    monkeypatch.setattr(_compress, "SEGMENT_SIZE", 1)
+    pd.testing.assert_frame_equal(
+        load_terpene(path=multi_stream, n_jobs=2), load_terpene(path=multi_stream)
+    )
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd"])
+def test_transcode(multi_stream, csv, tmp_path, compression):
+    """Test transcoding the bz2 file."""
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+
+    with pytest.raises(ValueError):
+        transcode(multi_stream, "x", compression="lz")
+
+    path = transcode_terpene(
+        path=str(tmp_path), compression=compression, n_jobs=2
+    )
+    assert path == os.path.join(
+        tmp_path, "terpene-21.3" + _compress.EXTENSIONS[compression]
+    )
+    pd.testing.assert_frame_equal(
+        load_terpene(path=str(tmp_path)),
+        pd.read_csv(multi_stream, index_col=0),
+    )
+
+    # A newer bz2 source, e.g. downloaded again, is read instead
+    with open(multi_stream, "wb") as file:
+        file.write(bz2.compress(csv[: csv.index(b"\n", 1000)]))
+    mtime = os.path.getmtime(path)
+    os.utime(multi_stream, (mtime + 10, mtime + 10))
+    updated = load_terpene(path=str(tmp_path))
+    assert 0 < len(updated) < 1000
+
+    os.remove(multi_stream)
+    assert len(load_terpene(path=str(tmp_path))) == 1000
+
+
+def test_transcode_errors(multi_stream, tmp_path, monkeypatch):
+    """Test that a failed transcoding leaves no file behind."""
+    dst = os.path.join(tmp_path, "terpene-21.3.zst")
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(ImportError, match=r"napr\[zstd\]"):
+        transcode(multi_stream, dst, compression="zstd")
+
+    def fail(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(shutil, "copyfileobj", fail)
+    with pytest.raises(OSError):
+        transcode(multi_stream, dst, compression="gzip")
+    assert os.listdir(tmp_path) == ["terpene-21.3.bz2"]
@@ -1,8 +1,15 @@
 """Test the data loading functions."""
 
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
 import pytest
 
-from napr.data._load import load_terpene
+from napr.data import _load
+from napr.data._load import load_terpene, iter_terpene
 
 
 @pytest.mark.parametrize(
@@ -16,3 +23,133 @@ def test_load_terpene(download, path, version, exception):
     """Test loading the terpene dataset."""
     with exception:
         load_terpene(download=download, path=path, version=version)
+
+
+@pytest.fixture
+def source(tmp_path):
+    """A small terpene source file."""
+    data = pd.DataFrame(
+        {
+            "chemicalSubClass": ["Diterpenoids", "Eicosanoids", None] * 4,
+            "molecular_weight": np.arange(12.0),
+            "textTaxa": ["[plants]"] * 12,
+        }
+    )
+    path = os.path.join(tmp_path, "terpene-21.3.bz2")
+    data.to_csv(path)
+    return path
+
+
+@pytest.mark.parametrize("cache", [False, True])
+@pytest.mark.parametrize(
+    "columns, filters, expected_index",
+    [
+        (None, None, list(range(12))),
+        (["molecular_weight"], None, list(range(12))),
+        (
+            ["molecular_weight"],
+            [("chemicalSubClass", "in", {"Diterpenoids": "Diterpenes"})],
+            [0, 3, 6, 9],
+        ),
+        (
+            None,
+            [
+                ("chemicalSubClass", "not in", ["Eicosanoids"]),
+                ("molecular_weight", ">=", 3),
+            ],
+            [3, 6, 9],
+        ),
+        (["textTaxa"], [("chemicalSubClass", "!=", "Eicosanoids")], [0, 3, 6, 9]),
+    ],
+)
+def test_load_terpene_columns_filters(
+    source, cache, columns, filters, expected_index
+):
+    """Test loading the terpene dataset with column projection and filters."""
+    if cache:
+        pytest.importorskip("pyarrow")
+
+    data = load_terpene(
+        path=source, cache=cache, columns=columns, filters=filters
+    )
+    assert data.index.tolist() == expected_index
+    if columns is not None:
+        assert data.columns.tolist() == columns
+
+
+def test_load_terpene_unknown_filter(source):
+    """Test loading the terpene dataset with an unknown filter operator."""
+    with pytest.raises(ValueError):
+        load_terpene(path=source, filters=[("molecular_weight", "~", 1)])
+
+
+def test_load_terpene_filters_dtypes(tmp_path, monkeypatch):
+    """Test that filtering in chunks keeps the dtypes of the unfiltered data."""
+    monkeypatch.setattr(_load, "CHUNKSIZE", 3)
+    path = os.path.join(tmp_path, "terpene-21.3.bz2")
+    pd.DataFrame(
+        {
+            "chemicalSubClass": ["Diterpenoids"] * 3 + ["Eicosanoids"] * 3,
+            "heavy_atom_number": [20, 21, 22, 23, 24, None],
+            "found_in_databases": [True, False, True, None, None, None],
+            "textTaxa": ["[plants]", None, "[fungi]", 1, 2, 3],
+        }
+    ).to_csv(path)
+
+    data = load_terpene(path=path)
+    filtered = load_terpene(
+        path=path, filters=[("chemicalSubClass", "==", "Diterpenoids")]
+    )
+    pd.testing.assert_series_equal(filtered.dtypes, data.dtypes)
+    pd.testing.assert_frame_equal(filtered, data.iloc[:3])
+
+
+def test_load_terpene_cache_without_pyarrow(source, monkeypatch):
+    """Test that the cache names the parquet extra if pyarrow is missing."""
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match=r"napr\[parquet\]"):
+        load_terpene(path=source, cache=True)
+    with pytest.raises(ImportError, match=r"napr\[parquet\]"):
+        next(iter_terpene(chunksize=5, path=source, cache=True))
+
+
+@pytest.mark.parametrize("cache", [False, True])
+@pytest.mark.parametrize(
+    "chunksize, columns, filters, expected_lens",
+    [
+        (5, None, None, [5, 5, 2]),
+        (12, ["textTaxa"], None, [12]),
+        (
+            5,
+            ["molecular_weight"],
+            [("chemicalSubClass", "==", "Eicosanoids")],
+            [2, 1, 1],
+        ),
+        (2, None, [("molecular_weight", "<", 2)], [2]),
+    ],
+)
+def test_iter_terpene(source, cache, chunksize, columns, filters, expected_lens):
+    """Test iterating over the terpene dataset in chunks."""
+    if cache:
+        pytest.importorskip("pyarrow")
+        load_terpene(path=source, cache=True)
+
+    chunks = list(
+        iter_terpene(
+            chunksize=chunksize,
+            path=source,
+            cache=cache,
+            columns=columns,
+            filters=filters,
+        )
+    )
+    assert [len(chunk) for chunk in chunks] == expected_lens
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks),
+        load_terpene(path=source, columns=columns, filters=filters),
+        check_dtype=False,
+        check_categorical=False,
+    )
+
+    with pytest.raises(ValueError):
+        next(iter_terpene(chunksize=0, path=source))
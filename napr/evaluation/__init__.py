@@ -1,5 +1,12 @@
 """The evaluation API."""
 
-from .classification import eval_classification
+from napr.utils._lazy import attach
 
-__all__ = ["eval_classification"]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "eval_classification": ".classification",
+        "measure_latency": ".classification",
+        "batched_predict": ".classification",
+    },
+)
@@ -1,19 +1,87 @@
 """Evaluation of the classification methods."""
 
+import functools
+import math
+import os
 import time
+import tracemalloc
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
+import joblib
 import numpy as np
 import pandas as pd
 
-from sklearn.model_selection import train_test_split
-from sklearn import metrics
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.utils import _safe_indexing, check_random_state
 from sklearn.utils.class_weight import compute_sample_weight
 
 from typing import Any, TypeVar
 
+from napr.utils._cache import CACHE_DIR, DiskCache, fingerprint
+
 EstimatorT = TypeVar("EstimatorT")
 
+# Batch sizes of the latency measurements, None being the whole test data
+BATCH_SIZES = [1, 32, 1024, None]
+
+
+def _confusion(
+    y_true: np.ndarray,
+    y_pred: np.ndarray,
+    sample_weight: np.ndarray | None = None,
+    labels: np.ndarray | list | None = None,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the (weighted) confusion matrix over the sorted union of the
+    true labels, the predicted labels and labels, that union and the mask of
+    its classes in the true or predicted labels.
+
+    The labels are encoded once and the matrix is counted by a single
+    np.bincount over the encoded (true, predicted) pairs.
+    """
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    if y_true.shape != y_pred.shape:
+        raise ValueError("y_test and pred must have the same length.")
+
+    values = [y_true.ravel(), y_pred.ravel()]
+    if labels is not None:
+        values.append(np.asarray(labels))
+    classes, codes = np.unique(np.concatenate(values), return_inverse=True)
+    n_classes, n_samples = len(classes), y_true.size
+    pairs = codes[:n_samples] * n_classes + codes[n_samples : 2 * n_samples]
+    conf_mat = np.bincount(
+        pairs, weights=sample_weight, minlength=n_classes * n_classes
+    ).reshape(n_classes, n_classes)
+    if sample_weight is None:
+        conf_mat = conf_mat.astype("int64")
+    present = np.zeros(n_classes, dtype=bool)
+    present[codes[: 2 * n_samples]] = True
+    return conf_mat, classes, present
+
+
+def _average(
+    scores: np.ndarray, support: np.ndarray, average: str
+) -> float:
+    """Average per-class scores as in scikit-learn; micro averaged scores
+    are already pooled over the classes."""
+    if average == "weighted":
+        if not support.sum():
+            return 0.0
+        return float(np.average(scores, weights=support))
+    if average == "macro":
+        return float(np.mean(scores))
+    return float(scores[0])
+
+
+def _divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide, returning 0 where the denominator is 0."""
+    result = np.zeros(len(numerator), dtype="float64")
+    np.divide(numerator, denominator, out=result, where=denominator != 0)
+    return result
+
 
 def _scores_row(
     estimator: str,
@@ -25,56 +93,339 @@ def _scores_row(
     average: str = "weighted",
     labels: list[str] | None = None,
 ) -> dict[str, Any]:
-    """Reutrns a row of the scores."""
+    """Reutrns a row of the scores.
+
+    All the scores are derived from one weighted confusion matrix, computed in
+    a single pass. They equal those of sklearn.metrics, with 0 for the
+    precision, recall and F1 score of classes with zero denominators.
+    average is "weighted", "macro" or "micro".
+    """
     if not estimator:
         raise ValueError("estimator is required.")
     if not time:
         raise ValueError(f"no fitting time is associated with {estimator}.")
+    if average not in ["weighted", "macro", "micro"]:
+        raise ValueError(f"average {average} not supported.")
 
     row = {}
     row["estimator"] = estimator
     row["time"] = time
+    scores = ["accuracy", "precision", "recall", "f1", "conf_mat"]
+    if not any(score in scoring for score in scores):
+        return row
+    if y_test is None or pred is None:
+        raise ValueError("y_test and pred are required.")
+
+    if sample_weight is not None:
+        sample_weight = np.asarray(sample_weight, dtype="float64")
+    conf_mat, classes, present = _confusion(
+        y_test, pred, sample_weight, labels  # type: ignore
+    )
+
+    # Per-class sums, over the classes of y_test and pred
+    present_conf_mat = conf_mat[np.ix_(present, present)]
+    tp_sum = np.diag(present_conf_mat).astype("float64")
+    pred_sum = present_conf_mat.sum(axis=0, dtype="float64")
+    true_sum = present_conf_mat.sum(axis=1, dtype="float64")
+    if average == "micro":
+        tp_sum = np.array([tp_sum.sum()])
+        pred_sum = np.array([pred_sum.sum()])
+        true_sum = np.array([true_sum.sum()])
+
+    precision = _divide(tp_sum, pred_sum)
+    recall = _divide(tp_sum, true_sum)
+
     if "accuracy" in scoring:
-        accuracy = metrics.accuracy_score(
-            y_test, pred, sample_weight=sample_weight
-        )
-        row["accuracy"] = accuracy
+        total = present_conf_mat.sum(dtype="float64")
+        row["accuracy"] = np.trace(present_conf_mat) / total if total else 0.0
     if "precision" in scoring:
-        precision = metrics.precision_score(
-            y_test,
-            pred,
-            sample_weight=sample_weight,
-            average=average,
-        )
-        row["precision"] = precision
+        row["precision"] = _average(precision, true_sum, average)
     if "recall" in scoring:
-        recall = metrics.recall_score(
-            y_test,
-            pred,
-            sample_weight=sample_weight,
-            average=average,
-        )
-        row["recall"] = recall
+        row["recall"] = _average(recall, true_sum, average)
     if "f1" in scoring:
-        f1 = metrics.f1_score(
-            y_test,
-            pred,
-            sample_weight=sample_weight,
-            average=average,
-        )
-        row["f1"] = f1
+        denominator = precision + recall
+        denominator[denominator == 0.0] = 1.0
+        f1 = 2 * precision * recall / denominator
+        row["f1"] = _average(f1, true_sum, average)
     if "conf_mat" in scoring:
-        conf_mat = metrics.confusion_matrix(
-            y_test,
-            pred,
-            sample_weight=sample_weight,
-            labels=labels,
-            normalize=None,
+        if labels is None:
+            indices = np.flatnonzero(present)
+        else:
+            indices = np.searchsorted(classes, np.asarray(labels))
+        row["conf_mat"] = conf_mat[np.ix_(indices, indices)]
+    return row
+
+
+def batched_predict(
+    estimator: EstimatorT,
+    X: pd.DataFrame | np.ndarray,
+    batch_size: int,
+    n_jobs: int | None = None,
+) -> np.ndarray:
+    """Predict in batches of rows, bounding the memory of the prediction.
+
+    The predictions are written into a preallocated array. With n_jobs, the
+    batches are predicted in threads, at most 2 * n_jobs of them at a time.
+
+    Args:
+        estimator: The fitted estimator.
+        X: The input data.
+        batch_size: Number of rows of the batches.
+        n_jobs: Number of threads, as in joblib: None means 1 and -1 means
+            all CPUs. Defaults to None.
+
+    Raises:
+        ValueError: if batch_size is not positive.
+
+    Returns:
+        The predictions.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be positive.")
+
+    n_rows = X.shape[0]
+    n_jobs = joblib.effective_n_jobs(n_jobs)
+    # The classes, rather than the first batch, hold the dtype of all labels
+    classes = getattr(estimator, "classes_", None)
+    pred = None
+
+    def predict(start: int) -> np.ndarray:
+        batch = _safe_indexing(X, slice(start, start + batch_size))
+        return np.asarray(estimator.predict(batch))  # type: ignore
+
+    def collect(start: int, future: Any) -> None:
+        nonlocal pred
+        batch_pred = future.result()
+        if pred is None:
+            pred = np.empty(
+                (n_rows,) + batch_pred.shape[1:],
+                dtype=batch_pred.dtype if classes is None else classes.dtype,
+            )
+        pred[start : start + len(batch_pred)] = batch_pred
+
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        pending = deque()
+        for start in range(0, n_rows, batch_size):
+            pending.append((start, executor.submit(predict, start)))
+            if len(pending) >= 2 * n_jobs:
+                collect(*pending.popleft())
+        while pending:
+            collect(*pending.popleft())
+    return pred  # type: ignore
+
+
+def _fit_score(
+    name: str,
+    estimator: EstimatorT,
+    X_train: pd.DataFrame | np.ndarray,
+    y_train: pd.Series | np.ndarray,
+    X_test: pd.DataFrame | np.ndarray,
+    y_test: pd.Series | np.ndarray,
+    sample_weight_train: np.ndarray,
+    sample_weight_test: np.ndarray,
+    scoring: list[str],
+    batch_sizes: list[int | None] | None = None,
+    return_model: bool = False,
+    predict: Callable | None = None,
+) -> dict[str, Any]:
+    """Fit an estimator and return its row of the scores, profiling it if
+    batch_sizes is provided and with the fitted estimator if return_model.
+    The test data is predicted by predict(estimator, X_test), if provided.
+
+    The peak memories of the fit and of the prediction are traced by
+    tracemalloc, which does not see the native allocations, e.g. of XGBoost
+    or BLAS, so they are lower bounds. Without profiling, the trace of the
+    caller, if any, is left untouched."""
+    # The peak memory of the fit and of the prediction
+    profiling = batch_sizes is not None
+    tracing = profiling and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if profiling:
+        tracemalloc.reset_peak()
+
+    # Training
+    start_train = time.perf_counter()
+    if estimator.__class__.__name__ == "KNeighborsClassifier":
+        estimator.fit(X_train, y_train)  # type: ignore
+    else:
+        estimator.fit(  # type: ignore
+            X_train, y_train, sample_weight=sample_weight_train
         )
-        row["conf_mat"] = conf_mat
+    end_train = time.perf_counter()
+    if profiling:
+        fit_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+
+    # Prediction
+    if predict is None:
+        pred = estimator.predict(X_test)  # type: ignore
+    else:
+        pred = predict(estimator, X_test)
+    end_predict = time.perf_counter()
+    if profiling:
+        predict_memory = tracemalloc.get_traced_memory()[1]
+    if tracing:
+        tracemalloc.stop()
+
+    # Scores
+    row = _scores_row(
+        estimator=name,
+        time=end_train - start_train,
+        scoring=scoring,
+        y_test=y_test,  # type: ignore
+        pred=pred,
+        sample_weight=sample_weight_test,
+        labels=estimator.classes_,  # type: ignore
+    )
+    row["predict_time"] = end_predict - end_train
+    if profiling:
+        row["fit_memory"] = fit_memory
+        row["predict_memory"] = predict_memory
+        row.update(measure_latency(estimator, X_test, batch_sizes))
+    if return_model:
+        row["model"] = estimator
     return row
 
 
+def measure_latency(
+    estimator: EstimatorT,
+    X: pd.DataFrame | np.ndarray,
+    batch_sizes: list[int | None] = BATCH_SIZES,
+    n_batches: int = 100,
+    n_warmup: int = 3,
+) -> dict[str, float]:
+    """Measure the prediction latency and throughput of a fitted estimator.
+
+    For each batch size, the estimator predicts n_warmup untimed batches, then
+    n_batches timed batches taken one after another from X, cycling over it.
+    Batch sizes larger than X are skipped.
+
+    Args:
+        estimator: The fitted estimator.
+        X: The input data.
+        batch_sizes: The batch sizes, None being the whole of X. Defaults to
+            BATCH_SIZES.
+        n_batches: Number of timed batches of each size, or of predictions
+            of the whole of X if it is smaller. Defaults to 100.
+        n_warmup: Number of untimed batches of each size. Defaults to 3.
+
+    Returns:
+        The 50th, 95th and 99th percentiles of the latency in seconds, keyed
+            "latency_p50_{size}" etc., and the throughput in rows per second,
+            keyed "throughput_{size}", with size "full" for None.
+    """
+    n_rows = X.shape[0]
+    results = {}
+    for batch_size in batch_sizes:
+        if batch_size is not None and batch_size > n_rows:
+            continue
+        size = "full" if batch_size is None else str(batch_size)
+        batch_size = batch_size or n_rows
+        n_timed = n_batches if batch_size < n_rows else min(n_batches, 10)
+
+        starts = [
+            (i * batch_size) % (n_rows - batch_size + 1)
+            for i in range(n_warmup + n_timed)
+        ]
+        latencies = []
+        for i, start in enumerate(starts):
+            batch = _safe_indexing(X, slice(start, start + batch_size))
+            start_predict = time.perf_counter()
+            estimator.predict(batch)  # type: ignore
+            if i >= n_warmup:
+                latencies.append(time.perf_counter() - start_predict)
+
+        for percentile in [50, 95, 99]:
+            results[f"latency_p{percentile}_{size}"] = float(
+                np.percentile(latencies, percentile)
+            )
+        results["throughput_" + size] = batch_size * n_timed / sum(latencies)
+    return results
+
+
+def _fit_score_fold(
+    name: str,
+    estimator: EstimatorT,
+    X: pd.DataFrame | np.ndarray,
+    y: pd.Series | np.ndarray,
+    fold: tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    scoring: list[str],
+    batch_sizes: list[int | None] | None = None,
+    predict: Callable | None = None,
+) -> dict[str, Any]:
+    """Fit a clone of an estimator on a fold and return its row of the
+    scores."""
+    train, test, sample_weight_train, sample_weight_test = fold
+    return _fit_score(
+        name,
+        clone(estimator),
+        _safe_indexing(X, train),
+        _safe_indexing(y, train),
+        _safe_indexing(X, test),
+        _safe_indexing(y, test),
+        sample_weight_train,
+        sample_weight_test,
+        scoring,
+        batch_sizes,
+        predict=predict,
+    )
+
+
+def _aggregate_folds(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    """Aggregate the rows of the folds of an estimator: the mean and the
+    standard deviation of the scores and times, and the sum of the confusion
+    matrices."""
+    row = {"estimator": rows[0]["estimator"]}
+    for key in rows[0]:
+        if key == "estimator":
+            continue
+        values = [fold_row[key] for fold_row in rows]
+        if key == "conf_mat":
+            row[key] = np.sum(values, axis=0)
+        else:
+            row[key] = np.mean(values)
+            row[key + "_std"] = np.std(values)
+    row["folds"] = rows
+    return row
+
+
+def split_cores(
+    n_jobs: int | None, n_workers: int | None, n_estimators: int
+) -> tuple[int, int]:
+    """Split a budget of cores between estimators fitted concurrently and the
+    jobs of each estimator.
+
+    Args:
+        n_jobs: The budget of cores, as in joblib: None means 1 and -1 means
+            all CPUs.
+        n_workers: The number of estimators fitted concurrently. -1 means as
+            many as possible. None means 1.
+        n_estimators: The number of estimators.
+
+    Returns:
+        The number of concurrent workers and the number of jobs of each one.
+    """
+    budget = joblib.effective_n_jobs(n_jobs)
+    if n_workers is None:
+        return 1, budget
+    if n_workers < 0:
+        n_workers = budget
+    n_workers = max(1, min(n_workers, n_estimators, budget))
+    return n_workers, max(1, budget // n_workers)
+
+
+def count_rungs(n_candidates: int, factor: float) -> int:
+    """Returns the number of rungs of successive halving to reduce
+    n_candidates to one by factor, i.e. the smallest k such that factor**k is
+    at least n_candidates. It is counted exactly: ceil(log(125, 5)) is 4 by
+    rounding errors, instead of 3."""
+    n_rungs = 0
+    while factor**n_rungs < n_candidates:
+        n_rungs += 1
+    return n_rungs
+
+
 def eval_classification(
     estimators: dict[str, EstimatorT] | list[EstimatorT] | EstimatorT,
     X: pd.DataFrame | np.ndarray,
@@ -84,9 +435,64 @@ def eval_classification(
     scoring: list[str] | str | None = None,
     random_state: int | None = None,
     n_jobs: int | None = None,
+    n_workers: int | None = None,
+    cv: int | None = None,
+    profile: bool = False,
+    batch_sizes: list[int | None] = BATCH_SIZES,
+    halving: str | None = None,
+    factor: float = 3,
+    min_samples: int | None = None,
+    cache: bool | str | DiskCache = False,
+    cache_models: bool = False,
+    predict_batch_size: int | None = None,
+    predict_n_jobs: int | None = None,
 ) -> dict[str, Any]:
     """Evaluate classifiers.
 
+    With n_workers, different estimators are fitted concurrently in a process
+    pool and n_jobs is the total budget of cores, split between the workers:
+    each estimator gets n_jobs // n_workers jobs and as many BLAS/OpenMP
+    threads. The train and test arrays are memory-mapped to the workers
+    instead of being pickled for each of them, and the estimators passed are
+    not fitted in place.
+
+    With cv, every estimator is evaluated over stratified K folds instead of a
+    single train-test split, fitting clones of the estimators, and the folds
+    of all the estimators are the tasks run concurrently, with n_workers
+    defaulting to cv. The sample weights of each fold are computed once and
+    shared by the estimators. The scores and times are then the means over
+    the folds, with their standard deviations in the keys suffixed with
+    "_std", "conf_mat" is the sum of the confusion matrices and "folds" holds
+    the rows of the folds of each estimator.
+
+    With profile, the peak memory traced during the fit and the prediction
+    are reported in "fit_memory" and "predict_memory", in bytes, along with
+    the prediction latency percentiles and throughput of measure_latency over
+    batch_sizes of the test data. Tracing the memory slows down the timed fit
+    and prediction, and tracemalloc does not see the native allocations,
+    e.g. of XGBoost or BLAS, so the peaks are lower bounds.
+
+    With halving, the estimators race by successive halving on that score:
+    at each rung, the remaining ones are fitted on a stratified subsample of
+    the train data, factor times larger than at the previous rung, and only
+    the best 1 / factor of them, on the test data, go on to the next rung.
+    The survivors are then fitted on the whole train data. Every estimator
+    keeps its row, from its last fit, with the number of train samples of
+    that fit in "n_samples", the rung at which it was eliminated, or None,
+    in "eliminated", and its scores at each rung in "trace".
+
+    With cache, the row of each estimator is stored on disk, keyed by the
+    class and the parameters of the estimator (but n_jobs), the content of
+    the data and the other arguments affecting the results, and returned
+    instead of refitting the estimator when they are unchanged, with its
+    original times. "cached" tells whether each row comes from the cache.
+    With cache_models, the fitted estimators are cached as well and returned
+    in "model", except in the cv mode, which fits clones on the folds.
+
+    With predict_batch_size, the test data is predicted in batches by
+    batched_predict, in predict_n_jobs threads, to bound the memory of the
+    prediction, e.g. of kernel methods and KNeighborsClassifier.
+
     Args:
         estimators: The classifiers. It can be either of a single scikit-learn
             classification model, a list of models or a dictionary of
@@ -102,6 +508,36 @@ def eval_classification(
         scoring: A score or a list of scores. Defaults to None.
         random_state: Random state. Defaults to None.
         n_jobs: The number of jobs to run in parallel. Defaults to None.
+        n_workers: The number of estimators fitted concurrently, -1 for as
+            many as the budget allows. Defaults to None, which fits them one
+            after another.
+        cv: Number of stratified folds. Defaults to None, which means a single
+            train-test split.
+        profile: Whether to measure the memory and the prediction latency.
+            Defaults to False.
+        batch_sizes: The batch sizes of the latency measurements, None being
+            the whole test data. Defaults to BATCH_SIZES.
+        halving: The score of the successive halving race. Defaults to None,
+            which fits every estimator on the whole train data.
+        factor: The factor by which the estimators are reduced and the
+            subsamples grow at each rung. Defaults to 3.
+        min_samples: Minimum size of the subsamples. Defaults to None, which
+            means twice the number of classes.
+        cache: Whether to cache the results on disk. It can also be a
+            directory or a DiskCache, whose size is bounded by evicting the
+            least recently used results. True means the "eval_classification"
+            directory of CACHE_DIR. Defaults to False.
+        cache_models: Whether to cache and return the fitted estimators.
+            Defaults to False.
+        predict_batch_size: Number of rows of the prediction batches.
+            Defaults to None, which predicts the whole test data at once.
+        predict_n_jobs: Number of threads predicting the batches. Defaults
+            to None, which means 1.
+
+    Raises:
+        ValueError: if both test_data and cv are provided, if halving is used
+            with cv or cache, or is not a scalar score in scoring, or factor
+            is not larger than 1.
 
     Returns:
         A dictionary mapping the score names to the evaluation results.
@@ -123,6 +559,16 @@ def eval_classification(
     elif isinstance(scoring, str):
         scoring = [scoring]
 
+    if cv and test_data:
+        raise ValueError("test_data and cv cannot be used together.")
+    if halving:
+        if cv or cache:
+            raise ValueError("halving cannot be used with cv or cache.")
+        if halving not in scoring or halving == "conf_mat":
+            raise ValueError(f"halving score {halving} not in scoring.")
+        if factor <= 1:
+            raise ValueError("factor must be larger than 1.")
+
     # Either test_data or test_size will be used.
     if test_data:
         test_size = None
@@ -140,9 +586,144 @@ def eval_classification(
         }
 
     # Set common attributes for all estimators
+    if cv:
+        n_workers, n_jobs_estimator = split_cores(
+            n_jobs, n_workers or cv, len(estimators) * cv
+        )
+    else:
+        n_workers, n_jobs_estimator = split_cores(
+            n_jobs, n_workers, len(estimators)
+        )
     for estimator in estimators.values():
         setattr(estimator, "random_state", random_state)
-        setattr(estimator, "n_jobs", n_jobs)
+        setattr(
+            estimator, "n_jobs", n_jobs if n_workers == 1 else n_jobs_estimator
+        )
+
+    if not profile:
+        batch_sizes = None  # type: ignore
+    return_model = cache_models and not cv
+    predict = None
+    if predict_batch_size:
+        predict = functools.partial(
+            batched_predict,
+            batch_size=predict_batch_size,
+            n_jobs=predict_n_jobs,
+        )
+
+    # Cached rows of the estimators
+    rows = {}
+    if cache is True:
+        cache = DiskCache(os.path.join(CACHE_DIR, "eval_classification"))
+    elif isinstance(cache, str):
+        cache = DiskCache(cache)
+    if cache:
+        # The test data by its values, as separate arrays
+        data_digest = fingerprint(X, y, *(test_data or (None, None)))
+        setup = {
+            "test_size": test_size,
+            "cv": cv,
+            "scoring": scoring,
+            "random_state": random_state,
+            "batch_sizes": batch_sizes,
+        }
+        keys = {}
+        for name, estimator in estimators.items():
+            params = estimator.get_params()  # type: ignore
+            params.pop("n_jobs", None)
+            keys[name] = fingerprint(
+                "eval_classification",
+                data_digest,
+                type(estimator).__module__ + "." + type(estimator).__name__,
+                params,
+                setup,
+            )
+            row = cache.get(keys[name])
+            if row is not None and (not return_model or "model" in row):
+                if not return_model:
+                    row.pop("model", None)
+                rows[name] = row
+    fitted = {
+        name: estimator
+        for name, estimator in estimators.items()
+        if name not in rows
+    }
+
+    if cv:
+        new_rows = _eval_folds(
+            fitted,
+            X,
+            y,
+            cv,
+            scoring,
+            random_state,
+            n_workers,
+            n_jobs_estimator,
+            batch_sizes,
+            predict,
+        )
+    else:
+        new_rows = _eval_split(
+            fitted,
+            X,
+            y,
+            test_data,
+            test_size,
+            scoring,
+            random_state,
+            n_workers,
+            n_jobs_estimator,
+            batch_sizes,
+            halving,
+            factor,
+            min_samples,
+            return_model,
+            predict,
+        )
+    if cache:
+        for name, row in new_rows.items():
+            cache.set(keys[name], row)
+        for name in estimators:
+            rows[name] = dict(rows.get(name) or new_rows[name])
+            rows[name]["cached"] = name not in new_rows
+    else:
+        rows = new_rows
+
+    # Results. The profile of the eliminated estimators is None.
+    scores = {
+        key: [] for key in ["estimator", "time", "predict_time"] + scoring
+    }
+    for name in estimators:
+        for key in rows[name]:
+            scores.setdefault(key, [])
+    for name in estimators:
+        for key, val in scores.items():
+            val.append(rows[name].get(key))
+
+    return scores
+
+
+def _eval_split(
+    estimators: dict[str, EstimatorT],
+    X: pd.DataFrame | np.ndarray,
+    y: pd.Series | np.ndarray,
+    test_data: tuple[pd.DataFrame, pd.Series] | None,
+    test_size: float | None,
+    scoring: list[str],
+    random_state: int | None,
+    n_workers: int,
+    n_jobs_estimator: int,
+    batch_sizes: list[int | None] | None,
+    halving: str | None,
+    factor: float,
+    min_samples: int | None,
+    return_model: bool,
+    predict: Callable | None,
+) -> dict[str, dict[str, Any]]:
+    """Evaluate the estimators on a train-test split, and return their
+    rows."""
+    if not estimators:
+        return {}
 
     # Data
     if test_data:
@@ -159,36 +740,216 @@ def eval_classification(
     sample_weight_train = compute_sample_weight("balanced", y_train)
     sample_weight_test = compute_sample_weight("balanced", y_test)
 
-    # Results
-    scores = {key: [] for key in ["estimator", "time"] + scoring}
+    if halving:
+        rows = _race(
+            estimators,
+            (X_train, y_train, X_test, y_test, sample_weight_test, scoring),
+            halving,
+            factor,
+            min_samples,
+            random_state,
+            n_workers,
+            n_jobs_estimator,
+            predict,
+        )
+        # The survivors are fitted on the whole train data below
+        survivors = {
+            name: estimator
+            for name, estimator in estimators.items()
+            if rows[name]["eliminated"] is None
+        }
+    else:
+        rows, survivors = {}, estimators
+
+    args = (
+        X_train,
+        y_train,
+        X_test,
+        y_test,
+        sample_weight_train,
+        sample_weight_test,
+        scoring,
+        batch_sizes,
+        return_model,
+        predict,
+    )
+    final_rows = _run(
+        [
+            (_fit_score, (name, estimator, *args))
+            for name, estimator in survivors.items()
+        ],
+        n_workers,
+        n_jobs_estimator,
+    )
+    for row in final_rows:
+        if halving:
+            row["n_samples"] = len(y_train)
+            row["eliminated"] = None
+            row["trace"] = rows[row["estimator"]]["trace"]
+        rows[row["estimator"]] = row
+    return {name: rows[name] for name in estimators}
 
-    progress_bar = tqdm(estimators.items())
-    for name, estimator in progress_bar:
-        progress_bar.set_postfix({"method": name})
 
-        # Training
-        start_train = time.perf_counter()
-        if estimator.__class__.__name__ == "KNeighborsClassifier":
-            estimator.fit(X_train, y_train)
-        else:
-            estimator.fit(X_train, y_train, sample_weight=sample_weight_train)
-        end_train = time.perf_counter()
-
-        # Prediction
-        pred = estimator.predict(X_test)
-
-        # Scores
-        row = _scores_row(
-            estimator=name,
-            time=end_train - start_train,
-            scoring=scoring,
-            y_test=y_test,
-            pred=pred,
-            sample_weight=sample_weight_test,
-            labels=estimator.classes_,
+def _race(
+    estimators: dict[str, EstimatorT],
+    data: tuple,
+    halving: str,
+    factor: float,
+    min_samples: int | None,
+    random_state: int | None,
+    n_workers: int,
+    n_jobs_estimator: int,
+    predict: Callable | None = None,
+) -> dict[str, dict[str, Any]]:
+    """Race the estimators by successive halving.
+
+    Returns:
+        The row of the last fit of each estimator, None for the "eliminated"
+            of the survivors, which are left to be fitted on the whole train
+            data.
+    """
+    X_train, y_train, X_test, y_test, sample_weight_test, scoring = data
+    n_train = len(y_train)
+    if min_samples is None:
+        min_samples = 2 * len(np.unique(y_train))
+
+    remaining = list(estimators)
+    n_rungs = count_rungs(len(remaining), factor)
+    rows = {name: {"eliminated": None, "trace": []} for name in remaining}
+    for rung in range(n_rungs):
+        n_samples = max(min_samples, int(n_train * factor ** (rung - n_rungs)))
+        if n_samples >= n_train or len(remaining) == 1:
+            break
+
+        # Stratified, unless a class is too small
+        indices = np.arange(n_train)
+        try:
+            sample, _ = train_test_split(
+                indices,
+                train_size=n_samples,
+                stratify=y_train,
+                random_state=random_state,
+            )
+        except ValueError:
+            sample = check_random_state(random_state).permutation(indices)
+            sample = sample[:n_samples]
+        X_sample = _safe_indexing(X_train, sample)
+        y_sample = _safe_indexing(y_train, sample)
+        sample_weight = compute_sample_weight("balanced", y_sample)
+
+        rung_rows = _run(
+            [
+                (
+                    _fit_score,
+                    (
+                        name,
+                        estimators[name],
+                        X_sample,
+                        y_sample,
+                        X_test,
+                        y_test,
+                        sample_weight,
+                        sample_weight_test,
+                        scoring,
+                        None,
+                        False,
+                        predict,
+                    ),
+                )
+                for name in remaining
+            ],
+            n_workers,
+            n_jobs_estimator,
         )
-        for key, val in row.items():
-            scores[key].append(val)
-    progress_bar.close()
 
-    return scores
+        # The best ones, with the earlier ones first on ties
+        rung_rows.sort(key=lambda row: -row[halving])
+        n_kept = math.ceil(len(remaining) / factor)
+        for i, row in enumerate(rung_rows):
+            name = row["estimator"]
+            trace = rows[name]["trace"] + [
+                {"rung": rung, "n_samples": n_samples, halving: row[halving]}
+            ]
+            row.update(n_samples=n_samples, eliminated=None, trace=trace)
+            if i >= n_kept:
+                row["eliminated"] = rung
+            rows[name] = row
+        remaining = [row["estimator"] for row in rung_rows[:n_kept]]
+    return rows
+
+
+def _run(
+    tasks: list[tuple[Any, tuple]], n_workers: int, n_jobs_estimator: int
+) -> list[dict[str, Any]]:
+    """Run the (function, args) tasks, one after another if n_workers is 1 or
+    else in a process pool, and return their rows of the scores. The progress
+    bar advances as the tasks complete."""
+    rows = []
+    with tqdm(total=len(tasks)) as progress_bar:
+        if n_workers == 1:
+            for function, args in tasks:
+                progress_bar.set_postfix({"method": args[0]})
+                rows.append(function(*args))
+                progress_bar.update()
+            return rows
+
+        # Arrays larger than 1 MB are memory-mapped to the workers
+        with joblib.parallel_backend(
+            "loky", inner_max_num_threads=n_jobs_estimator
+        ):
+            for row in joblib.Parallel(
+                n_jobs=n_workers,
+                max_nbytes="1M",
+                mmap_mode="r",
+                return_as="generator",
+            )(joblib.delayed(function)(*args) for function, args in tasks):
+                rows.append(row)
+                progress_bar.update()
+    return rows
+
+
+def _eval_folds(
+    estimators: dict[str, EstimatorT],
+    X: pd.DataFrame | np.ndarray,
+    y: pd.Series | np.ndarray,
+    cv: int,
+    scoring: list[str],
+    random_state: int | None,
+    n_workers: int,
+    n_jobs_estimator: int,
+    batch_sizes: list[int | None] | None,
+    predict: Callable | None,
+) -> dict[str, dict[str, Any]]:
+    """Evaluate the estimators over stratified folds, and return their
+    rows."""
+    if not estimators:
+        return {}
+
+    splitter = StratifiedKFold(cv, shuffle=True, random_state=random_state)
+    folds = []
+    for train, test in splitter.split(X, y):
+        folds.append(
+            (
+                train,
+                test,
+                compute_sample_weight("balanced", _safe_indexing(y, train)),
+                compute_sample_weight("balanced", _safe_indexing(y, test)),
+            )
+        )
+
+    rows = _run(
+        [
+            (
+                _fit_score_fold,
+                (name, estimator, X, y, fold, scoring, batch_sizes, predict),
+            )
+            for name, estimator in estimators.items()
+            for fold in folds
+        ],
+        n_workers,
+        n_jobs_estimator,
+    )
+    return {
+        name: _aggregate_folds(rows[i * cv : (i + 1) * cv])
+        for i, name in enumerate(estimators)
+    }
@@ -1,14 +1,30 @@
 """Test the evaluation of classification methods."""
 
+import os
+import tracemalloc
+import warnings
+
 import numpy as np
 import pandas as pd
 
+from sklearn import metrics
+from sklearn.linear_model import LogisticRegression
 from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
 
 import pytest
 from contextlib import nullcontext as not_raises
 
-from napr.evaluation.classification import _scores_row, eval_classification
+from napr.evaluation import classification
+from napr.utils import DiskCache
+from napr.evaluation.classification import (
+    _scores_row,
+    batched_predict,
+    count_rungs,
+    eval_classification,
+    measure_latency,
+    split_cores,
+)
 
 
 @pytest.mark.parametrize(
@@ -59,6 +75,54 @@ def test_scores_row(
         np.testing.assert_array_equal(row["conf_mat"], expected["conf_mat"])
 
 
+@pytest.mark.parametrize("average", ["weighted", "macro", "micro"])
+@pytest.mark.parametrize("weighted", [False, True])
+def test_scores_row_sklearn(average, weighted):
+    """Test the scores of _scores_row against those of sklearn.metrics."""
+    rng = np.random.default_rng(0)
+    y_test = rng.choice(["a", "b", "c"], 200)
+    # "d" is never true and "e" never appears
+    pred = rng.choice(["a", "b", "c", "d"], 200)
+    sample_weight = rng.random(200) if weighted else None
+    labels = ["a", "b", "c", "d", "e"]
+
+    row = _scores_row(
+        estimator="estimator",
+        time=1,
+        scoring=["accuracy", "precision", "recall", "f1", "conf_mat"],
+        y_test=y_test,  # type: ignore
+        pred=pred,
+        sample_weight=sample_weight,
+        average=average,
+        labels=labels,
+    )
+    assert row["accuracy"] == pytest.approx(
+        metrics.accuracy_score(y_test, pred, sample_weight=sample_weight)
+    )
+    for score, function in [
+        ("precision", metrics.precision_score),
+        ("recall", metrics.recall_score),
+        ("f1", metrics.f1_score),
+    ]:
+        # sklearn warns about the zero precision of "d"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            expected = function(
+                y_test, pred, sample_weight=sample_weight, average=average
+            )
+        assert row[score] == pytest.approx(expected)
+    expected = metrics.confusion_matrix(
+        y_test, pred, sample_weight=sample_weight, labels=labels
+    )
+    np.testing.assert_allclose(row["conf_mat"], expected)
+    assert row["conf_mat"].dtype == expected.dtype
+
+    with pytest.raises(ValueError):
+        _scores_row("estimator", 1, ["accuracy"], y_test, pred[:10])
+    with pytest.raises(ValueError):
+        _scores_row("estimator", 1, ["f1"], y_test, pred, average="samples")
+
+
 @pytest.mark.parametrize(
     "estimators, X, y, test_data, scoring, exception",
     [
@@ -118,3 +182,360 @@ def test_eval_classification(estimators, X, y, test_data, scoring, exception):
         else:
             for s in scoring:
                 assert s in scores
+
+
+@pytest.mark.parametrize(
+    "n_candidates, factor, expected",
+    [
+        (1, 3, 0),
+        (2, 3, 1),
+        (9, 3, 2),
+        (10, 3, 3),
+        (125, 5, 3),
+        (216, 6, 3),
+        (243, 3, 5),
+        (1000, 10, 3),
+        (16807, 7, 5),
+        (7, 2.5, 3),
+    ],
+)
+def test_count_rungs(n_candidates, factor, expected):
+    """Test counting the rungs exactly, for exact powers of factor."""
+    assert count_rungs(n_candidates, factor) == expected
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_run(n_workers, monkeypatch):
+    """Test that the progress bar advances by completed task and is
+    closed."""
+    updates = []
+
+    class Recorder(classification.tqdm):
+        def update(self, n=1):
+            updates.append(n)
+            return super().update(n)
+
+        def close(self):
+            updates.append("closed")
+            super().close()
+
+    monkeypatch.setattr(classification, "tqdm", Recorder)
+    tasks = [(str.upper, (name,)) for name in "abcd"]
+    assert classification._run(tasks, n_workers, 1) == list("ABCD")
+    assert updates[:5] == [1, 1, 1, 1, "closed"]
+
+
+@pytest.mark.parametrize(
+    "n_jobs, n_workers, n_estimators, expected",
+    [
+        (8, None, 3, (1, 8)),
+        (8, 2, 3, (2, 4)),
+        (8, -1, 3, (3, 2)),
+        (8, 16, 12, (8, 1)),
+        (None, 4, 3, (1, 1)),
+    ],
+)
+def test_split_cores(n_jobs, n_workers, n_estimators, expected):
+    """Test the split_cores function."""
+    assert split_cores(n_jobs, n_workers, n_estimators) == expected
+
+
+def test_eval_classification_parallel():
+    """Test evaluating the estimators concurrently."""
+    rng = np.random.default_rng(0)
+    # Larger than 1 MB, so the arrays are memory-mapped to the workers
+    X = rng.normal(size=(2000, 100))
+    y = (X[:, 0] + rng.normal(size=2000) > 0).astype(int)
+    estimators = {
+        "tree": DecisionTreeClassifier(),
+        "logistic": LogisticRegression(),
+        "knn": KNeighborsClassifier(),
+    }
+
+    expected = eval_classification(estimators, X, y, random_state=777)
+    scores = eval_classification(
+        estimators, X, y, random_state=777, n_jobs=2, n_workers=2
+    )
+    assert scores.keys() == expected.keys()
+    assert scores["estimator"] == ["tree", "logistic", "knn"]
+    for score in ["accuracy", "precision", "recall", "f1"]:
+        np.testing.assert_allclose(scores[score], expected[score])
+    np.testing.assert_array_equal(scores["conf_mat"], expected["conf_mat"])
+    assert all(estimator.n_jobs == 1 for estimator in estimators.values())
+
+
+def test_eval_classification_cv(monkeypatch):
+    """Test evaluating the estimators over stratified folds."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(300, 4)))
+    y = pd.Series((X[0] + rng.normal(size=300) > 0).astype(int))
+    estimators = [DecisionTreeClassifier(), LogisticRegression()]
+
+    with pytest.raises(ValueError):
+        eval_classification(estimators, X, y, test_data=(X, y), cv=3)
+
+    # The sample weights of the folds are shared by the estimators
+    calls = []
+    compute_sample_weight = classification.compute_sample_weight
+
+    def count_sample_weight(*args, **kwargs):
+        calls.append(1)
+        return compute_sample_weight(*args, **kwargs)
+
+    monkeypatch.setattr(
+        classification, "compute_sample_weight", count_sample_weight
+    )
+    scores = eval_classification(estimators, X, y, cv=3, random_state=777)
+    assert len(calls) == 2 * 3
+
+    assert scores["estimator"] == [
+        "DecisionTreeClassifier",
+        "LogisticRegression",
+    ]
+    for i, folds in enumerate(scores["folds"]):
+        assert len(folds) == 3
+        for key in ["accuracy", "f1", "time", "predict_time"]:
+            values = [fold[key] for fold in folds]
+            assert scores[key][i] == pytest.approx(np.mean(values))
+            assert scores[key + "_std"][i] == pytest.approx(np.std(values))
+        # Weighted by the balanced sample weights
+        assert scores["conf_mat"][i].sum() == pytest.approx(len(X))
+    # The passed estimators are not fitted
+    assert not hasattr(estimators[0], "classes_")
+
+    parallel = eval_classification(
+        estimators, X, y, cv=3, random_state=777, n_jobs=2
+    )
+    np.testing.assert_allclose(parallel["accuracy"], scores["accuracy"])
+    np.testing.assert_array_equal(parallel["conf_mat"], scores["conf_mat"])
+
+
+def test_measure_latency():
+    """Test the measure_latency function."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(100, 3))
+    estimator = DecisionTreeClassifier().fit(X, X[:, 0] > 0)
+
+    results = measure_latency(estimator, pd.DataFrame(X), n_batches=20)
+    for size in ["1", "32", "full"]:
+        percentiles = [
+            results[f"latency_p{percentile}_{size}"]
+            for percentile in [50, 95, 99]
+        ]
+        assert 0 < percentiles[0] <= percentiles[1] <= percentiles[2]
+        assert results["throughput_" + size] > 0
+    # Larger than the data
+    assert "throughput_1024" not in results
+
+
+def test_eval_classification_profile():
+    """Test profiling the estimators."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = (X[:, 0] > 0).astype(int)
+
+    scores = eval_classification(
+        [DecisionTreeClassifier(), LogisticRegression()],
+        X,
+        y,
+        scoring="accuracy",
+        profile=True,
+        batch_sizes=[1, None],
+    )
+    for key in ["fit_memory", "predict_memory", "predict_time"]:
+        assert len(scores[key]) == 2 and all(np.array(scores[key]) > 0)
+    assert "latency_p99_1" in scores and "throughput_full" in scores
+    assert "latency_p50_32" not in scores
+
+    scores = eval_classification(LogisticRegression(), X, y, cv=2, profile=True)
+    assert scores["throughput_full"][0] > 0
+    assert "throughput_full_std" in scores
+    assert "fit_memory" not in eval_classification(LogisticRegression(), X, y)
+
+    # Without profiling, the peak traced by the caller is kept
+    tracemalloc.start()
+    try:
+        peak = np.ones(10**6)
+        del peak
+        eval_classification(LogisticRegression(), X, y)
+        assert tracemalloc.get_traced_memory()[1] >= 8 * 10**6
+    finally:
+        tracemalloc.stop()
+
+
+def test_eval_classification_halving():
+    """Test racing the estimators by successive halving."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(900, 4))
+    y = (X[:, 0] + X[:, 1] > 0).astype(int)
+    estimators = {
+        "logistic": LogisticRegression(),
+        "tree": DecisionTreeClassifier(max_depth=3),
+        "stump": DecisionTreeClassifier(max_depth=1),
+        "knn": KNeighborsClassifier(),
+        "random": DecisionTreeClassifier(max_depth=1, max_features=1),
+    }
+    for kwargs in [
+        dict(halving="f1", cv=3),
+        dict(halving="conf_mat"),
+        dict(halving="f1", scoring="accuracy"),
+        dict(halving="f1", factor=1),
+    ]:
+        with pytest.raises(ValueError):
+            eval_classification(estimators, X, y, **kwargs)
+
+    scores = eval_classification(
+        estimators, X, y, random_state=777, halving="f1", factor=2
+    )
+    assert scores["estimator"] == list(estimators)
+    n_train = int(0.8 * len(X))
+    # 5 estimators: 3 rungs on 1/8, 1/4 and 1/2 of the train data
+    eliminated = dict(zip(scores["estimator"], scores["eliminated"]))
+    assert sorted(eliminated.values(), key=str) == [0, 0, 1, 2, None]
+    for name, n_samples, trace in zip(
+        scores["estimator"], scores["n_samples"], scores["trace"]
+    ):
+        if eliminated[name] is None:
+            assert n_samples == n_train and len(trace) == 3
+        else:
+            assert n_samples == trace[-1]["n_samples"]
+            assert len(trace) == eliminated[name] + 1
+        assert [rung["n_samples"] for rung in trace] == [
+            n_train // 8,
+            n_train // 4,
+            n_train // 2,
+        ][: len(trace)]
+
+    # Each rung keeps the best half of the estimators
+    for rung in range(3):
+        rung_scores = {
+            name: trace[rung]["f1"]
+            for name, trace in zip(scores["estimator"], scores["trace"])
+            if len(trace) > rung
+        }
+        survivors = [name for name in rung_scores if eliminated[name] != rung]
+        worst_survivor = min(rung_scores[name] for name in survivors)
+        assert all(
+            rung_scores[name] <= worst_survivor
+            for name in rung_scores
+            if eliminated[name] == rung
+        )
+
+    # The profile of the eliminated estimators is None
+    scores = eval_classification(
+        estimators, X, y, halving="accuracy", profile=True, batch_sizes=[None]
+    )
+    assert scores["throughput_full"].count(None) == len(estimators) - 1
+
+
+def test_eval_classification_cache(tmp_path):
+    """Test caching the results of the estimators."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(200, 3))
+    y = (X[:, 0] > 0).astype(int)
+    cache_dir = str(tmp_path)
+
+    with pytest.raises(ValueError):
+        eval_classification(
+            LogisticRegression(), X, y, halving="accuracy", cache=cache_dir
+        )
+
+    estimators = {
+        "tree": DecisionTreeClassifier(max_depth=2),
+        "logistic": LogisticRegression(),
+    }
+    scores = eval_classification(
+        estimators, X, y, random_state=777, cache=cache_dir, cache_models=True
+    )
+    assert scores["cached"] == [False, False]
+    assert scores["model"][0].get_depth() <= 2
+
+    # Only the changed estimator is refitted
+    estimators["tree"] = DecisionTreeClassifier(max_depth=3)
+    cached = eval_classification(
+        estimators, X, y, random_state=777, cache=cache_dir, cache_models=True
+    )
+    assert cached["cached"] == [False, True]
+    assert cached["time"][1] == scores["time"][1]
+    np.testing.assert_array_equal(cached["conf_mat"][1], scores["conf_mat"][1])
+    assert cached["model"][1].predict(X).shape == (200,)
+
+    # n_jobs does not change the results
+    cached = eval_classification(
+        estimators, X, y, random_state=777, cache=cache_dir, n_jobs=2
+    )
+    assert cached["cached"] == [True, True] and "model" not in cached
+    # Other data, split or scores do
+    for kwargs in [
+        dict(X=X + 1, y=y, random_state=777),
+        dict(X=X, y=y, random_state=0),
+        dict(X=X, y=y, random_state=777, scoring="f1"),
+        dict(X=X, y=y, random_state=777, cv=2),
+    ]:
+        assert not any(
+            eval_classification(estimators, cache=cache_dir, **kwargs)[
+                "cached"
+            ]
+        )
+    scores = eval_classification(
+        estimators, X, y, random_state=777, cv=2, cache=cache_dir
+    )
+    assert scores["cached"] == [True, True]
+
+    # Other test data does, even if differing only in elided values
+    X_test = rng.normal(size=(2000, 3))
+    y_test = (X_test[:, 0] > 0).astype(int)
+    kwargs = dict(random_state=777, cache=cache_dir)
+    scores = eval_classification(
+        estimators, X, y, test_data=(X_test, y_test), **kwargs
+    )
+    assert scores["accuracy"][0] == pytest.approx(1, abs=0.05)
+    y_test = y_test.copy()
+    y_test[500:1500] = 1 - y_test[500:1500]
+    scores = eval_classification(
+        estimators, X, y, test_data=(X_test, y_test), **kwargs
+    )
+    assert scores["cached"] == [False, False]
+    assert scores["accuracy"][0] == pytest.approx(0.5, abs=0.05)
+
+    # The size of the cache is bounded
+    cache = DiskCache(cache_dir, max_bytes=0)
+    eval_classification(estimators, X, y, cache=cache)
+    assert len(os.listdir(cache_dir)) == 1
+
+
+@pytest.mark.parametrize("n_jobs", [None, 3])
+def test_batched_predict(n_jobs):
+    """Test predicting in batches."""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(1000, 3)))
+    # Labels of different lengths, the longest not in the first batch
+    y = np.where(X[0] > 1, "long label", np.where(X[0] > 0, "b", "a"))
+    estimator = KNeighborsClassifier().fit(X, y)
+    X_test = X.sort_values(0)
+
+    with pytest.raises(ValueError):
+        batched_predict(estimator, X_test, batch_size=0)
+
+    pred = batched_predict(estimator, X_test, batch_size=64, n_jobs=n_jobs)
+    np.testing.assert_array_equal(pred, estimator.predict(X_test))
+
+
+def test_eval_classification_batched_predict():
+    """Test evaluating the estimators with batched prediction."""
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 3))
+    y = (X[:, 0] > 0).astype(int)
+    estimators = [KNeighborsClassifier(), LogisticRegression()]
+
+    for kwargs in [dict(random_state=777), dict(random_state=777, cv=2)]:
+        expected = eval_classification(estimators, X, y, **kwargs)
+        scores = eval_classification(
+            estimators,
+            X,
+            y,
+            predict_batch_size=16,
+            predict_n_jobs=2,
+            **kwargs,
+        )
+        np.testing.assert_array_equal(scores["conf_mat"], expected["conf_mat"])
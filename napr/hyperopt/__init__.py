@@ -1,5 +1,12 @@
 """The optimization API."""
 
-from ._base import find_best_models
+from napr.utils._lazy import attach
 
-all = ["find_best_models"]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "find_best_models": "._base",
+        "HyperParameters": "._native",
+        "load_trials": "._tuner",
+    },
+)
@@ -7,12 +7,14 @@ from sklearn import metrics
 from sklearn.model_selection import StratifiedKFold
 from sklearn.utils.class_weight import compute_sample_weight
 
-import keras_tuner as kt
-
 from typing import TypeVar
 
+from napr.hyperopt import _native
+
 EstimatorT = TypeVar("EstimatorT")
 
+BACKENDS = ["native", "keras_tuner"]
+
 
 def find_best_models(
     X: pd.DataFrame | np.ndarray,
@@ -26,6 +28,15 @@ def find_best_models(
     overwrite: bool = False,
     random_state: int | None = None,
     num_models: int = 1,
+    n_jobs: int | None = None,
+    n_parallel: int = 1,
+    pruning: str | None = None,
+    percentile: float = 25,
+    factor: float = 3,
+    resource: str = "samples",
+    backend: str = "native",
+    algorithm: str = "bayesian",
+    warm_start: pd.DataFrame | None = None,
 ) -> EstimatorT | list[EstimatorT]:
     """Search the hyperparameters space and find the best model(s).
 
@@ -40,13 +51,53 @@ def find_best_models(
         directory: Directory to save the tuner. Defaults to '.' (current
             directory).
         project_name: Project name for the tuner. Defaults to 'tuner'.
-        overwrite: Whether to overwrite the tuner if it already exists. Defaults
+        overwrite: Whether to overwrite the tuner if it already exists.
+            Otherwise, an interrupted search resumes where it stopped. Defaults
             to False.
         random_state: The random state. Defaults to None.
         num_models: Number of best models found. Defaults to 1.
+        n_jobs: The budget of cores shared by the folds of the concurrent
+            trials and the jobs of their models, as in joblib: None means 1
+            and -1 means all CPUs. Defaults to None.
+        n_parallel: The number of trials proposed by the oracle at once and
+            evaluated concurrently. Defaults to 1.
+        pruning: How to prune the unpromising trials: "median" or
+            "percentile", fold by fold, or "halving", by successive halving of
+            the trials of each round of max(n_parallel, ceil(factor)) ones,
+            e.g. brackets of 3 trials of which 1 is kept with the defaults.
+            Defaults to None, which means no pruning.
+        percentile: The percentile of the mean scores of the completed trials
+            below which a trial is pruned, with the "percentile" pruning.
+            Defaults to 25.
+        factor: The factor by which the trials are reduced and the resource is
+            increased at each rung, with the "halving" pruning. Defaults to 3.
+        resource: The resource increased at each rung, with the "halving"
+            pruning: "samples", for the train samples, or the parameter of the
+            number of iterations of the models, e.g. "n_estimators" for
+            XGBoost. Defaults to "samples".
+        backend: The search backend: "native", which does not depend on
+            TensorFlow, or "keras_tuner", which requires the keras-tuner
+            extra, i.e. `pip install napr[keras-tuner]`. Defaults to
+            "native". Before the native backend, the search always ran on
+            Keras Tuner. The hypermodels of Keras Tuner run on the native
+            backend as they are, except the conditional hyperparameters
+            (parent_name, parent_values and hp.conditional_scope), which
+            raise a NotImplementedError and need backend="keras_tuner".
+        algorithm: The search algorithm: "random", "sobol" (native backend
+            only) or "bayesian", by a Gaussian process. Defaults to
+            "bayesian".
+        warm_start: The trials of a previous search, e.g. on similar data, as
+            returned by load_trials, to start the "bayesian" algorithm of the
+            native backend from. Defaults to None.
 
     Returns:
         The best model or the list of the best models.
+
+    Raises:
+        ValueError: if X or y is empty, hypermodel is None, score, backend or
+            algorithm is unknown, or warm_start is given with another backend
+            or algorithm.
+        ImportError: if keras-tuner is not installed for its backend.
     """
     if X.size == 0 or y.size == 0:
         raise ValueError("X and y must not be empty.")
@@ -69,17 +120,34 @@ def find_best_models(
         case _:
             raise ValueError(f"Unknown score: {score}")
 
-    oracle = kt.oracles.BayesianOptimizationOracle(
-        objective=kt.Objective("score", "max"),
-        max_trials=max_trials,
-    )
-    cv = StratifiedKFold(cv, shuffle=True, random_state=random_state)
+    match backend:
+        case "native":
+            make_tuner = _native.make_tuner
+        case "keras_tuner":
+            try:
+                from napr.hyperopt._keras_tuner import make_tuner
+            except ImportError as error:
+                raise ImportError(
+                    "The keras_tuner backend requires the keras-tuner extra: "
+                    "pip install napr[keras-tuner]"
+                ) from error
+        case _:
+            raise ValueError(f"backend must be one of {BACKENDS}.")
 
-    tuner = kt.tuners.SklearnTuner(
-        oracle=oracle,
-        hypermodel=hypermodel,
+    tuner = make_tuner(
+        hypermodel,
+        algorithm,
+        max_trials,
+        random_state,
+        warm_start=warm_start,
+        n_parallel=n_parallel,
+        n_jobs=n_jobs,
+        pruning=pruning,
+        percentile=percentile,
+        factor=factor,
+        resource=resource,
         scoring=scoring,
-        cv=cv,
+        cv=StratifiedKFold(cv, shuffle=True, random_state=random_state),
         directory=directory,
         project_name=project_name,
         overwrite=overwrite,
@@ -0,0 +1,138 @@
+"""The Keras Tuner backend of the hyperparameter optimization."""
+
+from typing import Any, Callable
+
+import keras_tuner as kt
+
+from napr.hyperopt._tuner import BaseTuner, is_pruned
+
+ALGORITHMS = ["random", "bayesian"]
+
+TrialStatus = kt.engine.trial.TrialStatus
+
+
+class ParallelSklearnTuner(BaseTuner, kt.tuners.SklearnTuner):
+    """A SklearnTuner searching as BaseTuner does.
+
+    The trials of a round are asked to the oracle with one virtual tuner ID
+    each, as distributed tuners do.
+
+    Args:
+        n_parallel: The number of trials per round, at least factor with the
+            "halving" pruning. Defaults to 1.
+        n_jobs: The budget of cores, as in joblib: None means 1 and -1 means
+            all CPUs. Defaults to None.
+        pruning: One of "median", "percentile" and "halving". Defaults to
+            None, which means no pruning.
+        percentile: The percentile of the "percentile" pruning. Defaults to
+            25.
+        factor: The factor of the "halving" pruning. Defaults to 3.
+        resource: The resource of the "halving" pruning. Defaults to
+            "samples".
+        **kwargs: The arguments of SklearnTuner.
+    """
+
+    def __init__(
+        self,
+        n_parallel: int = 1,
+        n_jobs: int | None = None,
+        pruning: str | None = None,
+        percentile: float = 25,
+        factor: float = 3,
+        resource: str = "samples",
+        **kwargs: Any,
+    ) -> None:
+        BaseTuner.__init__(
+            self, n_parallel, n_jobs, pruning, percentile, factor, resource
+        )
+        kt.tuners.SklearnTuner.__init__(self, **kwargs)
+        # Keras Tuner reloads its own trials, unless overwritten
+        self._reload()
+
+    @property
+    def seed(self) -> int:
+        return self.oracle.seed
+
+    def _create_trial(self, i: int) -> kt.engine.trial.Trial | None:
+        trial = self.oracle.create_trial(f"{self.tuner_id}-{i}")
+        return trial if trial.status == TrialStatus.RUNNING else None
+
+    def _begin_trial(self, trial: kt.engine.trial.Trial) -> None:
+        self.on_trial_begin(trial)
+
+    def _build(self, trial: kt.engine.trial.Trial) -> Any:
+        return self.hypermodel.build(trial.hyperparameters)
+
+    def search(self, *args: Any, **kwargs: Any) -> None:
+        self.on_search_begin()
+        BaseTuner.search(self, *args, **kwargs)
+        self.on_search_end()
+
+    search.__doc__ = BaseTuner.search.__doc__
+
+    def _end_trial(
+        self,
+        trial: kt.engine.trial.Trial,
+        scores: list[float] | None,
+        model: Any,
+        message: str | None = None,
+    ) -> None:
+        if scores is None:
+            trial.status = TrialStatus.INVALID
+            trial.message = model
+        else:
+            score = sum(scores) / len(scores)
+            self.oracle.update_trial(trial.trial_id, {"score": score})
+            self.save_model(trial.trial_id, model)
+            trial.status = TrialStatus.COMPLETED
+            trial.message = message
+            if message is None:
+                self.fold_scores[trial.trial_id] = scores
+        self.on_trial_end(trial)
+
+    def get_best_models(self, num_models: int = 1) -> list[Any]:
+        trials = self.oracle.get_best_trials(len(self.oracle.trials))
+        trials = [trial for trial in trials if not is_pruned(trial)]
+        return [self.load_model(trial) for trial in trials[:num_models]]
+
+
+def make_tuner(
+    hypermodel: Callable,
+    algorithm: str,
+    max_trials: int,
+    seed: int | None,
+    warm_start: Any = None,
+    **kwargs: Any,
+) -> ParallelSklearnTuner:
+    """Returns the tuner of a search.
+
+    Args:
+        hypermodel: The function building a model from the hyperparameters.
+        algorithm: One of "random" and "bayesian".
+        max_trials: The maximum number of trials.
+        seed: The random seed of the oracle.
+        warm_start: Not supported by this backend. Defaults to None.
+        **kwargs: The arguments of ParallelSklearnTuner.
+
+    Raises:
+        ValueError: if the algorithm is unknown, or warm_start is given.
+    """
+    if warm_start is not None:
+        raise ValueError("warm_start requires the native backend.")
+    match algorithm:
+        case "random":
+            oracle = kt.oracles.RandomSearchOracle
+        case "bayesian":
+            oracle = kt.oracles.BayesianOptimizationOracle
+        case _:
+            raise ValueError(f"algorithm must be one of {ALGORITHMS}.")
+
+    return ParallelSklearnTuner(
+        oracle=oracle(
+            objective=kt.Objective("score", "max"),
+            max_trials=max_trials,
+            seed=seed,
+        ),
+        hypermodel=hypermodel,
+        **kwargs,
+    )
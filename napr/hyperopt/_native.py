@@ -0,0 +1,756 @@
+"""The native backend of the hyperparameter optimization, which does not
+depend on TensorFlow."""
+
+import json
+import math
+import os
+import pickle
+import shutil
+import warnings
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from scipy.stats import qmc
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import Matern
+from sklearn.model_selection import KFold
+
+from typing import Any, Callable, NoReturn
+
+from napr.hyperopt._tuner import TRIAL_FIELDS, BaseTuner, is_pruned
+
+ALGORITHMS = ["random", "sobol", "bayesian"]
+SAMPLINGS = ["linear", "log", "reverse_log"]
+MAX_COLLISIONS = 20  # Proposals of already tried values before stopping
+MAX_FAILURES = 3  # Consecutive failed trials before stopping
+
+
+@dataclass
+class Float:
+    """A float hyperparameter in [min_value, max_value], spaced by step if
+    any, and sampled uniformly, log-uniformly or reverse log-uniformly, i.e.
+    more densely near max_value."""
+
+    name: str
+    min_value: float
+    max_value: float
+    step: float | None = None
+    sampling: str = "linear"
+    default: float | None = None
+
+    def __post_init__(self) -> None:
+        if self.sampling not in SAMPLINGS:
+            raise ValueError(f"sampling must be one of {SAMPLINGS}.")
+        if self.min_value > self.max_value:
+            raise ValueError("min_value must not be larger than max_value.")
+        if self.sampling != "linear" and self.min_value <= 0:
+            raise ValueError(
+                f"min_value must be positive with {self.sampling} sampling."
+            )
+        if self.default is None:
+            self.default = self.min_value
+
+    def _cast(self, value: float) -> float:
+        return float(value)
+
+    def _grid(self) -> np.ndarray | None:
+        """The values spaced by step, added (linear sampling) or multiplied
+        (log sampling, mirrored with reverse_log sampling), or None if there
+        is no step."""
+        if self.step is None:
+            return None
+        if self.sampling == "linear":
+            n_steps = (self.max_value - self.min_value) / self.step
+            grid = self.min_value + self.step * np.arange(
+                math.floor(n_steps + 1e-9) + 1
+            )
+        else:
+            n_steps = math.log(self.max_value / self.min_value, self.step)
+            grid = self.min_value * self.step ** np.arange(
+                math.floor(n_steps + 1e-9) + 1
+            )
+            if self.sampling == "reverse_log":
+                grid = np.sort(self.max_value + self.min_value - grid)
+        # Without the rounding errors, e.g. 0.30000000000000004 for 3 * 0.1
+        return np.round(grid, 12)
+
+    def prob_to_value(self, prob: float) -> float:
+        """Returns the value at a point of the unit interval."""
+        grid = self._grid()
+        if grid is not None:
+            return self._cast(grid[min(int(prob * len(grid)), len(grid) - 1)])
+        if self.sampling == "linear":
+            value = self.min_value + prob * (self.max_value - self.min_value)
+        elif self.sampling == "log":
+            value = self.min_value * (self.max_value / self.min_value) ** prob
+        else:  # The log sampling, mirrored
+            ratio = self.max_value / self.min_value
+            value = self.max_value + self.min_value * (1 - ratio ** (1 - prob))
+        return self._cast(min(max(value, self.min_value), self.max_value))
+
+    def value_to_prob(self, value: float) -> float:
+        """Returns the point of the unit interval of a value."""
+        grid = self._grid()
+        if grid is not None:
+            return (np.abs(grid - value).argmin() + 0.5) / len(grid)
+        if self.min_value == self.max_value:
+            return 0.5
+        if self.sampling == "linear":
+            return (value - self.min_value) / (self.max_value - self.min_value)
+        log_ratio = math.log(self.max_value / self.min_value)
+        if self.sampling == "log":
+            return math.log(value / self.min_value) / log_ratio
+        return 1 - math.log(
+            (self.max_value + self.min_value - value) / self.min_value
+        ) / log_ratio
+
+
+@dataclass
+class Int(Float):
+    """An integer hyperparameter in [min_value, max_value], spaced by step
+    (by 1 with linear sampling, if None), and sampled as a Float."""
+
+    def __post_init__(self) -> None:
+        if self.step is None and self.sampling == "linear":
+            self.step = 1
+        super().__post_init__()
+
+    def _cast(self, value: float) -> int:
+        return int(round(value))
+
+
+@dataclass
+class Choice:
+    """A hyperparameter among values."""
+
+    name: str
+    values: list
+    ordered: bool | None = None
+    default: Any = None
+
+    def __post_init__(self) -> None:
+        if len(self.values) == 0:
+            raise ValueError("values must not be empty.")
+        if self.default is None:
+            self.default = self.values[0]
+
+    def prob_to_value(self, prob: float) -> Any:
+        """Returns the value at a point of the unit interval."""
+        n_values = len(self.values)
+        return self.values[min(int(prob * n_values), n_values - 1)]
+
+    def value_to_prob(self, value: Any) -> float:
+        """Returns the point of the unit interval of a value."""
+        return (self.values.index(value) + 0.5) / len(self.values)
+
+
+@dataclass
+class Fixed:
+    """A hyperparameter of a fixed value, out of the searched space."""
+
+    name: str
+    default: Any
+
+
+class HyperParameters:
+    """The hyperparameters of a trial, defining the searched space as the
+    ones of Keras Tuner do.
+
+    The hypermodel calls Int, Float, Choice, Boolean and Fixed, which register
+    the hyperparameter on the first call and return its value in the trial, or
+    its default. Conditional hyperparameters, i.e. parent_name, parent_values
+    and conditional_scope, are not supported and raise a NotImplementedError;
+    they need the keras_tuner backend.
+    """
+
+    def __init__(self) -> None:
+        self.space: dict[str, Float | Choice | Fixed] = {}
+        self.values: dict[str, Any] = {}
+
+    def _retrieve(
+        self,
+        hyperparameter: Float | Choice | Fixed,
+        parent_name: str | None = None,
+        parent_values: list | None = None,
+    ) -> Any:
+        if parent_name is not None or parent_values is not None:
+            self.conditional_scope(parent_name, parent_values)
+        self.space.setdefault(hyperparameter.name, hyperparameter)
+        return self.values.setdefault(
+            hyperparameter.name, hyperparameter.default
+        )
+
+    def Int(
+        self,
+        name: str,
+        min_value: int,
+        max_value: int,
+        step: int | None = None,
+        sampling: str = "linear",
+        default: int | None = None,
+        parent_name: str | None = None,
+        parent_values: list | None = None,
+    ) -> int:
+        """Returns the value of an integer hyperparameter."""
+        return self._retrieve(
+            Int(name, min_value, max_value, step, sampling, default),
+            parent_name,
+            parent_values,
+        )
+
+    def Float(
+        self,
+        name: str,
+        min_value: float,
+        max_value: float,
+        step: float | None = None,
+        sampling: str = "linear",
+        default: float | None = None,
+        parent_name: str | None = None,
+        parent_values: list | None = None,
+    ) -> float:
+        """Returns the value of a float hyperparameter."""
+        return self._retrieve(
+            Float(name, min_value, max_value, step, sampling, default),
+            parent_name,
+            parent_values,
+        )
+
+    def Choice(
+        self,
+        name: str,
+        values: list,
+        ordered: bool | None = None,
+        default: Any = None,
+        parent_name: str | None = None,
+        parent_values: list | None = None,
+    ) -> Any:
+        """Returns the value of a hyperparameter among values."""
+        return self._retrieve(
+            Choice(name, list(values), ordered, default),
+            parent_name,
+            parent_values,
+        )
+
+    def Boolean(
+        self,
+        name: str,
+        default: bool = False,
+        parent_name: str | None = None,
+        parent_values: list | None = None,
+    ) -> bool:
+        """Returns the value of a boolean hyperparameter."""
+        return self._retrieve(
+            Choice(name, [False, True], default=default),
+            parent_name,
+            parent_values,
+        )
+
+    def Fixed(
+        self,
+        name: str,
+        value: Any,
+        parent_name: str | None = None,
+        parent_values: list | None = None,
+    ) -> Any:
+        """Returns the value of a fixed hyperparameter."""
+        return self._retrieve(Fixed(name, value), parent_name, parent_values)
+
+    def conditional_scope(
+        self, parent_name: str | None, parent_values: Any
+    ) -> NoReturn:
+        """Conditional hyperparameters are not supported.
+
+        Raises:
+            NotImplementedError: always.
+        """
+        raise NotImplementedError(
+            "Conditional hyperparameters (parent_name, parent_values and "
+            "conditional_scope) are not supported by the native backend. "
+            'Use backend="keras_tuner".'
+        )
+
+    def get(self, name: str) -> Any:
+        """Returns the value of a hyperparameter."""
+        return self.values[name]
+
+    def __getitem__(self, name: str) -> Any:
+        return self.get(name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.values
+
+    def copy(self) -> "HyperParameters":
+        """Returns a copy, of the same space and values."""
+        copy = HyperParameters()
+        copy.space = dict(self.space)
+        copy.values = dict(self.values)
+        return copy
+
+
+@dataclass
+class Trial:
+    """A set of values of the hyperparameters, and its evaluation."""
+
+    trial_id: str
+    hyperparameters: HyperParameters = field(repr=False)
+    status: str = "RUNNING"
+    score: float | None = None
+    message: str | None = None
+
+
+class RandomSearchOracle:
+    """Propose the values of the hyperparameters of the trials at random, and
+    keep the trials.
+
+    Args:
+        max_trials: The maximum number of trials.
+        seed: The random seed. Defaults to None, which means a random one.
+    """
+
+    def __init__(self, max_trials: int, seed: int | None = None) -> None:
+        self.max_trials = max_trials
+        if seed is None:
+            seed = int(np.random.default_rng().integers(10_000))
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.hyperparameters = HyperParameters()
+        self.trials: dict[str, Trial] = {}
+        # The trials to run again, interrupted in a previous search
+        self._queue: list[Trial] = []
+
+    def get_state(self) -> dict[str, Any]:
+        """Returns the state of the random generators, as JSON."""
+        return {"seed": self.seed, "rng": self.rng.bit_generator.state}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """Restore the state of the random generators."""
+        self.seed = state["seed"]
+        self.rng.bit_generator.state = state["rng"]
+
+    def reload(self, records: list[dict[str, Any]]) -> None:
+        """Restore the trials of the records of a previous search. The ones
+        interrupted while running are run again first.
+
+        Args:
+            records: The records of the trial database.
+        """
+        for record in records:
+            hyperparameters = self.hyperparameters.copy()
+            hyperparameters.values = dict(record["values"])
+            trial = Trial(
+                record["trial_id"],
+                hyperparameters,
+                record["status"],
+                record["score"],
+                record["message"],
+            )
+            self.trials[trial.trial_id] = trial
+            if trial.status == "RUNNING":
+                self._queue.append(trial)
+
+    @property
+    def space(self) -> list[Float | Choice]:
+        """The searched hyperparameters."""
+        return [
+            hyperparameter
+            for hyperparameter in self.hyperparameters.space.values()
+            if not isinstance(hyperparameter, Fixed)
+        ]
+
+    def update_space(self, hyperparameters: HyperParameters) -> None:
+        """Add the hyperparameters met by a trial to the space."""
+        for name, hyperparameter in hyperparameters.space.items():
+            self.hyperparameters.space.setdefault(name, hyperparameter)
+
+    def _is_new(self, values: dict[str, Any]) -> bool:
+        """Whether no trial has the values of the searched
+        hyperparameters."""
+        return all(
+            any(
+                trial.hyperparameters.values.get(name) != value
+                for name, value in values.items()
+            )
+            for trial in self.trials.values()
+        )
+
+    def _sample(self, n_dims: int) -> np.ndarray:
+        """Returns a point of the unit hypercube."""
+        return self.rng.random(n_dims)
+
+    def _propose(self) -> dict[str, Any] | None:
+        """Returns new values of the hyperparameters, or None if none was
+        found."""
+        space = self.space
+        for _ in range(MAX_COLLISIONS):
+            point = self._sample(len(space))
+            values = {
+                hyperparameter.name: hyperparameter.prob_to_value(prob)
+                for hyperparameter, prob in zip(space, point)
+            }
+            if self._is_new(values):
+                return values
+        return None
+
+    def _vectorize(self, values: dict[str, Any]) -> list[float]:
+        """Returns the point of the unit hypercube of the values of the
+        hyperparameters of a trial."""
+        return [
+            hyperparameter.value_to_prob(
+                values.get(hyperparameter.name, hyperparameter.default)
+            )
+            for hyperparameter in self.space
+        ]
+
+    def create_trial(self) -> Trial | None:
+        """Returns a new running trial, or None if the search is over."""
+        if self._queue:
+            return self._queue.pop(0)
+        if len(self.trials) >= self.max_trials:
+            return None
+        values = self._propose()
+        if values is None:
+            return None
+
+        hyperparameters = self.hyperparameters.copy()
+        hyperparameters.values = values
+        trial_id = f"{len(self.trials):0{len(str(self.max_trials))}d}"
+        trial = Trial(trial_id, hyperparameters)
+        self.trials[trial_id] = trial
+        return trial
+
+    def get_best_trials(self, num_trials: int = 1) -> list[Trial]:
+        """Returns the completed trials of the best scores, the earlier ones
+        first on ties.
+
+        Args:
+            num_trials: The number of trials. Defaults to 1.
+        """
+        trials = [
+            trial
+            for trial in self.trials.values()
+            if trial.status == "COMPLETED"
+        ]
+        trials.sort(key=lambda trial: -trial.score)
+        return trials[:num_trials]
+
+
+class SobolOracle(RandomSearchOracle):
+    """Propose the values of the hyperparameters of the trials along a
+    scrambled Sobol sequence, which covers the space more evenly than random
+    points.
+
+    Args:
+        max_trials: The maximum number of trials.
+        seed: The random seed. Defaults to None.
+    """
+
+    def __init__(self, max_trials: int, seed: int | None = None) -> None:
+        super().__init__(max_trials, seed)
+        self._sampler = None
+
+    def _sample(self, n_dims: int) -> np.ndarray:
+        if n_dims == 0:
+            return np.empty(0)
+        if self._sampler is None or self._sampler.d != n_dims:
+            # The space grew: a new sequence, as far along as the previous one
+            sampler = qmc.Sobol(n_dims, seed=self.seed)
+            if self._sampler is not None:
+                sampler.fast_forward(self._sampler.num_generated)
+            self._sampler = sampler
+        return self._sampler.random(1)[0]
+
+    def get_state(self) -> dict[str, Any]:
+        state = super().get_state()
+        if self._sampler is not None:
+            state["n_dims"] = self._sampler.d
+            state["n_sampled"] = self._sampler.num_generated
+        return state
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        super().set_state(state)
+        if "n_dims" in state:
+            self._sampler = qmc.Sobol(state["n_dims"], seed=self.seed)
+            if state["n_sampled"]:
+                self._sampler.fast_forward(state["n_sampled"])
+
+
+class BayesianOptimizationOracle(RandomSearchOracle):
+    """Propose the values of the hyperparameters of the trials by Bayesian
+    optimization, with a Gaussian process.
+
+    After num_initial_points random trials, the proposed point is the one of
+    the best upper confidence bound among n_candidates random ones. The
+    running trials are assumed to score the lower confidence bound (a
+    constant liar), so that concurrent proposals differ. The trials of a
+    previous search, given to warm_start, are observations as well.
+
+    Args:
+        max_trials: The maximum number of trials.
+        seed: The random seed. Defaults to None.
+        num_initial_points: The number of random trials. Defaults to None,
+            which means 3 times the number of hyperparameters, at least 3.
+        beta: The weight of the standard deviation in the upper confidence
+            bound. Defaults to 2.6.
+        n_candidates: The number of random points of which the best is
+            proposed. Defaults to 1000.
+    """
+
+    def __init__(
+        self,
+        max_trials: int,
+        seed: int | None = None,
+        num_initial_points: int | None = None,
+        beta: float = 2.6,
+        n_candidates: int = 1000,
+    ) -> None:
+        super().__init__(max_trials, seed)
+        self.num_initial_points = num_initial_points
+        self.beta = beta
+        self.n_candidates = n_candidates
+        # The values and the scores of the trials of a previous search
+        self.priors: list[tuple[dict[str, Any], float]] = []
+
+    def warm_start(self, trials: pd.DataFrame) -> None:
+        """Observe the completed, and not pruned, trials of a previous search,
+        e.g. on similar data.
+
+        Args:
+            trials: The trials, as returned by load_trials.
+        """
+        trials = trials[
+            (trials["status"] == "COMPLETED")
+            & trials["message"].isna()
+            & trials["score"].notna()
+        ]
+        values = trials.drop(columns=TRIAL_FIELDS, errors="ignore")
+        for (_, row), score in zip(values.iterrows(), trials["score"]):
+            self.priors.append((row.dropna().to_dict(), float(score)))
+
+    def _fit_gpr(
+        self, x: np.ndarray, y: np.ndarray
+    ) -> GaussianProcessRegressor:
+        # Not shorter than a twentieth of the unit hypercube, which would fit
+        # a few points as unrelated
+        kernel = Matern(length_scale_bounds=(5e-2, 1e2), nu=2.5)
+        gpr = GaussianProcessRegressor(kernel, alpha=1e-4, normalize_y=True)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", ConvergenceWarning)
+            return gpr.fit(x, y)
+
+    def _propose(self) -> dict[str, Any] | None:
+        space = self.space
+        completed = [
+            trial
+            for trial in self.trials.values()
+            if trial.status == "COMPLETED"
+        ]
+        observations = [
+            (trial.hyperparameters.values, trial.score) for trial in completed
+        ]
+        for values, score in self.priors:
+            # Unless out of the space, e.g. of a narrower range or without a
+            # choice
+            try:
+                point = self._vectorize(values)
+            except (TypeError, ValueError):
+                continue
+            if all(0 <= prob <= 1 for prob in point):
+                observations.append((values, score))
+        num_initial_points = self.num_initial_points or max(3 * len(space), 3)
+        if not space or len(observations) < num_initial_points:
+            return super()._propose()
+
+        x = np.array([self._vectorize(values) for values, _ in observations])
+        y = np.array([score for _, score in observations])
+        gpr = self._fit_gpr(x, y)
+        running = [
+            trial.hyperparameters.values
+            for trial in self.trials.values()
+            if trial.status == "RUNNING"
+        ]
+        if running:
+            x_running = np.array([self._vectorize(v) for v in running])
+            mean, std = gpr.predict(x_running, return_std=True)
+            x = np.vstack([x, x_running])
+            gpr = self._fit_gpr(x, np.concatenate([y, mean - std]))
+
+        candidates = self.rng.random((self.n_candidates, len(space)))
+        mean, std = gpr.predict(candidates, return_std=True)
+        for i in np.argsort(-(mean + self.beta * std)):
+            values = {
+                hyperparameter.name: hyperparameter.prob_to_value(prob)
+                for hyperparameter, prob in zip(space, candidates[i])
+            }
+            if self._is_new(values):
+                return values
+        return None
+
+
+ORACLES = {
+    "random": RandomSearchOracle,
+    "sobol": SobolOracle,
+    "bayesian": BayesianOptimizationOracle,
+}
+
+
+class Tuner(BaseTuner):
+    """Search the hyperparameters of scikit-learn compatible models, as
+    BaseTuner does, without TensorFlow.
+
+    The model of the last fold of each trial is pickled in
+    directory/project_name/trial_<ID>/model.pickle, as Keras Tuner does. The
+    trials of the trial database and the state of the oracle, in
+    oracle.json, are reloaded, so that an interrupted search resumes where it
+    stopped, with the same proposals.
+
+    Args:
+        oracle: The oracle.
+        hypermodel: The function building a model from the hyperparameters, or
+            an object of such a build method.
+        scoring: The scorer, called as scoring(model, X, y, sample_weight).
+            Defaults to None, which means the score method of the models.
+        cv: The cross-validation splitter. Defaults to None, which means 5
+            shuffled folds.
+        directory: The directory of the project. Defaults to '.'.
+        project_name: The name of the project. Defaults to 'tuner'.
+        overwrite: Whether to remove the project first. Defaults to False.
+        **kwargs: The arguments of BaseTuner.
+    """
+
+    def __init__(
+        self,
+        oracle: RandomSearchOracle,
+        hypermodel: Callable,
+        scoring: Callable | None = None,
+        cv: Any = None,
+        directory: str = ".",
+        project_name: str = "tuner",
+        overwrite: bool = False,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(**kwargs)
+        self.oracle = oracle
+        self.hypermodel = getattr(hypermodel, "build", hypermodel)
+        self.scoring = scoring
+        self.cv = cv or KFold(5, shuffle=True, random_state=1)
+        self.project_dir = os.path.join(directory, project_name)
+        if overwrite:
+            shutil.rmtree(self.project_dir, ignore_errors=True)
+        self._n_failures = 0
+        self.oracle.reload(self._reload())
+        try:
+            with open(self._oracle_path) as file:
+                self.oracle.set_state(json.load(file))
+        except FileNotFoundError:
+            pass
+
+    @property
+    def _oracle_path(self) -> str:
+        return os.path.join(self.project_dir, "oracle.json")
+
+    @property
+    def seed(self) -> int | None:
+        return self.oracle.seed
+
+    def search(self, *args: Any, **kwargs: Any) -> None:
+        # The space is defined while building a model
+        hyperparameters = self.oracle.hyperparameters.copy()
+        self.hypermodel(hyperparameters)
+        self.oracle.update_space(hyperparameters)
+        super().search(*args, **kwargs)
+
+    search.__doc__ = BaseTuner.search.__doc__
+
+    def _create_trial(self, i: int) -> Trial | None:
+        trial = self.oracle.create_trial()
+        # Written then renamed, not to be cut by an interruption
+        os.makedirs(self.project_dir, exist_ok=True)
+        path = f"{self._oracle_path}.tmp"
+        with open(path, "w") as file:
+            json.dump(self.oracle.get_state(), file)
+        os.replace(path, self._oracle_path)
+        return trial
+
+    def _build(self, trial: Trial) -> Any:
+        model = self.hypermodel(trial.hyperparameters)
+        self.oracle.update_space(trial.hyperparameters)
+        return model
+
+    def _model_path(self, trial: Trial) -> str:
+        return os.path.join(
+            self.project_dir, f"trial_{trial.trial_id}", "model.pickle"
+        )
+
+    def _end_trial(
+        self,
+        trial: Trial,
+        scores: list[float] | None,
+        model: Any,
+        message: str | None = None,
+    ) -> None:
+        if scores is None:
+            trial.status = "FAILED"
+            trial.message = model
+            self._n_failures += 1
+            if self._n_failures == MAX_FAILURES:
+                raise RuntimeError(
+                    f"{MAX_FAILURES} consecutive trials failed.\n{model}"
+                )
+            return None
+
+        self._n_failures = 0
+        path = self._model_path(trial)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            pickle.dump(model, file, protocol=pickle.HIGHEST_PROTOCOL)
+        trial.score = float(np.mean(scores))
+        trial.status = "COMPLETED"
+        trial.message = message
+        if message is None:
+            self.fold_scores[trial.trial_id] = scores
+
+    def get_best_models(self, num_models: int = 1) -> list[Any]:
+        trials = self.oracle.get_best_trials(len(self.oracle.trials))
+        trials = [trial for trial in trials if not is_pruned(trial)]
+        models = []
+        for trial in trials[:num_models]:
+            with open(self._model_path(trial), "rb") as file:
+                models.append(pickle.load(file))
+        return models
+
+
+def make_tuner(
+    hypermodel: Callable,
+    algorithm: str,
+    max_trials: int,
+    seed: int | None,
+    warm_start: pd.DataFrame | None = None,
+    **kwargs: Any,
+) -> Tuner:
+    """Returns the tuner of a search.
+
+    Args:
+        hypermodel: The function building a model from the hyperparameters.
+        algorithm: One of "random", "sobol" and "bayesian".
+        max_trials: The maximum number of trials.
+        seed: The random seed of the oracle.
+        warm_start: The trials of a previous search, as returned by
+            load_trials, observed by the "bayesian" oracle. Defaults to None.
+        **kwargs: The arguments of Tuner.
+
+    Raises:
+        ValueError: if the algorithm is unknown, or warm_start is given with
+            another algorithm than "bayesian".
+    """
+    if algorithm not in ORACLES:
+        raise ValueError(f"algorithm must be one of {ALGORITHMS}.")
+    oracle = ORACLES[algorithm](max_trials=max_trials, seed=seed)
+    if warm_start is not None:
+        if algorithm != "bayesian":
+            raise ValueError('warm_start requires the "bayesian" algorithm.')
+        oracle.warm_start(warm_start)
+    return Tuner(oracle=oracle, hypermodel=hypermodel, **kwargs)
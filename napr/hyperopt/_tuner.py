@@ -0,0 +1,578 @@
+"""The search engine shared by the backends of the hyperparameter
+optimization."""
+
+import inspect
+import json
+import math
+import os
+import tempfile
+import time
+import traceback
+from abc import ABC, abstractmethod
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.utils import _safe_indexing, check_random_state
+
+from typing import Any, Callable, NamedTuple, TypeVar
+
+from napr.evaluation.classification import count_rungs, split_cores
+
+EstimatorT = TypeVar("EstimatorT")
+Trial = Any  # A trial of a backend, with trial_id, hyperparameters and message
+
+PRUNINGS = ["median", "percentile", "halving"]
+PRUNED = "Pruned"  # Prefix of the message of the pruned trials
+MIN_TRIALS = 5  # Completed before pruning on the percentile of their scores
+TRIALS_FILE = "trials.jsonl"  # The trial database, in the project directory
+TRIAL_FIELDS = [
+    "trial_id",
+    "status",
+    "score",
+    "fold_scores",
+    "fit_times",
+    "message",
+]
+MMAP_BYTES = 2**20  # Larger blocks of the splits are memory-mapped
+
+
+class Split(NamedTuple):
+    """The train and test data of a split of the cross-validation, copied
+    once for all the trials."""
+
+    X_train: pd.DataFrame | np.ndarray
+    y_train: pd.Series | np.ndarray
+    sw_train: np.ndarray | None
+    X_test: pd.DataFrame | np.ndarray
+    y_test: pd.Series | np.ndarray
+    sw_test: np.ndarray | None
+
+
+class Folds(NamedTuple):
+    """The scores and the fit times of the folds of a trial, and the model of
+    the last one, or None, None and the traceback if a model failed."""
+
+    scores: list[float] | None
+    fit_times: list[float] | None
+    model: Any
+
+
+def _block(
+    data: pd.DataFrame | pd.Series | np.ndarray | None,
+    indices: np.ndarray,
+    folder: str,
+) -> pd.DataFrame | pd.Series | np.ndarray | None:
+    """Returns the rows of the data at the indices, contiguous, and
+    memory-mapped from a file of the folder if larger than MMAP_BYTES."""
+    if data is None:
+        return None
+    block = _safe_indexing(data, indices)
+    if isinstance(block, pd.DataFrame):
+        dtypes = set(block.dtypes)
+    elif isinstance(block, pd.Series):
+        dtypes = {block.dtype}
+    else:
+        block = np.ascontiguousarray(block)
+        dtypes = {block.dtype}
+    # Only the blocks of a single numpy dtype, without objects, are mapped
+    dtype = dtypes.pop() if len(dtypes) == 1 else None
+    if not isinstance(dtype, np.dtype) or dtype.hasobject:
+        return block
+    values = np.ascontiguousarray(block)
+    if values.nbytes <= MMAP_BYTES:
+        return block
+
+    path = os.path.join(folder, f"{len(os.listdir(folder))}.joblib")
+    joblib.dump(values, path)
+    values = joblib.load(path, mmap_mode="r")
+    if isinstance(block, pd.DataFrame):
+        return pd.DataFrame(
+            values, index=block.index, columns=block.columns, copy=False
+        )
+    if isinstance(block, pd.Series):
+        return pd.Series(values, index=block.index, name=block.name, copy=False)
+    return values
+
+
+def _make_splits(
+    data: tuple,
+    indices: list[tuple[np.ndarray, np.ndarray]],
+    folder: str,
+) -> list[Split]:
+    """Returns the splits of the data at the (train, test) indices."""
+    return [
+        Split(
+            *(_block(array, train, folder) for array in data),
+            *(_block(array, test, folder) for array in data),
+        )
+        for train, test in indices
+    ]
+
+
+def _fit_score_fold(
+    model: EstimatorT,
+    split: Split,
+    sample: np.ndarray | None,
+    scoring: Callable | None,
+) -> tuple[float | None, float | None, EstimatorT | str]:
+    """Fit a model on the train data of a split, or on a sample of its rows,
+    and score it on the test data, as SklearnTuner does.
+
+    Returns:
+        The score, the fit time in seconds and the fitted model, or None, None
+        and the traceback if the model failed.
+    """
+    X_train, y_train, sw_train = split.X_train, split.y_train, split.sw_train
+    if sample is not None:
+        X_train = _safe_indexing(X_train, sample)
+        y_train = _safe_indexing(y_train, sample)
+        if sw_train is not None:
+            sw_train = _safe_indexing(sw_train, sample)
+    try:
+        fit_params = {}
+        supports_sw = "sample_weight" in inspect.getfullargspec(model.fit).args
+        if sw_train is not None and supports_sw:
+            if not isinstance(model, Pipeline):
+                fit_params["sample_weight"] = sw_train
+        start = time.perf_counter()
+        model.fit(X_train, y_train, **fit_params)
+        fit_time = time.perf_counter() - start
+
+        X_test, y_test, sw_test = split.X_test, split.y_test, split.sw_test
+        if scoring is None:
+            score = model.score(X_test, y_test, sample_weight=sw_test)
+        else:
+            score = scoring(model, X_test, y_test, sample_weight=sw_test)
+    except Exception:
+        return None, None, traceback.format_exc()
+    return score, fit_time, model
+
+
+def _run_folds(
+    tasks: list[tuple[EstimatorT, Split, np.ndarray | None]],
+    scoring: Callable | None,
+    n_jobs: int | None,
+) -> list[tuple[float | None, float | None, EstimatorT | str]]:
+    """Fit and score the (model, split, sample) tasks, one after another if
+    the budget is one core or else in a process pool."""
+    n_workers, n_jobs_model = split_cores(n_jobs, -1, len(tasks))
+    # The jobs of the models share the budget, as in eval_classification
+    for model, _, _ in tasks:
+        if hasattr(model, "get_params") and "n_jobs" in model.get_params():
+            model.set_params(n_jobs=n_jobs_model)
+    if n_workers == 1:
+        return [
+            _fit_score_fold(model, split, sample, scoring)
+            for model, split, sample in tasks
+        ]
+
+    # The memory-mapped splits are passed by file name, and the other arrays
+    # larger than 1 MB are memory-mapped to the workers
+    with joblib.parallel_backend("loky", inner_max_num_threads=n_jobs_model):
+        return joblib.Parallel(
+            n_jobs=n_workers, max_nbytes="1M", mmap_mode="r"
+        )(
+            joblib.delayed(_fit_score_fold)(model, split, sample, scoring)
+            for model, split, sample in tasks
+        )
+
+
+class BaseTuner(ABC):
+    """Cross-validate the trials proposed by an oracle, several at once, with
+    their folds in parallel, and prune the unpromising ones.
+
+    Each round asks the oracle for up to n_parallel trials. The oracle
+    accounts for the running trials when proposing the next one (e.g. the
+    Bayesian oracles assume a pessimistic score for them, i.e. a constant
+    liar), so the candidates of a round differ. The folds of all the trials of
+    a round are then fitted in one process pool, which shares the budget of
+    cores with the jobs of the models. The train and test data of the folds
+    are copied once per search, the blocks larger than MMAP_BYTES to
+    memory-mapped files, and shared by all the trials and workers.
+
+    With the "median" or "percentile" pruning, the folds are fitted one at a
+    time, and a trial stops as soon as its mean score so far is below the
+    median, or the given percentile, of the mean scores of the completed
+    trials over as many folds. With the "halving" pruning, the trials of each
+    round race by successive halving: they are cross-validated on a fraction
+    of the resource, i.e. of the train samples or of the iterations of the
+    models, factor times larger at each rung, and only the best 1 / factor of
+    them go on to the next rung. So that some trials are pruned, the rounds
+    of the "halving" pruning are brackets of at least factor trials, even if
+    n_parallel is smaller; only a last, smaller bracket of the remaining
+    max_trials may race without pruning.
+
+    The pruned trials report their last mean score to the oracle, but are
+    never returned by get_best_models.
+
+    Each trial is recorded in the trial database of the project directory,
+    TRIALS_FILE, once when it begins and once when it ends. The database is
+    appended to, so that an interrupted search can be resumed from it, and
+    can be queried with load_trials.
+
+    A backend implements how to create, begin and end the trials, build their
+    models and return the best ones; it provides the cv splitter, the scoring,
+    the random seed of the subsamples and the project directory.
+
+    Args:
+        n_parallel: The number of trials per round, at least factor with the
+            "halving" pruning. Defaults to 1.
+        n_jobs: The budget of cores, as in joblib: None means 1 and -1 means
+            all CPUs. Defaults to None.
+        pruning: One of "median", "percentile" and "halving". Defaults to
+            None, which means no pruning.
+        percentile: The percentile of the "percentile" pruning. Defaults to
+            25.
+        factor: The factor of the "halving" pruning. Defaults to 3.
+        resource: The resource of the "halving" pruning: "samples", for the
+            train samples, or the parameter of the number of iterations of the
+            models, e.g. "n_estimators". Defaults to "samples".
+
+    Raises:
+        ValueError: if n_parallel is not positive, pruning is unknown,
+            percentile is not in ]0, 100[ or factor is not larger than 1.
+    """
+
+    cv: Any
+    scoring: Callable | None
+    seed: int | None
+    project_dir: str
+
+    def __init__(
+        self,
+        n_parallel: int = 1,
+        n_jobs: int | None = None,
+        pruning: str | None = None,
+        percentile: float = 25,
+        factor: float = 3,
+        resource: str = "samples",
+    ) -> None:
+        if n_parallel < 1:
+            raise ValueError("n_parallel must be positive.")
+        if pruning is not None and pruning not in PRUNINGS:
+            raise ValueError(f"pruning must be one of {PRUNINGS} or None.")
+        if not 0 < percentile < 100:
+            raise ValueError("percentile must be in ]0, 100[.")
+        if factor <= 1:
+            raise ValueError("factor must be larger than 1.")
+        self.n_parallel = n_parallel
+        self.n_jobs = n_jobs
+        self.pruning = pruning
+        self.percentile = 50 if pruning == "median" else percentile
+        self.factor = factor
+        self.resource = resource
+        # The scores of the folds of the completed trials, by trial ID
+        self.fold_scores: dict[str, list[float]] = {}
+
+    @abstractmethod
+    def _create_trial(self, i: int) -> Trial | None:
+        """Returns the i-th trial of a round, or None if there is none."""
+
+    def _begin_trial(self, trial: Trial) -> None:
+        """Called before fitting the models of a trial."""
+
+    @abstractmethod
+    def _build(self, trial: Trial) -> Any:
+        """Returns a new model with the hyperparameters of a trial."""
+
+    @abstractmethod
+    def _end_trial(
+        self,
+        trial: Trial,
+        scores: list[float] | None,
+        model: Any,
+        message: str | None = None,
+    ) -> None:
+        """Report the scores of the folds of a trial, and keep the model of
+        the last fold. Implementations store the scores in fold_scores unless
+        the trial was pruned.
+
+        Args:
+            trial: The trial.
+            scores: The scores of the folds, None if the trial failed.
+            model: The model of the last fold, or the traceback if the trial
+                failed.
+            message: The message of a pruned trial. Defaults to None.
+        """
+
+    @abstractmethod
+    def get_best_models(self, num_models: int = 1) -> list[Any]:
+        """Returns the models of the best completed trials, excluding the
+        pruned ones.
+
+        Args:
+            num_models: The number of models. Defaults to 1.
+        """
+
+    def _create_trials(self) -> list[Trial]:
+        """Returns the trials of the next round, none if the search is over."""
+        trials = []
+        n_trials = self.n_parallel
+        if self.pruning == "halving":
+            # A bracket of at least factor trials, one of them kept
+            n_trials = max(n_trials, math.ceil(self.factor))
+        for i in range(n_trials):
+            trial = self._create_trial(i)
+            if trial is None:
+                # Stopped, or idle until the running trials end
+                break
+            trials.append(trial)
+        return trials
+
+    def search(
+        self,
+        X: pd.DataFrame | np.ndarray,
+        y: pd.Series | np.ndarray,
+        sample_weight: np.ndarray | None = None,
+        groups: np.ndarray | None = None,
+    ) -> None:
+        """Search the hyperparameters space, a round of trials at a time.
+
+        Args:
+            X: Input data.
+            y: Target data (1d).
+            sample_weight: Sample weights. Defaults to None.
+            groups: Group labels, for the splitters by groups. Defaults to
+                None.
+
+        Raises:
+            ValueError: if the resource of the "halving" pruning is not a
+                parameter of a model.
+        """
+        cv_kwargs = {"groups": groups} if groups is not None else {}
+        # The same folds for all the trials, so that their scores compare
+        indices = list(self.cv.split(X, y, **cv_kwargs))
+        with tempfile.TemporaryDirectory(
+            prefix="napr-splits-", ignore_cleanup_errors=True
+        ) as folder:
+            # Copied once, not by each fold of each trial
+            splits = _make_splits((X, y, sample_weight), indices, folder)
+            while trials := self._create_trials():
+                for trial in trials:
+                    self._record(trial, "RUNNING")
+                    self._begin_trial(trial)
+                if self.pruning == "halving":
+                    self._race(trials, splits)
+                else:
+                    self._cross_validate(trials, splits)
+
+    def _fit_score(
+        self, trials: list[Trial], splits: list[Split], budget: float = 1
+    ) -> list[Folds]:
+        """Fit and score the models of the trials on the splits, with a
+        fraction of the resource."""
+        tasks = []
+        for trial in trials:
+            for split in splits:
+                model, sample = self._build(trial), None
+                if budget < 1:
+                    model, sample = self._reduce(model, split.y_train, budget)
+                tasks.append((model, split, sample))
+
+        results = _run_folds(tasks, self.scoring, self.n_jobs)
+        n_splits = len(splits)
+        folds = []
+        for i in range(len(trials)):
+            scores, fit_times, models = zip(
+                *results[i * n_splits : (i + 1) * n_splits]
+            )
+            failures = [model for model in models if isinstance(model, str)]
+            if failures:
+                folds.append(Folds(None, None, failures[0]))
+            else:
+                folds.append(Folds(list(scores), list(fit_times), models[-1]))
+        return folds
+
+    def _reduce(
+        self,
+        model: EstimatorT,
+        y_train: pd.Series | np.ndarray,
+        budget: float,
+    ) -> tuple[EstimatorT, np.ndarray | None]:
+        """Returns the model and the positions of the train samples (None for
+        all of them) with a fraction of the resource."""
+        if self.resource != "samples":
+            params = model.get_params()
+            if self.resource not in params:
+                raise ValueError(
+                    f"resource {self.resource} is not a parameter of {model}."
+                )
+            n_iter = max(1, round(params[self.resource] * budget))
+            return model.set_params(**{self.resource: n_iter}), None
+
+        n_train = len(y_train)
+        n_samples = max(2 * len(np.unique(y_train)), int(n_train * budget))
+        if n_samples >= n_train:
+            return model, None
+        # Stratified, unless a class is too small
+        try:
+            sample, _ = train_test_split(
+                np.arange(n_train),
+                train_size=n_samples,
+                stratify=y_train,
+                random_state=self.seed,
+            )
+        except ValueError:
+            rng = check_random_state(self.seed)
+            sample = rng.permutation(n_train)[:n_samples]
+        return model, np.sort(sample)
+
+    def _cross_validate(self, trials: list[Trial], splits: list[Split]) -> None:
+        """Cross-validate the trials, pruning them after each fold if
+        required."""
+        # With pruning, the folds are fitted one at a time
+        steps = [[split] for split in splits] if self.pruning else [splits]
+        folds = {trial.trial_id: Folds([], [], None) for trial in trials}
+        for i, step in enumerate(steps):
+            results = self._fit_score(trials, step)
+            running = []
+            for trial, step_folds in zip(trials, results):
+                if step_folds.scores is None:
+                    self._finish_trial(trial, step_folds)
+                    continue
+                previous = folds[trial.trial_id]
+                trial_folds = Folds(
+                    previous.scores + step_folds.scores,
+                    previous.fit_times + step_folds.fit_times,
+                    step_folds.model,
+                )
+                folds[trial.trial_id] = trial_folds
+                if i == len(steps) - 1:
+                    self._finish_trial(trial, trial_folds)
+                elif self._prune(trial_folds.scores, len(splits)):
+                    message = f"{PRUNED} after {i + 1} of {len(splits)} folds"
+                    self._finish_trial(trial, trial_folds, message)
+                else:
+                    running.append(trial)
+            trials = running
+
+    def _prune(self, scores: list[float], n_splits: int) -> bool:
+        """Whether the mean score of a trial over its first folds is below the
+        percentile of the ones of the completed trials."""
+        n_folds = len(scores)
+        references = [
+            np.mean(trial_scores[:n_folds])
+            for trial_scores in self.fold_scores.values()
+            if len(trial_scores) == n_splits
+        ]
+        if len(references) < MIN_TRIALS:
+            return False
+        return np.mean(scores) < np.percentile(references, self.percentile)
+
+    def _race(self, trials: list[Trial], splits: list[Split]) -> None:
+        """Race the trials by successive halving, on the resource."""
+        n_rungs = count_rungs(len(trials), self.factor)
+        for rung in range(n_rungs + 1):
+            budget = self.factor ** (rung - n_rungs)
+            results = self._fit_score(trials, splits, budget)
+
+            ranked = []
+            for trial, folds in zip(trials, results):
+                if folds.scores is None or rung == n_rungs:
+                    self._finish_trial(trial, folds)
+                else:
+                    ranked.append((np.mean(folds.scores), trial, folds))
+
+            # The best ones, with the earlier ones first on ties
+            ranked.sort(key=lambda item: -item[0])
+            n_kept = math.ceil(len(trials) / self.factor)
+            for _, trial, folds in ranked[n_kept:]:
+                message = f"{PRUNED} at rung {rung}, with {budget:.0%} of the"
+                message += f" {self.resource}"
+                self._finish_trial(trial, folds, message)
+            trials = [trial for _, trial, _ in ranked[:n_kept]]
+
+    def _finish_trial(
+        self, trial: Trial, folds: Folds, message: str | None = None
+    ) -> None:
+        """Record a trial in the trial database, then end it."""
+        if folds.scores is None:
+            self._record(trial, "FAILED", folds, folds.model)
+        else:
+            self._record(trial, "COMPLETED", folds, message)
+        self._end_trial(trial, folds.scores, folds.model, message)
+
+    def _record(
+        self,
+        trial: Trial,
+        status: str,
+        folds: Folds | None = None,
+        message: str | None = None,
+    ) -> None:
+        """Append the record of a trial to the trial database."""
+        record = {
+            "trial_id": trial.trial_id,
+            "status": status,
+            "score": None,
+            "fold_scores": None,
+            "fit_times": None,
+            "message": message,
+            "values": trial.hyperparameters.values,
+        }
+        if folds is not None and folds.scores is not None:
+            record.update(
+                score=float(np.mean(folds.scores)),
+                fold_scores=[float(score) for score in folds.scores],
+                fit_times=folds.fit_times,
+            )
+        os.makedirs(self.project_dir, exist_ok=True)
+        with open(os.path.join(self.project_dir, TRIALS_FILE), "a") as file:
+            file.write(json.dumps(record, default=repr) + "\n")
+
+    def _reload(self) -> list[dict[str, Any]]:
+        """Returns the records of the trial database, keeping the scores of
+        the folds of the completed trials for the pruning."""
+        records = read_trials(self.project_dir)
+        for record in records:
+            if record["status"] == "COMPLETED" and not record["message"]:
+                self.fold_scores[record["trial_id"]] = record["fold_scores"]
+        return records
+
+
+def is_pruned(trial: Trial) -> bool:
+    """Whether a trial was pruned."""
+    return (trial.message or "").startswith(PRUNED)
+
+
+def read_trials(project_dir: str) -> list[dict[str, Any]]:
+    """Returns the last record of each trial in the trial database of a
+    project, none if there is no database."""
+    records = {}
+    try:
+        with open(os.path.join(project_dir, TRIALS_FILE)) as file:
+            for line in file:
+                # A line cut by an interruption is skipped
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["trial_id"]] = record
+    except FileNotFoundError:
+        pass
+    return list(records.values())
+
+
+def load_trials(
+    directory: str = ".", project_name: str = "tuner"
+) -> pd.DataFrame:
+    """Load the trial database of a search, without loading its tuner.
+
+    Args:
+        directory: The directory of the search. Defaults to '.'.
+        project_name: The project name of the search. Defaults to 'tuner'.
+
+    Returns:
+        A trial per row, with its ID, its status (RUNNING if the search was
+        interrupted during the trial, COMPLETED or FAILED), its mean score,
+        the scores and the fit times in seconds of its folds, its message
+        (the reason of pruning, or the traceback of the failure), and the
+        values of its hyperparameters in the next columns.
+    """
+    records = read_trials(os.path.join(directory, project_name))
+    trials = pd.DataFrame(records, columns=TRIAL_FIELDS)
+    values = pd.DataFrame([record["values"] for record in records])
+    return pd.concat([trials, values], axis=1)
@@ -1,5 +1,7 @@
 """Test the base hyperopt related functions."""
 
+import subprocess
+import sys
 from tempfile import TemporaryDirectory
 
 import numpy as np
@@ -72,3 +74,77 @@ def test_find_best_models(X, y, hypermodel, scores, max_trials, cv, exception):
             )
             assert isinstance(best_model, KNeighborsClassifier)
             assert best_model.n_neighbors in [3, 5]  # type: ignore
+
+
+@pytest.mark.parametrize(
+    "backend, algorithm",
+    [
+        ("native", "random"),
+        ("native", "sobol"),
+        ("native", "bayesian"),
+        ("keras_tuner", "random"),
+        ("keras_tuner", "bayesian"),
+    ],
+)
+def test_find_best_models_backend(tmp_path, backend, algorithm):
+    """Test the backends and their search algorithms."""
+    if backend == "keras_tuner":
+        pytest.importorskip("keras_tuner")
+    X, y = np.random.rand(150, 2), np.random.randint(0, 3, 150)
+    best_models = find_best_models(
+        X=X,
+        y=y,
+        hypermodel=lambda hp: KNeighborsClassifier(
+            hp.Int("n_neighbors", 1, 20)
+        ),
+        max_trials=4,
+        cv=2,
+        directory=str(tmp_path),
+        random_state=777,
+        num_models=2,
+        backend=backend,
+        algorithm=algorithm,
+    )
+    assert len(best_models) == 2
+    assert all(isinstance(model, KNeighborsClassifier) for model in best_models)
+
+
+@pytest.mark.parametrize(
+    "backend, algorithm",
+    [("tensorflow", "random"), ("native", "grid"), ("keras_tuner", "sobol")],
+)
+def test_find_best_models_unknown(tmp_path, backend, algorithm):
+    """Test unknown backends and algorithms."""
+    if backend == "keras_tuner":
+        pytest.importorskip("keras_tuner")
+    with pytest.raises(ValueError):
+        find_best_models(
+            X=np.random.rand(10, 2),
+            y=np.random.randint(0, 2, 10),
+            hypermodel=lambda hp: KNeighborsClassifier(),
+            directory=str(tmp_path),
+            backend=backend,
+            algorithm=algorithm,
+        )
+
+
+def test_find_best_models_without_tensorflow(tmp_path):
+    """Test that the native backend does not import TensorFlow."""
+    code = f"""
+import sys
+import numpy as np
+from sklearn.neighbors import KNeighborsClassifier
+from napr.hyperopt import find_best_models
+
+find_best_models(
+    np.random.rand(30, 2),
+    np.random.randint(0, 2, 30),
+    lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 1, 5)),
+    max_trials=2,
+    cv=2,
+    directory={str(tmp_path)!r},
+)
+assert "keras_tuner" not in sys.modules
+assert "tensorflow" not in sys.modules
+"""
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,259 @@
+"""Test the native backend of the hyperparameter optimization."""
+
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+
+import pytest
+
+from napr.hyperopt._native import (
+    BayesianOptimizationOracle,
+    Choice,
+    Float,
+    HyperParameters,
+    Int,
+    RandomSearchOracle,
+    SobolOracle,
+    Trial,
+    make_tuner,
+)
+from napr.hyperopt._tuner import TRIAL_FIELDS, load_trials
+
+
+def test_hyperparameters():
+    """Test defining the space and retrieving the values."""
+    hp = HyperParameters()
+    assert hp.Int("depth", 3, 21, step=2) == 3
+    assert hp.Float("rate", 1e-4, 1e-1, sampling="log") == 1e-4
+    assert hp.Choice("n", [50, 100, 200], default=100) == 100
+    assert hp.Boolean("bootstrap") is False
+    assert hp.Fixed("seed", 777) == 777
+    assert list(hp.space) == ["depth", "rate", "n", "bootstrap", "seed"]
+
+    hp = hp.copy()
+    hp.values = {"depth": 7, "n": 50}
+    assert hp.Int("depth", 3, 21, step=2) == 7
+    assert hp.Choice("n", [50, 100, 200], default=100) == 50
+    assert hp["depth"] == 7 and hp.get("n") == 50
+    assert "n" in hp and "rate" not in hp
+
+    with pytest.raises(KeyError):
+        hp["rate"]
+
+    with pytest.raises(NotImplementedError, match="keras_tuner"):
+        hp.Int("leaf", 1, 5, parent_name="n", parent_values=[50])
+    with pytest.raises(NotImplementedError, match="keras_tuner"):
+        with hp.conditional_scope("n", [50]):
+            hp.Boolean("bootstrap")
+
+
+@pytest.mark.parametrize(
+    "hyperparameter, values",
+    [
+        (Int("i", 3, 21, step=2), list(range(3, 22, 2))),
+        (Int("i", 1, 5), [1, 2, 3, 4, 5]),
+        (Float("f", 0, 0.5, step=0.1), [0, 0.1, 0.2, 0.3, 0.4, 0.5]),
+        (Float("f", 1, 1000, step=10, sampling="log"), [1, 10, 100, 1000]),
+        (
+            Float("f", 1, 1000, step=10, sampling="reverse_log"),
+            [1, 901, 991, 1000],
+        ),
+        (Choice("c", ["a", "b", "c"]), ["a", "b", "c"]),
+    ],
+)
+def test_discrete_hyperparameter(hyperparameter, values):
+    """Test mapping the unit interval to the values, and back."""
+    probs = np.linspace(0, 1, 1001)
+    sampled = [hyperparameter.prob_to_value(prob) for prob in probs]
+    assert sorted(set(sampled), key=values.index) == values
+    for value in values:
+        prob = hyperparameter.value_to_prob(value)
+        assert hyperparameter.prob_to_value(prob) == pytest.approx(value)
+
+
+def test_continuous_hyperparameter():
+    """Test mapping the unit interval to the values, and back."""
+    linear = Float("f", -1, 3)
+    log = Float("f", 1e-4, 1e-1, sampling="log")
+    integer = Int("i", 1, 1000, sampling="log")
+    reverse_log = Float("f", 1, 1000, sampling="reverse_log")
+    assert linear.prob_to_value(0.25) == 0
+    assert log.prob_to_value(1 / 3) == pytest.approx(1e-3)
+    assert reverse_log.prob_to_value(2 / 3) == pytest.approx(991)
+    assert integer.prob_to_value(0.5) == 32
+    assert isinstance(integer.prob_to_value(0.5), int)
+    for hyperparameter in [linear, log, reverse_log]:
+        for prob in [0, 0.3, 1]:
+            value = hyperparameter.prob_to_value(prob)
+            assert hyperparameter.value_to_prob(value) == pytest.approx(prob)
+
+    for args, kwargs in [
+        ((1, 0), {}),
+        ((0, 1), {"sampling": "log"}),
+        ((0, 1), {"sampling": "reverse_log"}),
+        ((0, 1), {"sampling": "sqrt"}),
+    ]:
+        with pytest.raises(ValueError):
+            Float("f", *args, **kwargs)
+    with pytest.raises(ValueError):
+        Choice("c", [])
+
+
+def run(oracle, objective, hypermodel, n_parallel=1):
+    """Search with an oracle, n_parallel trials at a time."""
+    hp = HyperParameters()
+    hypermodel(hp)
+    oracle.update_space(hp)
+    while trials := [
+        trial
+        for trial in (oracle.create_trial() for _ in range(n_parallel))
+        if trial is not None
+    ]:
+        for trial in trials:
+            hypermodel(trial.hyperparameters)
+            trial.score = objective(trial.hyperparameters)
+            trial.status = "COMPLETED"
+    return list(oracle.trials.values())
+
+
+@pytest.mark.parametrize(
+    "oracle", [RandomSearchOracle, SobolOracle, BayesianOptimizationOracle]
+)
+def test_oracle(oracle):
+    """Test proposing new values, until max_trials."""
+    trials = run(
+        oracle(max_trials=20, seed=777),
+        lambda hp: -abs(hp["x"] - 7),
+        lambda hp: (hp.Int("x", 0, 30), hp.Fixed("seed", 777)),
+        n_parallel=4,
+    )
+    assert len(trials) == 20
+    assert all(isinstance(trial, Trial) for trial in trials)
+    values = [trial.hyperparameters["x"] for trial in trials]
+    assert len(set(values)) == 20
+    assert all(trial.hyperparameters["seed"] == 777 for trial in trials)
+    assert [trial.trial_id for trial in trials[:2]] == ["00", "01"]
+
+    # Stopped once the space is exhausted
+    trials = run(
+        oracle(max_trials=20, seed=777),
+        lambda hp: hp["x"],
+        lambda hp: hp.Choice("x", [1, 2, 3]),
+    )
+    assert sorted(trial.hyperparameters["x"] for trial in trials) == [1, 2, 3]
+
+
+def test_sobol_oracle():
+    """Test that the Sobol points cover the space evenly."""
+    trials = run(
+        SobolOracle(max_trials=16, seed=777),
+        lambda hp: 0,
+        lambda hp: hp.Float("x", 0, 1),
+    )
+    values = sorted(trial.hyperparameters["x"] for trial in trials)
+    # One point in each sixteenth of the interval
+    np.testing.assert_array_equal(np.floor(np.array(values) * 16), range(16))
+
+
+def test_bayesian_optimization_oracle():
+    """Test that the Bayesian optimization converges on the optimum."""
+    oracle = BayesianOptimizationOracle(max_trials=15, seed=777)
+    trials = run(
+        oracle,
+        lambda hp: -((hp["x"] - 0.7) ** 2) - (hp["y"] - 0.2) ** 2,
+        lambda hp: (hp.Float("x", 0, 1), hp.Float("y", 0, 1)),
+    )
+    best = oracle.get_best_trials()[0]
+    assert best.trial_id not in [trial.trial_id for trial in trials[:6]]
+    assert best.hyperparameters["x"] == pytest.approx(0.7, abs=0.1)
+    assert best.hyperparameters["y"] == pytest.approx(0.2, abs=0.1)
+
+
+def test_make_tuner(tmp_path):
+    """Test making a tuner, and failing after consecutive failed trials."""
+    with pytest.raises(ValueError):
+        make_tuner(None, "grid", 10, None)
+
+    tuner = make_tuner(
+        lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 100, 200)),
+        "random",
+        10,
+        777,
+        cv=StratifiedKFold(2),
+        directory=str(tmp_path),
+    )
+    with pytest.raises(RuntimeError):
+        tuner.search(np.random.rand(20, 2), np.random.randint(0, 2, 20))
+    assert len(tuner.oracle.trials) == 3
+
+
+def test_warm_start():
+    """Test starting the Bayesian optimization from previous trials."""
+    prior = lambda x: ["COMPLETED", -((x - 0.7) ** 2), None, None, None, x]
+    trials = pd.DataFrame(
+        [[str(i), *prior(x)] for i, x in enumerate([0.1, 0.3, 0.5, 0.9])]
+        + [
+            ["4", "COMPLETED", 0.0, None, None, "Pruned after 1 of 2", 0.7],
+            ["5", "FAILED", None, None, None, "Traceback", 0.2],
+            ["6", "COMPLETED", 0.0, None, None, None, 2.0],  # Out of space
+        ],
+        columns=[*TRIAL_FIELDS, "x"],
+    )
+    oracle = BayesianOptimizationOracle(max_trials=3, seed=777)
+    oracle.warm_start(trials)
+    assert len(oracle.priors) == 5
+
+    trials = run(
+        oracle,
+        lambda hp: -((hp["x"] - 0.7) ** 2),
+        lambda hp: hp.Float("x", 0, 1),
+    )
+    # No random initial trials
+    assert trials[0].hyperparameters["x"] == pytest.approx(0.7, abs=0.05)
+
+    with pytest.raises(ValueError):
+        make_tuner(None, "random", 10, 777, warm_start=trials)
+
+
+def test_resume(tmp_path):
+    """Test resuming an interrupted search, with the same proposals."""
+    X, y = np.random.rand(40, 2), np.random.randint(0, 2, 40)
+    n_builds = []
+
+    def hypermodel(hp):
+        n_neighbors = hp.Int("n_neighbors", 1, 15)
+        weights = hp.Choice("weights", ["uniform", "distance"])
+        n_builds.append(None)
+        if len(n_builds) == 15:  # The second fold of the 7th trial
+            raise KeyboardInterrupt
+        return KNeighborsClassifier(n_neighbors, weights=weights)
+
+    def search(project_name, algorithm="bayesian", max_trials=8):
+        tuner = make_tuner(
+            hypermodel,
+            algorithm,
+            max_trials,
+            777,
+            cv=StratifiedKFold(2),
+            directory=str(tmp_path),
+            project_name=project_name,
+        )
+        tuner.search(X, y)
+        return [
+            (trial.hyperparameters.values, trial.status, trial.score)
+            for trial in tuner.oracle.trials.values()
+        ]
+
+    with pytest.raises(KeyboardInterrupt):
+        search("resumed")
+    assert len(load_trials(str(tmp_path), "resumed")) == 7
+    resumed = search("resumed")
+    assert resumed == search("uninterrupted")
+    assert all(status == "COMPLETED" for _, status, _ in resumed)
+
+    # With more trials
+    first = search("extended", "sobol", max_trials=3)
+    assert search("extended", "sobol", max_trials=6)[:3] == first
+    assert len(load_trials(str(tmp_path), "extended")) == 6
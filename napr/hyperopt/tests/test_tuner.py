@@ -0,0 +1,337 @@
+"""Test the search engine shared by the backends."""
+
+import importlib
+
+import numpy as np
+import pandas as pd
+
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import StratifiedKFold
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+import pytest
+
+from napr.hyperopt import load_trials
+from napr.hyperopt._tuner import TRIAL_FIELDS, _make_splits
+
+
+@pytest.fixture(params=["native", "keras_tuner"])
+def backend(request):
+    if request.param == "keras_tuner":
+        pytest.importorskip("keras_tuner")
+    return importlib.import_module(f"napr.hyperopt._{request.param}")
+
+
+@pytest.fixture
+def classification_data():
+    X, y = make_classification(300, 10, n_informative=4, random_state=777)
+    return pd.DataFrame(X), pd.Series(y)
+
+
+def make_tuner(backend, path, hypermodel, max_trials, **kwargs):
+    kwargs = {"algorithm": "random", **kwargs}
+    return backend.make_tuner(
+        hypermodel,
+        max_trials=max_trials,
+        seed=777,
+        cv=StratifiedKFold(3, shuffle=True, random_state=777),
+        directory=str(path),
+        project_name="tuner",
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("n_jobs, n_parallel", [(None, 1), (2, 3), (-1, 4)])
+def test_parallel_search(backend, tmp_path, n_jobs, n_parallel):
+    """Test evaluating concurrent trials with their folds in parallel."""
+    X, y = np.random.rand(150, 2), np.random.randint(0, 3, 150)
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 1, 30)),
+        max_trials=6,
+        algorithm="bayesian",
+        n_parallel=n_parallel,
+        n_jobs=n_jobs,
+    )
+    tuner.search(X, y)
+
+    trials = list(tuner.oracle.trials.values())
+    assert len(trials) == 6
+    assert all(trial.status == "COMPLETED" for trial in trials)
+    # The candidates of a round differ
+    values = [trial.hyperparameters["n_neighbors"] for trial in trials]
+    assert len(set(values[:n_parallel])) == n_parallel
+
+    # The score of a trial is the mean over its folds
+    trial = tuner.oracle.get_best_trials()[0]
+    model = KNeighborsClassifier(trial.hyperparameters["n_neighbors"])
+    expected = [
+        model.fit(X[train], y[train]).score(X[test], y[test])
+        for train, test in tuner.cv.split(X, y)
+    ]
+    assert trial.score == pytest.approx(np.mean(expected))
+    assert tuner.fold_scores[trial.trial_id] == pytest.approx(expected)
+    assert isinstance(tuner.get_best_models()[0], KNeighborsClassifier)
+
+
+@pytest.mark.parametrize("n_jobs, expected", [(None, 1), (6, 2)])
+def test_model_n_jobs(backend, tmp_path, n_jobs, expected):
+    """Test capping the jobs of the models to their share of the budget,
+    e.g. 6 cores over the 3 folds of a trial."""
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: RandomForestClassifier(
+            hp.Int("n_estimators", 2, 10), n_jobs=-1
+        ),
+        max_trials=2,
+        n_jobs=n_jobs,
+    )
+    tuner.search(np.random.rand(60, 2), np.random.randint(0, 2, 60))
+    assert tuner.get_best_models()[0].n_jobs == expected
+
+
+def test_failed_trial(backend, tmp_path):
+    """Test that a failing trial is reported as failed."""
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: KNeighborsClassifier(hp.Choice("k", [500])),
+        max_trials=2,
+        n_parallel=2,
+    )
+    tuner.search(np.random.rand(20, 2), np.random.randint(0, 2, 20))
+    trial = tuner.oracle.trials["0"]
+    assert trial.status == "FAILED" and "n_neighbors" in trial.message
+
+
+def test_prune(tmp_path):
+    """Test pruning on the percentile of the scores of the completed trials."""
+    backend = importlib.import_module("napr.hyperopt._native")
+    tuner = make_tuner(backend, tmp_path, None, 1, pruning="median")
+    tuner.fold_scores = {str(i): [0.5 + 0.1 * i, 0.5] for i in range(4)}
+    assert not tuner._prune([0.1], 2)  # Too few completed trials
+
+    tuner.fold_scores["4"] = [0.9, 0.5]
+    tuner.fold_scores["5"] = [0.1]  # Pruned
+    assert tuner._prune([0.65], 2) and not tuner._prune([0.75], 2)
+    assert tuner._prune([0.7, 0.4], 2) and not tuner._prune([0.7, 0.6], 2)
+
+    tuner = make_tuner(
+        backend, tmp_path, None, 1, pruning="percentile", percentile=10
+    )
+    tuner.fold_scores = {str(i): [0.5 + 0.1 * i, 0.5] for i in range(5)}
+    assert tuner._prune([0.53], 2) and not tuner._prune([0.55], 2)
+
+    for kwargs in [
+        dict(n_parallel=0),
+        dict(pruning="mean"),
+        dict(pruning="percentile", percentile=100),
+        dict(pruning="halving", factor=1),
+    ]:
+        with pytest.raises(ValueError):
+            make_tuner(backend, tmp_path, None, 1, **kwargs)
+
+
+@pytest.mark.parametrize("n_jobs", [None, 2])
+def test_median_pruning(backend, tmp_path, classification_data, n_jobs):
+    """Test pruning the trials fold by fold."""
+    X, y = classification_data
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 1, 150)),
+        max_trials=15,
+        n_parallel=3,
+        n_jobs=n_jobs,
+        pruning="median",
+    )
+    tuner.search(X, y)
+
+    trials = tuner.oracle.trials.values()
+    assert all(trial.status == "COMPLETED" for trial in trials)
+    pruned = [trial for trial in trials if trial.message]
+    assert pruned
+    for trial in pruned:
+        assert trial.message.startswith("Pruned after")
+        assert trial.trial_id not in tuner.fold_scores
+    assert len(tuner.fold_scores) == len(trials) - len(pruned)
+    assert all(len(scores) == 3 for scores in tuner.fold_scores.values())
+
+    best = max(tuner.fold_scores, key=lambda i: np.mean(tuner.fold_scores[i]))
+    n_neighbors = tuner.oracle.trials[best].hyperparameters["n_neighbors"]
+    models = tuner.get_best_models(len(trials))
+    assert len(models) == len(tuner.fold_scores)
+    assert models[0].n_neighbors == n_neighbors
+
+
+@pytest.mark.parametrize(
+    "resource, hypermodel",
+    [
+        (
+            "samples",
+            lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 1, 20)),
+        ),
+        (
+            "n_estimators",
+            lambda hp: RandomForestClassifier(
+                n_estimators=27,
+                max_depth=hp.Int("max_depth", 1, 10),
+                random_state=777,
+            ),
+        ),
+    ],
+)
+def test_halving_pruning(
+    backend, tmp_path, classification_data, resource, hypermodel
+):
+    """Test racing the trials of a round by successive halving."""
+    X, y = classification_data
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        hypermodel,
+        max_trials=9,
+        n_parallel=9,
+        pruning="halving",
+        resource=resource,
+    )
+    tuner.search(X, y)
+
+    messages = [trial.message for trial in tuner.oracle.trials.values()]
+    assert messages.count(None) == 1
+    for rung, budget, n_pruned in [(0, "11%", 6), (1, "33%", 2)]:
+        message = f"Pruned at rung {rung}, with {budget} of the {resource}"
+        assert messages.count(message) == n_pruned
+    assert len(tuner.fold_scores) == 1
+    best_model = tuner.get_best_models()[0]
+    if resource == "n_estimators":
+        assert best_model.n_estimators == 27
+
+
+@pytest.mark.parametrize("n_parallel", [1, 2])
+def test_halving_pruning_brackets(
+    backend, tmp_path, classification_data, n_parallel
+):
+    """Test racing brackets of factor trials when n_parallel is smaller."""
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 1, 20)),
+        max_trials=13,
+        n_parallel=n_parallel,
+        pruning="halving",
+    )
+    tuner.search(*classification_data)
+
+    messages = [trial.message for trial in tuner.oracle.trials.values()]
+    # 4 brackets of 3 trials, 1 kept in each, then a last one unpruned
+    message = "Pruned at rung 0, with 33% of the samples"
+    assert messages.count(message) == 8 and messages.count(None) == 5
+
+
+def test_halving_pruning_rungs(tmp_path, classification_data):
+    """Test racing a bracket of an exact power of factor trials, e.g. 5**3,
+    over as many rungs."""
+    backend = importlib.import_module("napr.hyperopt._native")
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: DecisionTreeClassifier(
+            max_depth=hp.Int("max_depth", 1, 200), random_state=777
+        ),
+        max_trials=125,
+        n_parallel=125,
+        pruning="halving",
+        factor=5,
+    )
+    tuner.search(*classification_data)
+
+    messages = [trial.message for trial in tuner.oracle.trials.values()]
+    assert messages.count(None) == 1
+    rungs = [(0, "1%", 100), (1, "4%", 20), (2, "20%", 4)]
+    for rung, budget, n_pruned in rungs:
+        message = f"Pruned at rung {rung}, with {budget} of the samples"
+        assert messages.count(message) == n_pruned
+
+
+def test_halving_pruning_resource(backend, tmp_path, classification_data):
+    """Test that the resource must be a parameter of the models."""
+    tuner = make_tuner(
+        backend,
+        tmp_path,
+        lambda hp: KNeighborsClassifier(hp.Int("n_neighbors", 1, 50)),
+        max_trials=3,
+        n_parallel=3,
+        pruning="halving",
+        resource="max_iter",
+    )
+    with pytest.raises(ValueError):
+        tuner.search(*classification_data)
+
+
+def test_trial_database(backend, tmp_path, classification_data):
+    """Test querying the trial database, and reloading it."""
+    X, y = classification_data
+    kwargs = dict(
+        hypermodel=lambda hp: KNeighborsClassifier(
+            hp.Int("n_neighbors", 1, 150)
+        ),
+        max_trials=8,
+        pruning="median",
+    )
+    tuner = make_tuner(backend, tmp_path, **kwargs)
+    tuner.search(X, y)
+
+    trials = load_trials(str(tmp_path), "tuner")
+    assert list(trials.columns) == [*TRIAL_FIELDS, "n_neighbors"]
+    assert len(trials) == 8 and set(trials["status"]) == {"COMPLETED"}
+    for _, trial in trials.iterrows():
+        assert trial["score"] == pytest.approx(np.mean(trial["fold_scores"]))
+        assert len(trial["fit_times"]) == len(trial["fold_scores"])
+        if trial["message"] is None:
+            assert trial["fold_scores"] == tuner.fold_scores[trial["trial_id"]]
+
+    # The scores of the folds are kept for the pruning
+    reloaded = make_tuner(backend, tmp_path, **kwargs)
+    assert reloaded.fold_scores == tuner.fold_scores
+    overwritten = make_tuner(backend, tmp_path, overwrite=True, **kwargs)
+    assert overwritten.fold_scores == {}
+    assert load_trials(str(tmp_path), "tuner").empty
+
+
+def is_mapped(array):
+    """Whether an array is a view of a memory-mapped file."""
+    while isinstance(array, np.ndarray):
+        if isinstance(array, np.memmap):
+            return True
+        array = array.base
+    return False
+
+
+def test_make_splits(tmp_path):
+    """Test copying the splits once, memory-mapping the large blocks."""
+    X = pd.DataFrame(np.random.rand(4000, 100), index=np.arange(4000) * 2)
+    y = pd.Series(np.random.randint(0, 2, 4000), index=X.index, name="y")
+    sample_weight = np.random.rand(4000)
+    indices = list(StratifiedKFold(2).split(X, y))
+    splits = _make_splits((X, y, sample_weight), indices, str(tmp_path))
+
+    for (train, test), split in zip(indices, splits):
+        pd.testing.assert_frame_equal(split.X_train, X.iloc[train])
+        pd.testing.assert_series_equal(split.y_test, y.iloc[test])
+        np.testing.assert_array_equal(split.sw_train, sample_weight[train])
+        # Views of the memory-mapped blocks, the small ones in memory
+        assert is_mapped(split.X_train.values)
+        assert not is_mapped(split.y_train.values)
+    assert len(list(tmp_path.iterdir())) == 4
+
+    # Not mapped with several dtypes
+    X = X.assign(label="a")
+    splits = _make_splits((X, y, None), indices, str(tmp_path))
+    assert splits[0].sw_train is None
+    assert splits[0].X_train["label"].eq("a").all()
+    assert len(list(tmp_path.iterdir())) == 4
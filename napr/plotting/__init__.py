@@ -1,5 +1,12 @@
 """The plotting API."""
 
-from ._base import reset_plt_style, set_plt_style, label_subplot
+from napr.utils._lazy import attach
 
-__all__ = ["reset_plt_style", "set_plt_style", "label_subplot"]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "reset_plt_style": "._base",
+        "set_plt_style": "._base",
+        "label_subplot": "._base",
+    },
+)
@@ -0,0 +1,66 @@
+"""Test the lazy loading of the package."""
+
+import subprocess
+import sys
+
+import pytest
+
+import napr
+
+HEAVY_MODULES = [
+    "tensorflow",
+    "keras_tuner",
+    "matplotlib",
+    "sklearn",
+    "pyarrow",
+]
+
+
+def _run(code: str) -> str:
+    """Run the code in a fresh interpreter and return its output."""
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+
+
+def test_import():
+    """Test that importing napr loads no heavy dependency."""
+    output = _run(
+        "import sys, napr\n"
+        f"print([m for m in {HEAVY_MODULES} if m in sys.modules])\n"
+    )
+    assert output.strip() == "[]"
+
+
+@pytest.mark.parametrize(
+    "statement, not_loaded",
+    [
+        # pandas<2 imports pyarrow itself
+        ("from napr.data import load_terpene", HEAVY_MODULES[:-1]),
+        ("from napr.utils import all_but", ["tensorflow", "matplotlib"]),
+        ("from napr.apps import Terpene", ["tensorflow", "keras_tuner"]),
+        ("napr.evaluation.eval_classification", ["tensorflow", "matplotlib"]),
+    ],
+)
+def test_lazy_subpackages(statement, not_loaded):
+    """Test that subpackages import only their own dependencies."""
+    output = _run(
+        "import sys, napr\n"
+        f"{statement}\n"
+        f"print([m for m in {not_loaded} if m in sys.modules])\n"
+    )
+    assert output.strip() == "[]"
+
+
+def test_attributes():
+    """Test accessing the lazily loaded attributes."""
+    assert set(napr.__all__) <= set(dir(napr))
+    assert napr.apps.Terpene is napr.apps.coconut.terpene.Terpene
+    assert callable(napr.data.load_terpene)
+    assert napr.utils.decorators.__name__ == "napr.utils.decorators"
+
+    with pytest.raises(AttributeError):
+        napr.not_an_attribute
@@ -1,15 +1,17 @@
 """The utilities API."""
 
-from ._stat import percent_within
-from .helpers import all_but, split_train_test, label_encode
-from . import decorators
-from . import random
+from ._lazy import attach
 
-__all__ = [
-    "percent_within",
-    "all_but",
-    "decorators",
-    "split_train_test",
-    "label_encode",
-    "random",
-]
+__getattr__, __dir__, __all__ = attach(
+    __name__,
+    {
+        "percent_within": "._stat",
+        "all_but": ".helpers",
+        "decorators": ".decorators",
+        "split_train_test": ".helpers",
+        "label_encode": ".helpers",
+        "random": ".random",
+        "fingerprint": "._cache",
+        "DiskCache": "._cache",
+    },
+)
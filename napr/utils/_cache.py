@@ -0,0 +1,154 @@
+"""Content fingerprints and an on-disk LRU cache of fitted objects."""
+
+import glob
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "napr"
+)
+MAX_BYTES = 1024 * 1024 * 1024  # Of the entries of a DiskCache
+
+
+def _update(digest: Any, obj: Any) -> None:
+    """Update a digest with the content and the type of an object."""
+    if isinstance(obj, pd.DataFrame):
+        digest.update(b"DataFrame")
+        _update(digest, [str(column) for column in obj.columns])
+        _update(digest, obj.index)
+        for _, column in obj.items():
+            _update(digest, column.to_numpy())
+    elif isinstance(obj, (pd.Series, pd.Index)):
+        digest.update(type(obj).__name__.encode())
+        _update(digest, obj.to_numpy())
+    elif sparse.issparse(obj):
+        obj = obj.tocsr()
+        digest.update(b"csr_matrix")
+        for array in [obj.data, obj.indices, obj.indptr]:
+            _update(digest, array)
+        _update(digest, obj.shape)
+    elif isinstance(obj, np.ndarray):
+        digest.update(f"ndarray{obj.dtype.str}{obj.shape}".encode())
+        if obj.dtype.hasobject:
+            _update(digest, pd.util.hash_pandas_object(pd.Series(obj.ravel())))
+        else:
+            digest.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, (tuple, list)):
+        # Recursively, not to hash the arrays by their elided repr
+        digest.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in obj:
+            _update(digest, item)
+    elif isinstance(obj, dict):
+        digest.update(f"dict{len(obj)}".encode())
+        for key in sorted(obj, key=repr):
+            _update(digest, key)
+            _update(digest, obj[key])
+    else:
+        digest.update(json.dumps(obj, sort_keys=True, default=repr).encode())
+
+
+def fingerprint(*objects: Any) -> str:
+    """Returns the SHA-256 digest of the content of objects.
+
+    Arrays, sparse matrices and pandas objects are hashed by their values,
+    also within tuples, lists and dictionaries; other objects, e.g. the
+    values of parameters, by their JSON representation.
+
+    Args:
+        *objects: The objects.
+    """
+    digest = hashlib.sha256()
+    for obj in objects:
+        _update(digest, obj)
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """An on-disk cache of pickled objects, evicting the least recently used
+    entries beyond max_bytes.
+
+    Each entry is a file named after its key, whose modification time is
+    updated on every hit.
+    """
+
+    SUFFIX = ".pkl"
+
+    def __init__(
+        self, directory: str = CACHE_DIR, max_bytes: int | None = MAX_BYTES
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def path(self, key: str) -> str:
+        """Returns the path of the entry of a key."""
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def __contains__(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Returns the object of a key, or default on a miss.
+
+        Args:
+            key: The key.
+            default: Returned on a miss. Defaults to None.
+        """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return default
+        except (EOFError, pickle.UnpicklingError):
+            # A corrupted entry is a miss
+            os.remove(path)
+            return default
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Store the object of a key, then evict the least recently used
+        entries.
+
+        Args:
+            key: The key.
+            value: The object.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, suffix=".part", delete=False
+        ) as file:
+            pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(file.name, self.path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until they take at most
+        max_bytes, always keeping the most recent one."""
+        if self.max_bytes is None:
+            return None
+
+        entries = []
+        for path in glob.glob(os.path.join(self.directory, "*" + self.SUFFIX)):
+            stat = os.stat(path)
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        entries.sort(reverse=True)
+
+        total = 0
+        for i, (_, size, path) in enumerate(entries):
+            total += size
+            if i and total > self.max_bytes:
+                os.remove(path)
+
+    def clear(self) -> None:
+        """Remove all the entries."""
+        for path in glob.glob(os.path.join(self.directory, "*" + self.SUFFIX)):
+            os.remove(path)
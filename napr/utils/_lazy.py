@@ -0,0 +1,48 @@
+"""Lazy loading of the attributes of packages (PEP 562)."""
+
+import importlib
+from collections.abc import Callable
+from typing import Any
+
+
+def attach(
+    package: str, attributes: dict[str, str]
+) -> tuple[Callable[[str], Any], Callable[[], list[str]], list[str]]:
+    """Attach lazily loaded attributes to a package.
+
+    The module defining an attribute is imported on first access of the
+    attribute, so importing the package does not import heavy dependencies.
+    Usage, in the __init__.py of the package:
+
+        __getattr__, __dir__, __all__ = attach(__name__, {"Terpene": "._base"})
+
+    Args:
+        package: Name of the package, i.e. __name__.
+        attributes: Mapping of the attribute names to the (relative) modules
+            defining them. An attribute named after its module, e.g.
+            {"decorators": ".decorators"}, is the module itself.
+
+    Returns:
+        The __getattr__, __dir__ and __all__ of the package.
+    """
+
+    def __getattr__(name: str) -> Any:
+        if name not in attributes:
+            raise AttributeError(
+                f"module {package!r} has no attribute {name!r}"
+            )
+
+        module = importlib.import_module(attributes[name], package)
+        if module.__name__.rsplit(".", 1)[-1] == name:
+            value = module
+        else:
+            value = getattr(module, name)
+        # Later accesses do not go through __getattr__
+        setattr(importlib.import_module(package), name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        module_vars = vars(importlib.import_module(package))
+        return sorted(set(module_vars) | set(attributes))
+
+    return __getattr__, __dir__, list(attributes)
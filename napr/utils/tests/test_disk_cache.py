@@ -0,0 +1,78 @@
+"""Test the fingerprints and the on-disk LRU cache."""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from napr.utils import DiskCache, fingerprint
+
+
+def test_fingerprint():
+    """Test the fingerprint function."""
+    data = pd.DataFrame({"a": [1.0, 2.0], "b": ["x", "y"]})
+    params = {"engine": "full", "n_components": 0.95}
+
+    assert fingerprint(data, params) == fingerprint(data.copy(), dict(params))
+    assert fingerprint(data, params) != fingerprint(data, {"engine": "auto"})
+    assert fingerprint(data) != fingerprint(data[["b", "a"]])
+    assert fingerprint(data) != fingerprint(data.assign(a=[1.0, 3.0]))
+
+    values = np.arange(6, dtype="float32").reshape(2, 3)
+    assert fingerprint(values) != fingerprint(values.astype("float64"))
+    assert fingerprint(values) != fingerprint(values.reshape(3, 2))
+    assert fingerprint(values) == fingerprint(np.asfortranarray(values))
+    assert fingerprint(sparse.csr_matrix(values)) == fingerprint(
+        sparse.csc_matrix(values)
+    )
+
+    # By the values of the arrays within containers, not their elided repr
+    large = np.zeros(2000)
+    changed = large.copy()
+    changed[500:1500] = 1
+    assert fingerprint((large, values)) != fingerprint((changed, values))
+    assert fingerprint([large]) != fingerprint([changed])
+    assert fingerprint({"y": large}) != fingerprint({"y": changed})
+    assert fingerprint({"a": 1, "b": 2}) == fingerprint({"b": 2, "a": 1})
+    assert fingerprint((large,)) != fingerprint([large])
+
+
+def test_disk_cache(tmp_path):
+    """Test the DiskCache class."""
+    cache = DiskCache(str(tmp_path), max_bytes=None)
+    assert cache.get("a") is None and cache.get("a", 1) == 1
+
+    value = {"components": np.ones((2, 3))}
+    cache.set("a", value)
+    assert "a" in cache
+    np.testing.assert_array_equal(cache.get("a")["components"], np.ones((2, 3)))
+
+    # A corrupted entry is a miss
+    with open(cache.path("b"), "wb") as file:
+        file.write(b"")
+    assert cache.get("b") is None and "b" not in cache
+
+    cache.clear()
+    assert not os.listdir(tmp_path)
+
+
+def test_disk_cache_evict(tmp_path):
+    """Test evicting the least recently used entries."""
+    value = np.zeros(1000)
+    cache = DiskCache(str(tmp_path), max_bytes=None)
+    for key in "abc":
+        cache.set(key, value)
+        time.sleep(0.01)
+    size = os.path.getsize(cache.path("a"))
+
+    # a is used, so b is the least recently used entry
+    cache.get("a")
+    cache.max_bytes = 2 * size
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ["a.pkl", "c.pkl"]
+
+    cache.max_bytes = 0
+    cache.set("d", value)
+    assert os.listdir(tmp_path) == ["d.pkl"]